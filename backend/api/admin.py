@@ -1,9 +1,205 @@
+"""
+Admin for the API models.
+
+TrafficLog and CitizenReport grow without bound, so their changelists avoid
+anything that scans the whole table (see ScalableChangeListMixin): counts
+are estimated from Postgres statistics, the large text/JSON columns are not
+loaded for the list, date navigation is a created_at cursor instead of deep
+OFFSET pages, search only covers columns with a trigram index (migration
+0005) and exports stream straight from a server-side cursor.
+"""
+
+import json
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import TrafficLog, EnergyLog, WasteLog, CitizenReport, Subscriber
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .exports import EXPORT_CONTENT_TYPES, stream_rows
+from .models import (
+    TrafficLog,
+    EnergyLog,
+    EnergyBaseline,
+    WasteLog,
+    WasteBin,
+    CitizenReport,
+    Subscriber,
+    Alert,
+    AlertDelivery,
+    SpoolBatch,
+)
+
+# Below this many (estimated) rows the changelist pays for an exact count
+EXACT_COUNT_BELOW = 10000
+EXPORT_CHUNK_SIZE = 2000
+
+
+def estimated_count(queryset):
+    """
+    Row count estimate from the Postgres planner, or None when there is no
+    usable estimate (other backends, never-analyzed tables). Unfiltered
+    querysets use pg_class.reltuples; filtered ones the top plan node's
+    row estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the planner's estimate for large result sets.
+    Page links past the real end are simply empty; the cursor navigation
+    does not depend on the count at all.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_BELOW:
+            return super().count
+        return estimate
+
+
+def parse_cursor(value):
+    """
+    Parse a created_before cursor, "<ISO timestamp>" or "<ISO timestamp>,<id>".
+    Returns (timestamp, id or None), or None when the value is invalid.
+    """
+    timestamp, _, pk = (value or "").partition(",")
+    try:
+        created_at = parse_datetime(timestamp)
+        pk = int(pk) if pk else None
+    except ValueError:
+        return None
+    if created_at is None:
+        return None
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+    return created_at, pk
+
+
+def format_cursor(obj):
+    return f"{obj.created_at.isoformat()},{obj.pk}"
+
+
+class CreatedBeforeFilter(admin.SimpleListFilter):
+    """
+    Keyset date navigation: show rows created before a point in time. The
+    sidebar offers relative jumps; the "Older entries" link passes the last
+    row's (created_at, id) so paging back in time stays an index range scan.
+    """
+
+    title = "created before"
+    parameter_name = "created_before"
+    JUMPS = {
+        "1h": ("1 hour ago", timedelta(hours=1)),
+        "1d": ("1 day ago", timedelta(days=1)),
+        "7d": ("1 week ago", timedelta(days=7)),
+        "30d": ("30 days ago", timedelta(days=30)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _) in self.JUMPS.items()]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if value in self.JUMPS:
+            return queryset.filter(created_at__lt=timezone.now() - self.JUMPS[value][1])
+        cursor = parse_cursor(value)
+        if cursor is None:
+            return queryset
+        created_at, pk = cursor
+        if pk is None:
+            return queryset.filter(created_at__lt=created_at)
+        return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+
+def _stream_export(queryset, export_format):
+    opts = queryset.model._meta
+    columns = [field.attname for field in opts.concrete_fields]
+    rows = queryset.values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    response = StreamingHttpResponse(
+        stream_rows(columns, rows, export_format),
+        content_type=EXPORT_CONTENT_TYPES[export_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{opts.model_name}.{export_format}"'
+    return response
+
+
+@admin.action(description="Export selected rows as CSV")
+def export_csv(modeladmin, request, queryset):
+    return _stream_export(queryset, "csv")
+
+
+@admin.action(description="Export selected rows as NDJSON")
+def export_ndjson(modeladmin, request, queryset):
+    return _stream_export(queryset, "ndjson")
+
+
+class ScalableChangeListMixin:
+    """
+    ModelAdmin mixin for large, append-mostly tables ordered by created_at.
+    Set `list_defer` to the columns the changelist should not load.
+    """
+
+    list_defer = ()
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) next to filtered results
+    show_full_result_count = False
+    change_list_template = "admin/api/cursor_change_list.html"
+    ordering = ["-created_at", "-id"]
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if self.list_defer and match and match.url_name and match.url_name.endswith("_changelist"):
+            queryset = queryset.defer(*self.list_defer)
+        return queryset
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        context = getattr(response, "context_data", None)
+        changelist = context.get("cl") if context else None
+        if changelist is None:
+            return response
+        rows = list(changelist.result_list)
+        if len(rows) == changelist.list_per_page:
+            context["older_url"] = changelist.get_query_string(
+                {CreatedBeforeFilter.parameter_name: format_cursor(rows[-1])}, remove=["p"]
+            )
+        if CreatedBeforeFilter.parameter_name in request.GET:
+            context["newest_url"] = changelist.get_query_string(
+                remove=[CreatedBeforeFilter.parameter_name, "p"]
+            )
+        return response
 
 
 @admin.register(TrafficLog)
-class TrafficLogAdmin(admin.ModelAdmin):
+class TrafficLogAdmin(ScalableChangeListMixin, admin.ModelAdmin):
     list_display = [
         "address",
         "status_code",
@@ -12,10 +208,11 @@ class TrafficLogAdmin(admin.ModelAdmin):
         "incident_count",
         "created_at",
     ]
-    list_filter = ["status_code", "has_incident", "created_at"]
-    search_fields = ["address", "analysis", "recommendation"]
+    list_filter = ["status_code", "has_incident", CreatedBeforeFilter]
+    search_fields = ["address"]
+    list_defer = ["analysis", "recommendation", "alternative_routes", "alert_content"]
     readonly_fields = ["created_at"]
-    ordering = ["-created_at"]
+    actions = [export_csv, export_ndjson]
 
     fieldsets = (
         (
@@ -69,10 +266,19 @@ class EnergyLogAdmin(admin.ModelAdmin):
         "total_consumption",
         "avg_power",
         "anomalies_detected",
+        "is_anomaly",
+        "anomaly_score",
         "created_at",
     ]
-    list_filter = ["anomalies_detected", "created_at"]
-    readonly_fields = ["created_at"]
+    list_filter = ["anomalies_detected", "is_anomaly", "created_at"]
+    readonly_fields = ["anomaly_score", "anomaly_zscores", "anomaly_flags", "is_anomaly", "created_at"]
+
+
+@admin.register(EnergyBaseline)
+class EnergyBaselineAdmin(admin.ModelAdmin):
+    list_display = ["metric", "slot", "count", "mean", "var"]
+    list_filter = ["metric"]
+    ordering = ["metric", "slot"]
 
 
 @admin.register(WasteLog)
@@ -82,12 +288,49 @@ class WasteLogAdmin(admin.ModelAdmin):
     readonly_fields = ["created_at"]
 
 
+@admin.register(WasteBin)
+class WasteBinAdmin(admin.ModelAdmin):
+    list_display = ["name", "address", "latitude", "longitude", "updated_at"]
+    search_fields = ["name", "address"]
+    readonly_fields = ["updated_at"]
+
+
 @admin.register(CitizenReport)
-class CitizenReportAdmin(admin.ModelAdmin):
+class CitizenReportAdmin(ScalableChangeListMixin, admin.ModelAdmin):
     list_display = ["reporter_name", "issue_type", "location", "status", "created_at"]
-    list_filter = ["issue_type", "status", "created_at"]
+    list_filter = ["issue_type", "status", CreatedBeforeFilter]
     search_fields = ["reporter_name", "location", "description"]
+    list_defer = ["description"]
     readonly_fields = ["created_at", "updated_at"]
+    raw_id_fields = ["duplicate_of"]
+    actions = [
+        "mark_pending",
+        "mark_in_progress",
+        "mark_resolved",
+        "mark_rejected",
+        export_csv,
+        export_ndjson,
+    ]
+
+    def _set_status(self, request, queryset, status):
+        updated = queryset.set_status(status)
+        self.message_user(request, f"{updated} report(s) moved to {status}.")
+
+    @admin.action(description="Mark selected reports as Pending Review")
+    def mark_pending(self, request, queryset):
+        self._set_status(request, queryset, "pending")
+
+    @admin.action(description="Mark selected reports as In Progress")
+    def mark_in_progress(self, request, queryset):
+        self._set_status(request, queryset, "in_progress")
+
+    @admin.action(description="Mark selected reports as Resolved")
+    def mark_resolved(self, request, queryset):
+        self._set_status(request, queryset, "resolved")
+
+    @admin.action(description="Mark selected reports as Rejected")
+    def mark_rejected(self, request, queryset):
+        self._set_status(request, queryset, "rejected")
 
 
 @admin.register(Subscriber)
@@ -96,3 +339,25 @@ class SubscriberAdmin(admin.ModelAdmin):
     list_filter = ["created_at"]
     search_fields = ["email"]
     readonly_fields = ["created_at"]
+
+
+@admin.register(Alert)
+class AlertAdmin(admin.ModelAdmin):
+    list_display = ["subject", "source", "source_id", "fanned_out_at", "created_at"]
+    list_filter = ["source"]
+    readonly_fields = ["fanned_out_at", "created_at"]
+
+
+@admin.register(AlertDelivery)
+class AlertDeliveryAdmin(admin.ModelAdmin):
+    list_display = ["email", "alert", "status", "attempts", "next_attempt_at", "sent_at"]
+    list_filter = ["status"]
+    search_fields = ["email"]
+    raw_id_fields = ["alert"]
+    readonly_fields = ["created_at", "sent_at"]
+
+
+@admin.register(SpoolBatch)
+class SpoolBatchAdmin(admin.ModelAdmin):
+    list_display = ["name", "rows", "flushed_at"]
+    readonly_fields = ["flushed_at"]
@@ -0,0 +1,188 @@
+"""
+Admission control for expensive endpoints (POST /api/check-traffic/).
+
+Two layers, both shared by every worker on the host without an external
+service:
+
+- TokenBucketThrottle: a DRF throttle giving each client (X-Real-IP from
+  nginx) a bucket of CHECK_TRAFFIC_RATE tokens that refills continuously.
+  Buckets live in the default cache; with CACHE_URL=shmcache:// they are
+  shared and updated atomically across workers. Over the limit: 429 with
+  Retry-After.
+
+- n8n_slot(): a host-wide cap of N8N_MAX_IN_FLIGHT concurrent n8n calls,
+  implemented as fcntl byte-range locks on a small file in /dev/shm (the
+  kernel releases them if a worker dies). When every slot is busy, up to
+  N8N_QUEUE_SIZE requests wait at most N8N_QUEUE_TIMEOUT seconds for one;
+  anything beyond that is rejected at once with 503 and Retry-After.
+
+Keep N8N_MAX_IN_FLIGHT below the number of gunicorn workers (the default
+is one less than GUNICORN_WORKERS), so at least one worker is always free
+for cheap endpoints such as the dashboard; queued requests give theirs
+back within N8N_QUEUE_TIMEOUT.
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache_backends import shared_memory_dir
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: the cap then only applies per process
+    fcntl = None
+
+QUEUE_POLL_SECONDS = 0.05
+
+
+def client_ip(request):
+    # nginx passes the client address in X-Real-IP
+    return request.META.get("HTTP_X_REAL_IP") or request.META.get("REMOTE_ADDR", "")
+
+
+_update_lock = threading.Lock()
+
+
+def _atomic_update(key, func, timeout):
+    """
+    Read-modify-write a cache entry. Atomic across processes with the
+    shared-memory cache; other backends get a per-process lock only.
+    """
+    if hasattr(cache, "update"):
+        return cache.update(key, func, timeout)
+    with _update_lock:
+        value = func(cache.get(key))
+        cache.set(key, value, timeout)
+        return value
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket per client: the rate's request count is the bucket size
+    (the allowed burst), refilled evenly over the rate's period.
+    """
+
+    scope = "check_traffic"
+    cache_format = "throttle:bucket:%(scope)s:%(ident)s"
+
+    def get_ident(self, request):
+        return client_ip(request)
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        capacity = float(self.num_requests)
+        refill_per_second = self.num_requests / self.duration
+        now = self.timer()
+
+        def take(bucket):
+            tokens, updated_at = bucket[:2] if bucket else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+            if tokens >= 1:
+                return (tokens - 1, now, True)
+            return (tokens, now, False)
+
+        tokens, _, allowed = _atomic_update(self.get_cache_key(request, view), take, self.duration)
+        self._wait = 0 if allowed else (1 - tokens) / refill_per_second
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Admission rejected, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _SlotFile:
+    """
+    Lock slots in one file: bytes [0, in_flight) are run slots and the next
+    queue_size bytes are wait slots. Threads of one process never pick the
+    same slot, since fcntl locks do not exclude threads of the same process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = None
+        self.fd = None
+        self.held = set()
+        self.lock = threading.Lock()
+
+    def _open(self):
+        if self.pid != os.getpid():
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self.pid = os.getpid()
+            self.held = set()
+
+    def try_acquire(self, first, count):
+        with self.lock:
+            self._open()
+            for slot in range(first, first + count):
+                if slot in self.held:
+                    continue
+                if fcntl is not None:
+                    try:
+                        fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                    except OSError:
+                        continue
+                self.held.add(slot)
+                return slot
+        return None
+
+    def release(self, slot):
+        with self.lock:
+            if fcntl is not None:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, slot)
+            self.held.discard(slot)
+
+
+_slots = None
+
+
+def _slot_file():
+    global _slots
+    if _slots is None:
+        _slots = _SlotFile(settings.N8N_SLOT_FILE or os.path.join(shared_memory_dir(), "smartcity-n8n.slots"))
+    return _slots
+
+
+@contextmanager
+def n8n_slot():
+    """
+    Hold one of the N8N_MAX_IN_FLIGHT run slots for the duration of the
+    block. Raises AdmissionRejected when none frees up in time.
+    """
+    slots = _slot_file()
+    in_flight, queue_size = settings.N8N_MAX_IN_FLIGHT, settings.N8N_QUEUE_SIZE
+    retry_after = max(1, math.ceil(settings.N8N_QUEUE_TIMEOUT))
+
+    slot = slots.try_acquire(0, in_flight)
+    if slot is None:
+        waiting = slots.try_acquire(in_flight, queue_size)
+        if waiting is None:
+            raise AdmissionRejected(retry_after)
+        try:
+            deadline = time.monotonic() + settings.N8N_QUEUE_TIMEOUT
+            while slot is None and time.monotonic() < deadline:
+                time.sleep(QUEUE_POLL_SECONDS)
+                slot = slots.try_acquire(0, in_flight)
+        finally:
+            slots.release(waiting)
+        if slot is None:
+            raise AdmissionRejected(retry_after)
+    try:
+        yield
+    finally:
+        slots.release(slot)
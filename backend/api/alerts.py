@@ -0,0 +1,243 @@
+"""
+Batched alert dispatcher.
+
+Alerts are queued in the Alert outbox on the request path. The dispatcher
+(run by `manage.py dispatch_alerts`) fans each alert out into one
+AlertDelivery row per subscriber with a single INSERT ... SELECT. It then
+claims deliveries in batches and sends them over a small pool of reused
+SMTP connections, with rate limiting and exponential backoff.
+
+Alerts are deduplicated at fan-out: one whose dedupe_key (the address for
+traffic, the source for energy) was sent less than ALERT_DEDUPE_SECONDS
+before it was created is marked suppressed and reaches nobody, so
+repeated checks of the same jammed address do not mail the whole list
+each time. Run a single dispatcher for the window to be exact.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Alert, AlertDelivery, Subscriber
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing calls to at most `rate` per second.
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(self._next_at, now)
+            self._next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def is_duplicate(alert):
+    """
+    Whether an alert with the same dedupe_key was sent within
+    ALERT_DEDUPE_SECONDS before `alert`.
+    """
+    if not alert.dedupe_key or settings.ALERT_DEDUPE_SECONDS <= 0:
+        return False
+    return (
+        Alert.objects.filter(
+            dedupe_key=alert.dedupe_key,
+            created_at__gte=alert.created_at - timedelta(seconds=settings.ALERT_DEDUPE_SECONDS),
+            created_at__lte=alert.created_at,
+            fanned_out_at__isnull=False,
+            suppressed=False,
+        )
+        .exclude(id=alert.id)
+        .exists()
+    )
+
+
+def fan_out(alert):
+    """
+    Create a pending delivery for every current subscriber of `alert` with a
+    single INSERT ... SELECT, and mark the alert as fanned out.
+    Returns the number of deliveries created.
+    """
+    qn = connection.ops.quote_name
+    now = AlertDelivery._meta.get_field("created_at").get_db_prep_save(
+        timezone.now(), connection
+    )
+    columns = ", ".join(
+        qn(c)
+        for c in (
+            "alert_id", "email", "status", "attempts", "next_attempt_at", "last_error", "created_at"
+        )
+    )
+    # "WHERE 1 = 1" keeps SQLite from parsing ON CONFLICT as a join clause
+    sql = (
+        f"INSERT INTO {qn(AlertDelivery._meta.db_table)} ({columns}) "
+        f"SELECT %s, {qn('email')}, 'pending', 0, %s, '', %s "
+        f"FROM {qn(Subscriber._meta.db_table)} WHERE 1 = 1 "
+        f"ON CONFLICT ({qn('alert_id')}, {qn('email')}) DO NOTHING"
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [alert.id, now, now])
+            created = cursor.rowcount
+        Alert.objects.filter(id=alert.id).update(fanned_out_at=timezone.now())
+    return created
+
+
+def claim_deliveries(batch_size, lease_seconds):
+    """
+    Claim up to `batch_size` due deliveries for this dispatcher.
+
+    Claimed rows move to "sending" with next_attempt_at set to the lease
+    expiry, so rows left behind by a crashed dispatcher are picked up again
+    once their lease runs out. SKIP LOCKED lets several dispatchers run
+    side by side on PostgreSQL.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            AlertDelivery.objects.select_for_update(skip_locked=True)
+            .filter(status__in=["pending", "sending"], next_attempt_at__lte=now)
+            .order_by("next_attempt_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        AlertDelivery.objects.filter(id__in=ids).update(
+            status="sending", next_attempt_at=now + timedelta(seconds=lease_seconds)
+        )
+    return list(AlertDelivery.objects.filter(id__in=ids).select_related("alert"))
+
+
+class AlertDispatcher:
+    """
+    Sends claimed deliveries over `connections` reused SMTP connections.
+    """
+
+    def __init__(
+        self,
+        connections=4,
+        rate=0,
+        batch_size=200,
+        max_attempts=5,
+        backoff_seconds=30,
+        lease_seconds=600,
+    ):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.limiter = RateLimiter(rate)
+        self.connections = [get_connection(fail_silently=False) for _ in range(connections)]
+        self.executor = ThreadPoolExecutor(max_workers=connections)
+
+    def close(self):
+        self.executor.shutdown()
+        for mail_connection in self.connections:
+            mail_connection.close()
+
+    def run_once(self):
+        """
+        Fan out new alerts, then claim, send and record one batch.
+        Returns a stats dict.
+        """
+        stats = {"fanned_out": 0, "suppressed": 0, "claimed": 0, "sent": 0, "retried": 0, "failed": 0}
+
+        for alert in Alert.objects.filter(fanned_out_at__isnull=True).order_by("created_at")[:100]:
+            if is_duplicate(alert):
+                Alert.objects.filter(id=alert.id).update(fanned_out_at=timezone.now(), suppressed=True)
+                stats["suppressed"] += 1
+            else:
+                stats["fanned_out"] += fan_out(alert)
+
+        deliveries = claim_deliveries(self.batch_size, self.lease_seconds)
+        stats["claimed"] = len(deliveries)
+        if not deliveries:
+            return stats
+
+        slices = [deliveries[i :: len(self.connections)] for i in range(len(self.connections))]
+        results = []
+        for slice_results in self.executor.map(self._send_slice, self.connections, slices):
+            results.extend(slice_results)
+
+        stats.update(self._record(results))
+        return stats
+
+    def _send_slice(self, mail_connection, deliveries):
+        results = []
+        for delivery in deliveries:
+            self.limiter.wait()
+            message = EmailMessage(
+                subject=delivery.alert.subject,
+                body=delivery.alert.body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[delivery.email],
+                connection=mail_connection,
+            )
+            try:
+                # Opening explicitly keeps send_messages() from closing the
+                # connection after each message
+                mail_connection.open()
+                mail_connection.send_messages([message])
+                results.append((delivery, None))
+            except Exception as e:
+                # Drop the connection so the next message reconnects
+                try:
+                    mail_connection.close()
+                except Exception:
+                    pass
+                results.append((delivery, str(e) or e.__class__.__name__))
+        return results
+
+    def _record(self, results):
+        now = timezone.now()
+        counts = {"sent": 0, "retried": 0, "failed": 0}
+        deliveries = []
+        for delivery, error in results:
+            delivery.attempts += 1
+            if error is None:
+                delivery.status = "sent"
+                delivery.sent_at = now
+                delivery.last_error = ""
+                counts["sent"] += 1
+            elif delivery.attempts >= self.max_attempts:
+                delivery.status = "failed"
+                delivery.last_error = error
+                counts["failed"] += 1
+            else:
+                delay = self.backoff_seconds * 2 ** (delivery.attempts - 1)
+                delivery.status = "pending"
+                delivery.next_attempt_at = now + timedelta(
+                    seconds=delay * random.uniform(0.8, 1.2)
+                )
+                delivery.last_error = error
+                counts["retried"] += 1
+            deliveries.append(delivery)
+
+        AlertDelivery.objects.bulk_update(
+            deliveries, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+        )
+        if counts["failed"] or counts["retried"]:
+            logger.warning(
+                f"Alert dispatch: {counts['retried']} deliveries will be retried, "
+                f"{counts['failed']} failed permanently"
+            )
+        return counts
@@ -0,0 +1,300 @@
+"""
+Backend anomaly detection for EnergyLog snapshots.
+
+Every metric of a snapshot (consumption, power and the three voltage stats)
+is scored against two exponentially weighted baselines:
+
+- seasonal: one per hour of the week (UTC), so the usual Monday-morning
+  peak is not an anomaly but the same load at 3am on Sunday is
+- global: all hours together, used until the seasonal slot has seen enough
+  samples
+
+A metric is flagged when its z-score against the baseline reaches
+ENERGY_ANOMALY_Z. The row keeps the per-metric z-scores, the flagged
+metrics and the largest |z| (anomaly_score).
+
+Each baseline is (count, mean, var), updated with weight
+max(alpha, 1/count): the first samples give the plain running mean and
+variance (Welford), later ones decay with the configured alpha. Ingesting
+a snapshot therefore reads and writes a fixed number of EnergyBaseline rows
+(observe()), never the history. rescan() replays the whole history with the
+same recursion, vectorized with NumPy, and rebuilds the baselines.
+"""
+
+import math
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import EnergyBaseline, EnergyLog
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only the batch rescan needs it
+    np = None
+
+METRICS = ("total_consumption", "avg_power", "voltage_min", "voltage_max", "voltage_avg")
+
+HOURS_PER_WEEK = 168
+# 1970-01-01 was a Thursday; slot 0 is Monday 00:00 UTC
+_EPOCH_SLOT_OFFSET = 72
+
+MIN_SAMPLES_GLOBAL = 24
+MIN_SAMPLES_SEASONAL = 8
+# Keeps near-constant series from flagging tiny changes
+MIN_RELATIVE_STD = 0.01
+
+RESCAN_BLOCK = 128
+
+
+def snapshot_values(total_consumption, avg_power, voltage_stats):
+    """
+    The scored metrics of one snapshot; missing voltage stats are skipped.
+    """
+    voltage = voltage_stats or {}
+    values = {
+        "total_consumption": total_consumption,
+        "avg_power": avg_power,
+        "voltage_min": voltage.get("min"),
+        "voltage_max": voltage.get("max"),
+        "voltage_avg": voltage.get("average"),
+    }
+    return {metric: float(value) for metric, value in values.items() if value is not None}
+
+
+def hour_of_week(at):
+    return epoch_hour_of_week(int(at.timestamp()))
+
+
+def epoch_hour_of_week(seconds):
+    """
+    Hour-of-week slot of a Unix timestamp (int or integer array).
+    """
+    return (seconds // 3600 + _EPOCH_SLOT_OFFSET) % HOURS_PER_WEEK
+
+
+def update(count, mean, var, value, alpha):
+    """
+    Fold `value` into a (count, mean, var) baseline.
+    """
+    count += 1
+    weight = max(alpha, 1 / count)
+    delta = value - mean
+    mean += weight * delta
+    var = (1 - weight) * (var + weight * delta * delta)
+    return count, mean, var
+
+
+def zscore(value, mean, var):
+    std = max(math.sqrt(var), MIN_RELATIVE_STD * abs(mean), 1e-9)
+    return (value - mean) / std
+
+
+def assess(zscores):
+    """
+    Return the anomaly fields of a row for per-metric z-scores.
+    """
+    threshold = settings.ENERGY_ANOMALY_Z
+    zscores = {metric: round(z, 3) for metric, z in zscores.items()}
+    flags = [metric for metric, z in zscores.items() if abs(z) >= threshold]
+    return {
+        "anomaly_score": max((abs(z) for z in zscores.values()), default=None),
+        "anomaly_zscores": zscores,
+        "anomaly_flags": flags,
+        "is_anomaly": bool(flags),
+    }
+
+
+def _score(value, seasonal, overall):
+    if seasonal is not None and seasonal.count >= MIN_SAMPLES_SEASONAL:
+        return zscore(value, seasonal.mean, seasonal.var)
+    if overall is not None and overall.count >= MIN_SAMPLES_GLOBAL:
+        return zscore(value, overall.mean, overall.var)
+    return None
+
+
+def observe(values, at):
+    """
+    Score one snapshot taken at `at` and fold it into the baselines.
+    Returns the anomaly fields for the new EnergyLog row. Touches at most
+    two baseline rows per metric, whatever the size of the history.
+    """
+    slot = hour_of_week(at)
+    # Joins the caller's transaction (the webhook's) without a savepoint
+    with transaction.atomic(savepoint=False):
+        baselines = {
+            (b.metric, b.slot): b
+            for b in EnergyBaseline.objects.select_for_update().filter(
+                metric__in=values, slot__in=(EnergyBaseline.GLOBAL_SLOT, slot)
+            )
+        }
+        zscores, changed, created = {}, [], []
+        for metric, value in values.items():
+            seasonal = baselines.get((metric, slot))
+            overall = baselines.get((metric, EnergyBaseline.GLOBAL_SLOT))
+            z = _score(value, seasonal, overall)
+            if z is not None:
+                zscores[metric] = z
+
+            for key, baseline, alpha in (
+                (slot, seasonal, settings.ENERGY_SEASONAL_ALPHA),
+                (EnergyBaseline.GLOBAL_SLOT, overall, settings.ENERGY_ANOMALY_ALPHA),
+            ):
+                if baseline is None:
+                    baseline = EnergyBaseline(metric=metric, slot=key)
+                    created.append(baseline)
+                else:
+                    changed.append(baseline)
+                baseline.count, baseline.mean, baseline.var = update(
+                    baseline.count, baseline.mean, baseline.var, value, alpha
+                )
+
+        if changed:
+            EnergyBaseline.objects.bulk_update(changed, ["count", "mean", "var"])
+        if created:
+            # A concurrent first ingest may have created the row meanwhile
+            EnergyBaseline.objects.bulk_create(created, ignore_conflicts=True)
+    return assess(zscores)
+
+
+# ----------------------------------------------------------------------
+# Batch rescan
+# ----------------------------------------------------------------------
+
+
+def _linear_scan(first, coef, inc):
+    """
+    y[0] = first, y[t] = coef[t] * y[t - 1] + inc[t], along axis 0.
+    Within a block y[t] = P[t] * (y0 + sum(inc[j] / P[j])) with P the
+    running product of coef; short blocks keep P far from underflow.
+    """
+    out = np.empty_like(inc)
+    out[0] = first
+    y = first
+    for start in range(1, len(inc), RESCAN_BLOCK):
+        stop = min(start + RESCAN_BLOCK, len(inc))
+        product = np.cumprod(coef[start:stop], axis=0)
+        out[start:stop] = product * (y + np.cumsum(inc[start:stop] / product, axis=0))
+        y = out[stop - 1]
+    return out
+
+
+def _baseline_scan(series, alpha):
+    """
+    Baselines after each sample of `series` (shape samples x columns,
+    each column an independent series), as arrays of means and variances.
+    Row t is the state after t + 1 samples, exactly as update() computes it.
+    """
+    counts = np.arange(1, len(series) + 1, dtype=float)[:, None]
+    weight = np.maximum(alpha, 1 / counts)
+    means = _linear_scan(series[0], 1 - weight, weight * series)
+    delta = np.zeros_like(series)
+    delta[1:] = series[1:] - means[:-1]
+    variances = _linear_scan(np.zeros_like(series[0]), 1 - weight, (1 - weight) * weight * delta * delta)
+    return means, variances
+
+
+def _zscores(values, means, variances):
+    std = np.maximum(np.maximum(np.sqrt(variances), MIN_RELATIVE_STD * np.abs(means)), 1e-9)
+    return (values - means) / std
+
+
+def rescan_metric(values, slots):
+    """
+    Score every sample of one metric (in time order) against the baselines
+    built from the samples before it. Returns (z-scores with NaN where
+    still warming up, final baselines as {slot: (count, mean, var)}).
+    """
+    n = len(values)
+    scores = np.full(n, np.nan)
+    final = {}
+    if n == 0:
+        return scores, final
+
+    # Global baseline: one series
+    means, variances = _baseline_scan(values[:, None], settings.ENERGY_ANOMALY_ALPHA)
+    means, variances = means[:, 0], variances[:, 0]
+    ready = np.arange(MIN_SAMPLES_GLOBAL, n)
+    scores[ready] = _zscores(values[ready], means[ready - 1], variances[ready - 1])
+    final[EnergyBaseline.GLOBAL_SLOT] = (n, float(means[-1]), float(variances[-1]))
+
+    # Seasonal baselines: lay the samples out as (occurrence, slot) so every
+    # slot's series is a column and all 168 are scanned at once. Cells past
+    # a slot's last sample are padding and never read.
+    order = np.argsort(slots, kind="stable")
+    sorted_slots = slots[order]
+    starts = np.searchsorted(sorted_slots, np.arange(HOURS_PER_WEEK))
+    occurrence = np.empty(n, dtype=int)
+    occurrence[order] = np.arange(n) - starts[sorted_slots]
+    per_slot = np.bincount(slots, minlength=HOURS_PER_WEEK)
+
+    grid = np.zeros((per_slot.max(), HOURS_PER_WEEK))
+    grid[occurrence, slots] = values
+    means, variances = _baseline_scan(grid, settings.ENERGY_SEASONAL_ALPHA)
+
+    seasonal = occurrence >= MIN_SAMPLES_SEASONAL
+    previous = occurrence[seasonal] - 1
+    scores[seasonal] = _zscores(
+        values[seasonal], means[previous, slots[seasonal]], variances[previous, slots[seasonal]]
+    )
+    for slot in per_slot.nonzero()[0]:
+        last = per_slot[slot] - 1
+        final[int(slot)] = (int(per_slot[slot]), float(means[last, slot]), float(variances[last, slot]))
+    return scores, final
+
+
+def rescan(rows):
+    """
+    Recompute the anomaly fields of every row and the final baselines.
+    `rows` are (id, created_at, total_consumption, avg_power, voltage_stats)
+    in creation order. Returns ({id: anomaly fields}, [EnergyBaseline]).
+    """
+    if np is None:
+        raise ImportError("The batch rescan needs NumPy (pip install numpy)")
+
+    ids, slots, columns = [], [], {metric: ([], []) for metric in METRICS}
+    for index, (pk, created_at, consumption, power, voltage) in enumerate(rows):
+        ids.append(pk)
+        slots.append(hour_of_week(created_at))
+        for metric, value in snapshot_values(consumption, power, voltage).items():
+            columns[metric][0].append(index)
+            columns[metric][1].append(value)
+    slots = np.array(slots, dtype=int)
+
+    zscores = [{} for _ in ids]
+    baselines = []
+    for metric, (indexes, values) in columns.items():
+        indexes = np.array(indexes, dtype=int)
+        scores, final = rescan_metric(np.array(values, dtype=float), slots[indexes])
+        for index, z in zip(indexes[~np.isnan(scores)].tolist(), scores[~np.isnan(scores)].tolist()):
+            zscores[index][metric] = z
+        baselines.extend(
+            EnergyBaseline(metric=metric, slot=slot, count=count, mean=mean, var=var)
+            for slot, (count, mean, var) in final.items()
+        )
+    return {pk: assess(z) for pk, z in zip(ids, zscores)}, baselines
+
+
+ANOMALY_FIELDS = ["anomaly_score", "anomaly_zscores", "anomaly_flags", "is_anomaly"]
+
+
+def apply_rescan(batch_size=1000):
+    """
+    Rescan the full EnergyLog history and replace the stored baselines.
+    Runs in one transaction that holds the baseline rows, so concurrent
+    ingests wait rather than interleave. Returns (rows, anomalies).
+    """
+    with transaction.atomic():
+        list(EnergyBaseline.objects.select_for_update().values_list("id", flat=True))
+        rows = list(
+            EnergyLog.objects.order_by("created_at", "id").values_list(
+                "id", "created_at", "total_consumption", "avg_power", "voltage_stats"
+            )
+        )
+        results, baselines = rescan(rows)
+
+        changed = [EnergyLog(id=pk, **fields) for pk, fields in results.items()]
+        EnergyLog.objects.bulk_update(changed, ANOMALY_FIELDS, batch_size=batch_size)
+        EnergyBaseline.objects.all().delete()
+        EnergyBaseline.objects.bulk_create(baselines, batch_size=batch_size)
+    return len(results), sum(fields["is_anomaly"] for fields in results.values())
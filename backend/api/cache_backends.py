@@ -0,0 +1,303 @@
+"""
+Shared-memory cache backend for several worker processes on one host.
+
+SharedMemoryCache keeps entries in a memory-mapped file (in /dev/shm when
+available), so every gunicorn worker on the host reads and writes the same
+cache without running Redis. Reads are a hash lookup plus an unpickle, well
+under a millisecond for dashboard-sized payloads.
+
+Layout: a small header followed by fixed-size slots. A key hashes to one
+window of PROBE_WINDOW consecutive slots and lives in any slot of that
+window. Windows never overlap, so each one is also a lock stripe: writers
+take an fcntl byte-range lock on their window only (plus a process-local
+lock, since fcntl locks do not exclude threads of the same process).
+
+Eviction: expired entries are dropped when found; when a window is full
+the least recently used entry in it is replaced. Values larger than a slot
+are not cached. Key versioning is the usual Django make_key() scheme.
+
+Configure with CACHE_URL=shmcache://<name>?slots=1024&slot_size=16384
+(the file is /dev/shm/<name>.cache), or LOCATION set to an absolute path.
+Every process must use the same slots/slot_size; a file with a different
+layout is reinitialized.
+"""
+
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: the process-local lock still applies
+    fcntl = None
+
+MAGIC = b"SCSHMC01"
+HEADER = struct.Struct("<8sII")
+HEADER_SIZE = 64
+# state, key hash, expires at (0 = never), last access, key length, value length
+SLOT = struct.Struct("<B7xQddII")
+
+EMPTY, USED = 0, 1
+PROBE_WINDOW = 8
+
+DEFAULT_SLOTS = 1024
+DEFAULT_SLOT_SIZE = 16 * 1024
+
+
+def shared_memory_dir():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        slots = int(options.get("SLOTS", DEFAULT_SLOTS))
+        self.slot_size = int(options.get("SLOT_SIZE", DEFAULT_SLOT_SIZE))
+        if self.slot_size <= SLOT.size:
+            raise ValueError(f"SLOT_SIZE must be larger than {SLOT.size} bytes")
+
+        # Round up to whole windows
+        self.windows = max(-(-slots // PROBE_WINDOW), 1)
+        self.slots = self.windows * PROBE_WINDOW
+        self.size = HEADER_SIZE + self.slots * self.slot_size
+
+        name = location or "smartcity"
+        self.path = name if os.path.isabs(name) else os.path.join(shared_memory_dir(), f"{name}.cache")
+
+        self._thread_lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    # ------------------------------------------------------------------
+    # File and locking
+    # ------------------------------------------------------------------
+
+    def _open(self):
+        """
+        Map the cache file, once per process (a forked worker maps its own).
+        """
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock_range(fd, 0, 0)
+        try:
+            header = os.pread(fd, HEADER.size, 0)
+            expected = HEADER.pack(MAGIC, self.slots, self.slot_size)
+            if header != expected or os.fstat(fd).st_size != self.size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, expected, 0)
+        finally:
+            self._unlock_range(fd, 0, 0)
+        self._map = mmap.mmap(fd, self.size)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _lock_range(fd, start, length):
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_EX, length, start)
+
+    @staticmethod
+    def _unlock_range(fd, start, length):
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_UN, length, start)
+
+    @contextmanager
+    def _locked(self, window=None):
+        """
+        Lock one window, or the whole file when `window` is None.
+        """
+        self._open()
+        if window is None:
+            start, length = 0, 0
+        else:
+            start = HEADER_SIZE + window * PROBE_WINDOW * self.slot_size
+            length = PROBE_WINDOW * self.slot_size
+        with self._thread_lock:
+            self._lock_range(self._fd, start, length)
+            try:
+                yield
+            finally:
+                self._unlock_range(self._fd, start, length)
+
+    # ------------------------------------------------------------------
+    # Slots
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * self.slot_size
+
+    def _read_header(self, slot):
+        return SLOT.unpack_from(self._map, self._offset(slot))
+
+    def _lookup(self, window, key_hash, key, now):
+        """
+        Scan a window. Returns (slot holding `key` or None, slot to write a
+        new entry into). Expired entries found on the way are dropped.
+        """
+        first = window * PROBE_WINDOW
+        found, free, lru, lru_access = None, None, first, float("inf")
+        for slot in range(first, first + PROBE_WINDOW):
+            state, h, expires, accessed, key_len, _ = self._read_header(slot)
+            if state == USED and expires and expires <= now:
+                self._map[self._offset(slot)] = EMPTY
+                state = EMPTY
+            if state == EMPTY:
+                if free is None:
+                    free = slot
+                continue
+            if h == key_hash and found is None:
+                start = self._offset(slot) + SLOT.size
+                if self._map[start : start + key_len] == key:
+                    found = slot
+            if accessed < lru_access:
+                lru, lru_access = slot, accessed
+        return found, free if free is not None else lru
+
+    def _read_value(self, slot):
+        _, _, _, _, key_len, value_len = self._read_header(slot)
+        start = self._offset(slot) + SLOT.size + key_len
+        return self._map[start : start + value_len]
+
+    def _write(self, slot, key_hash, key, value, expires, now):
+        offset = self._offset(slot)
+        self._map[offset + SLOT.size : offset + SLOT.size + len(key) + len(value)] = key + value
+        SLOT.pack_into(self._map, offset, USED, key_hash, expires, now, len(key), len(value))
+
+    def _prepare(self, key, version):
+        key = self.make_and_validate_key(key, version=version).encode()
+        key_hash = self._hash(key)
+        return key, key_hash, key_hash % self.windows
+
+    def _fits(self, key, value):
+        return SLOT.size + len(key) + len(value) <= self.slot_size
+
+    def _expiry(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return 0.0 if expires is None else expires
+
+    # ------------------------------------------------------------------
+    # Cache API
+    # ------------------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key, key_hash, window = self._prepare(key, version)
+        with self._locked(window):
+            now = time.time()
+            slot, _ = self._lookup(window, key_hash, key, now)
+            if slot is None:
+                return default
+            struct.pack_into("<d", self._map, self._offset(slot) + 24, now)
+            value = self._read_value(slot)
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(key, value, timeout, version, only_new=False)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store(key, value, timeout, version, only_new=True)
+
+    def _store(self, key, value, timeout, version, only_new):
+        key, key_hash, window = self._prepare(key, version)
+        value = pickle.dumps(value, self.pickle_protocol)
+        if not self._fits(key, value):
+            # Too large to cache; make sure a stale smaller value is not served
+            self._delete_raw(key, key_hash, window)
+            return False
+        with self._locked(window):
+            now = time.time()
+            found, target = self._lookup(window, key_hash, key, now)
+            if found is not None and only_new:
+                return False
+            self._write(found if found is not None else target, key_hash, key, value, self._expiry(timeout), now)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash, window = self._prepare(key, version)
+        with self._locked(window):
+            slot, _ = self._lookup(window, key_hash, key, time.time())
+            if slot is None:
+                return False
+            struct.pack_into("<d", self._map, self._offset(slot) + 16, self._expiry(timeout))
+        return True
+
+    def delete(self, key, version=None):
+        return self._delete_raw(*self._prepare(key, version))
+
+    def _delete_raw(self, key, key_hash, window):
+        with self._locked(window):
+            slot, _ = self._lookup(window, key_hash, key, time.time())
+            if slot is None:
+                return False
+            self._map[self._offset(slot)] = EMPTY
+        return True
+
+    def has_key(self, key, version=None):
+        key, key_hash, window = self._prepare(key, version)
+        with self._locked(window):
+            slot, _ = self._lookup(window, key_hash, key, time.time())
+        return slot is not None
+
+    def incr(self, key, delta=1, version=None):
+        """
+        Atomic across processes: the read and the write happen under the
+        same window lock.
+        """
+        key, key_hash, window = self._prepare(key, version)
+        with self._locked(window):
+            now = time.time()
+            slot, _ = self._lookup(window, key_hash, key, now)
+            if slot is None:
+                raise ValueError(f"Key '{key.decode()}' not found")
+            new_value = pickle.loads(self._read_value(slot)) + delta
+            value = pickle.dumps(new_value, self.pickle_protocol)
+            if not self._fits(key, value):
+                raise ValueError(f"Value for '{key.decode()}' no longer fits in a cache slot")
+            expires = self._read_header(slot)[2]
+            self._write(slot, key_hash, key, value, expires, now)
+        return new_value
+
+    def update(self, key, func, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Atomically replace the value of `key` with func(current value or
+        None) and return the new value. Used for cross-process counters
+        such as the rate limiter's token buckets.
+        """
+        key, key_hash, window = self._prepare(key, version)
+        with self._locked(window):
+            now = time.time()
+            found, target = self._lookup(window, key_hash, key, now)
+            current = pickle.loads(self._read_value(found)) if found is not None else None
+            new_value = func(current)
+            value = pickle.dumps(new_value, self.pickle_protocol)
+            if self._fits(key, value):
+                self._write(found if found is not None else target, key_hash, key, value, self._expiry(timeout), now)
+            elif found is not None:
+                self._map[self._offset(found)] = EMPTY
+        return new_value
+
+    def clear(self):
+        with self._locked():
+            for slot in range(self.slots):
+                self._map[self._offset(slot)] = EMPTY
+
+    def close(self, **kwargs):
+        # Called at the end of every request; the mapping stays open
+        pass
@@ -0,0 +1,92 @@
+"""
+Cache keys and invalidation for derived API payloads.
+
+Report lists (GET /api/reports/) are cached per generation: every key
+includes the current value of a report generation counter, and any
+CitizenReport write bumps the counter, which orphans every cached list at
+once in O(1). Orphaned entries are never read again and simply expire.
+The counter never restarts from a low number (it is seeded from the clock)
+so entries from before an eviction of the counter cannot match again.
+
+Lists longer than REPORT_LIST_CACHE_MAX_ROWS are not cached: a shmcache
+slot (16 KB by default) holds about 150 pickled reports and silently drops
+anything larger. Such a list leaves a small REPORT_LIST_TOO_LARGE marker
+under its key instead, so until the next write the same request skips the
+cache and may read from a replica.
+
+Hits, misses and bypasses are counted per process and exported on /metrics.
+"""
+
+import hashlib
+import json
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+from .metrics import register_collector
+
+REPORT_FACETS_CACHE_KEY = "reports:facets"
+REPORT_FACETS_TIMEOUT = 300  # seconds
+
+DASHBOARD_CACHE_KEY = "dashboard"
+
+REPORT_GENERATION_KEY = "reports:generation"
+# Cached in place of a list too large to cache
+REPORT_LIST_TOO_LARGE = "too-large"
+
+# "hit"/"miss"/"bypass" -> report list lookups by this process
+_report_list_lookups = Counter()
+
+
+def report_generation():
+    generation = cache.get(REPORT_GENERATION_KEY)
+    if generation is None:
+        cache.add(REPORT_GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(REPORT_GENERATION_KEY)
+    return generation
+
+
+def bump_report_generation():
+    try:
+        cache.incr(REPORT_GENERATION_KEY)
+    except ValueError:
+        # Not cached (evicted or never read): start above every older value
+        cache.set(REPORT_GENERATION_KEY, time.time_ns(), None)
+
+
+def report_list_cache_key(*parts):
+    """
+    Key for a report list under the current generation; `parts` are the
+    JSON-serializable inputs the response depends on.
+    """
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+    return f"reports:list:{report_generation()}:{digest}"
+
+
+def count_report_list_lookup(result):
+    _report_list_lookups[result] += 1
+
+
+def _collect():
+    for result, count in _report_list_lookups.items():
+        yield "report_list_cache_lookups_total", (result,), count
+
+
+register_collector(_collect)
+
+
+def invalidate_report_caches():
+    """
+    Drop every cached payload derived from CitizenReport rows.
+    Must be called after any write to the table, including bulk updates.
+    """
+    bump_report_generation()
+    cache.delete_many([REPORT_FACETS_CACHE_KEY, DASHBOARD_CACHE_KEY])
+
+
+def invalidate_dashboard_cache():
+    """
+    Drop the cached dashboard payload. Called when a new log is saved.
+    """
+    cache.delete(DASHBOARD_CACHE_KEY)
@@ -0,0 +1,152 @@
+"""
+Incremental change feed across the API models.
+
+A client polls GET /api/changes/ with the cursor of its previous poll and
+gets the rows created or updated since then, plus tombstones for deleted
+rows. Each model is read in (change column, id) order from an index on
+exactly that pair, so a poll costs O(changes), not O(table):
+
+- reports: updated_at (bulk status changes bump it too)
+- traffic-logs: ingested_at; write-behind rows keep the request time as
+  created_at but can be inserted much later, after a retry or by crash
+  recovery (see api/spool.py)
+- energy-logs, waste-logs, subscribers: created_at; these rows are not
+  edited after ingest (rescan_energy_anomalies rescoring is the exception
+  and is not replayed through the feed)
+- deletions: Tombstone rows written by a post_delete signal
+
+Timestamps are taken when a row is saved, not when its transaction
+commits, so a slow transaction can make a row visible after later ones.
+The feed therefore only reads up to CHANGE_FEED_SETTLE_SECONDS ago; rows
+newer than that come in a later poll. For the same reason the feed always
+reads the primary, never a lagging replica.
+
+The cursor is opaque to clients: base64 of the last (timestamp, id) per
+model and for the tombstones, plus the models it covers. Delivery is at
+least once; applying a change twice is harmless.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CitizenReport, EnergyLog, Subscriber, Tombstone, TrafficLog, WasteLog
+from .serializers import (
+    CitizenReportSerializer,
+    EnergyLogSerializer,
+    SubscriberSerializer,
+    TrafficLogSerializer,
+    WasteLogSerializer,
+)
+
+# name -> (model, change column, serializer)
+FEEDS = {
+    "traffic-logs": (TrafficLog, "ingested_at", TrafficLogSerializer),
+    "energy-logs": (EnergyLog, "created_at", EnergyLogSerializer),
+    "waste-logs": (WasteLog, "created_at", WasteLogSerializer),
+    "reports": (CitizenReport, "updated_at", CitizenReportSerializer),
+    "subscribers": (Subscriber, "created_at", SubscriberSerializer),
+}
+FEED_NAMES = {model: name for name, (model, _, _) in FEEDS.items()}
+
+CURSOR_VERSION = 1
+TOMBSTONES = "deleted"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(models, positions):
+    payload = {
+        "v": CURSOR_VERSION,
+        "m": models,
+        "p": {name: [at.isoformat(), pk] for name, (at, pk) in positions.items()},
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Return (models, positions) from a cursor. Raises InvalidCursor.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["v"] != CURSOR_VERSION:
+            raise InvalidCursor("Cursor from an incompatible version")
+        models = payload["m"]
+        positions = {
+            name: (datetime.fromisoformat(at), int(pk)) for name, (at, pk) in payload["p"].items()
+        }
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not set(models) <= set(FEEDS):
+        raise InvalidCursor("Cursor names unknown models")
+    return models, positions
+
+
+def start_positions(models):
+    """
+    Positions at the current end of every table: the first poll with them
+    returns only what changes from now on.
+    """
+    horizon = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+    return {name: (horizon, 0) for name in [*models, TOMBSTONES]}
+
+
+def _after(queryset, column, position):
+    if position is None:
+        return queryset
+    at, pk = position
+    # The plain range condition lets the planner bound the index scan
+    return queryset.filter(**{f"{column}__gte": at}).filter(
+        Q(**{f"{column}__gt": at}) | Q(**{column: at, "id__gt": pk})
+    )
+
+
+def _page(queryset, column, position, horizon, limit):
+    rows = list(
+        _after(queryset, column, position).filter(**{f"{column}__lte": horizon}).order_by(column, "id")[: limit + 1]
+    )
+    return rows[:limit], len(rows) > limit
+
+
+def read_changes(models, positions, limit):
+    """
+    Up to `limit` changes per model and `limit` deletions after
+    `positions`. Returns (changes, new positions, has_more).
+    """
+    horizon = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+    positions = dict(positions)
+    changes, has_more = [], False
+
+    for name in models:
+        model, column, serializer_class = FEEDS[name]
+        rows, more = _page(model._default_manager.all(), column, positions.get(name), horizon, limit)
+        has_more |= more
+        if rows:
+            positions[name] = (getattr(rows[-1], column), rows[-1].pk)
+        changes.extend(
+            {"model": name, "op": "upsert", "id": row.pk, "changed_at": getattr(row, column), "data": data}
+            for row, data in zip(rows, serializer_class(rows, many=True).data)
+        )
+
+    tombstones, more = _page(
+        Tombstone.objects.filter(model__in=models), "deleted_at", positions.get(TOMBSTONES), horizon, limit
+    )
+    has_more |= more
+    if tombstones:
+        positions[TOMBSTONES] = (tombstones[-1].deleted_at, tombstones[-1].pk)
+    changes.extend(
+        {"model": t.model, "op": "delete", "id": t.object_id, "changed_at": t.deleted_at, "data": None}
+        for t in tombstones
+    )
+    return changes, positions, has_more
+
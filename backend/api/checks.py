@@ -0,0 +1,29 @@
+"""
+Deployment checks (`manage.py check --deploy`).
+"""
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCMEM_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Cached facets, dashboard and report lists are dropped on commit in the
+    writing worker's cache only; with a per-process cache the other workers
+    keep serving the old payload until it expires.
+    """
+    if settings.CACHES["default"]["BACKEND"] != LOCMEM_BACKEND or settings.GUNICORN_WORKERS <= 1:
+        return []
+    return [
+        Warning(
+            f"The default cache is per-process but GUNICORN_WORKERS is {settings.GUNICORN_WORKERS}.",
+            hint=(
+                "Set CACHE_URL=shmcache://smartcity so every worker shares the cached facets, "
+                "dashboard, report lists and throttle buckets."
+            ),
+            id="api.W001",
+        )
+    ]
@@ -0,0 +1,163 @@
+"""
+Read-replica routing.
+
+With DATABASE_REPLICA_URLS set, settings adds one `replica_N` database per
+URL and installs PrimaryReplicaRouter. Reads go to a replica only when all
+of the following hold, and to the primary otherwise:
+
+- the view opted in with ReplicaReadMixin, and the request is a GET/HEAD
+- the client has not written in the last REPLICA_STICKY_SECONDS, so it
+  always reads its own writes
+- no transaction is open on the primary
+- the replica's replay lag is under REPLICA_MAX_LAG_SECONDS
+
+Writes, migrations, management commands and background work always use the
+primary.
+"""
+
+import contextvars
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .admission import client_ip
+
+logger = logging.getLogger(__name__)
+
+PIN_CACHE_KEY = "db:pin-primary:{}"
+
+
+class RoutingState:
+    __slots__ = ("replica_allowed", "pinned")
+
+    def __init__(self, pinned=False):
+        self.replica_allowed = False
+        self.pinned = pinned
+
+
+# Set per request by ReplicaRoutingMiddleware and deliberately not reset at
+# the end, so streamed responses keep their routing while they are consumed.
+_state = contextvars.ContextVar("db_routing", default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica_")]
+
+
+def allow_replica_reads():
+    """
+    Let the rest of the current request read from a replica.
+    """
+    state = _state.get()
+    if state is not None and not state.pinned:
+        state.replica_allowed = True
+
+
+# alias -> (checked at, usable)
+_lag_checks = {}
+
+
+def _replica_lag(alias):
+    """
+    Return the replica's replay lag in seconds (0 when it is caught up or
+    when the backend has no replication to measure).
+    """
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_usable(alias):
+    """
+    Lag check, cached per process for REPLICA_LAG_CHECK_INTERVAL seconds.
+    An unreachable replica counts as unusable until the next check.
+    """
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return checked[1]
+    try:
+        lag = _replica_lag(alias)
+        usable = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not usable:
+            logger.warning(f"Replica {alias} is {lag:.1f}s behind, reading from the primary")
+    except DatabaseError as e:
+        logger.warning(f"Replica {alias} lag check failed, reading from the primary: {e}")
+        usable = False
+    _lag_checks[alias] = (now, usable)
+    return usable
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_allowed or state.pinned:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        candidates = [alias for alias in replica_aliases() if replica_usable(alias)]
+        return random.choice(candidates) if candidates else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Starts the routing state for each request and pins a client to the
+    primary for REPLICA_STICKY_SECONDS after it writes. The pin is kept in
+    the shared cache under the client address, because the frontend calls
+    the API cross-origin without cookies.
+    """
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        client = client_ip(request)
+        write = request.method not in SAFE_METHODS
+        pinned = write or bool(cache.get(PIN_CACHE_KEY.format(client)))
+        _state.set(RoutingState(pinned=pinned))
+
+        response = self.get_response(request)
+
+        if write and response.status_code < 400:
+            cache.set(PIN_CACHE_KEY.format(client), True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    APIView/ViewSet mixin that lets safe requests read from a replica.
+    Set `replica_actions` on a ViewSet to limit it to some actions.
+    """
+
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and (
+            self.replica_actions is None or getattr(self, "action", None) in self.replica_actions
+        ):
+            allow_replica_reads()
@@ -0,0 +1,57 @@
+"""
+Database connection statistics for /metrics.
+
+Counts the physical connections each worker opens and reports the age of
+persistent connections (DB_CONN_MAX_AGE) or, with DB_POOL, the state of the
+per-process psycopg pool. See the connection settings in core/settings.py.
+"""
+
+import time
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import register_collector
+
+# alias -> connections opened by this process without a pool
+_opened = Counter()
+
+
+def _pool(connection):
+    # Only look the pool up: the `pool` property would create one
+    return getattr(type(connection), "_connection_pools", {}).get(connection.alias)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    # With a pool this fires on every checkout; the pool counts real opens
+    if _pool(connection) is None:
+        connection.opened_at = time.monotonic()
+        _opened[connection.alias] += 1
+
+
+def collect():
+    seen_pools = set()
+    for alias, count in _opened.items():
+        yield "db_connections_opened_total", (alias,), count
+
+    for connection in connections.all(initialized_only=True):
+        alias = connection.alias
+        pool = _pool(connection)
+        if pool is not None:
+            if alias in seen_pools:
+                continue
+            seen_pools.add(alias)
+            stats = pool.get_stats()
+            size = stats.get("pool_size", 0)
+            yield "db_connections_opened_total", (alias,), stats.get("connections_num", 0)
+            yield "db_pool_size", (alias,), size
+            yield "db_pool_in_use", (alias,), size - stats.get("pool_available", 0)
+            yield "db_pool_waiting", (alias,), stats.get("requests_waiting", 0)
+        elif connection.connection is not None and hasattr(connection, "opened_at"):
+            yield "db_connection_age_seconds", (alias,), time.monotonic() - connection.opened_at
+
+
+register_collector(collect)
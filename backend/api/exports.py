@@ -0,0 +1,289 @@
+"""
+Streaming helpers for large exports.
+
+Rows are rendered one at a time and flushed in ~64 KB chunks, so memory
+stays flat no matter how many rows are exported.
+
+Bulk exports of the log and report tables (stream_export()) read the date
+range in keyset windows of EXPORT_WINDOW rows ordered by (created_at, id).
+Each window is its own short query streamed through a server-side cursor,
+so an export of tens of millions of rows never holds one long transaction,
+snapshot or lock on the tables that ingest is writing to. Output is CSV,
+NDJSON or, with pyarrow installed, Parquet written one row group at a time,
+optionally gzipped on the fly.
+"""
+
+import csv
+import json
+import zlib
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import CitizenReport, EnergyLog, TrafficLog, WasteLog
+from .renderers import dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: Parquet exports are unavailable without it
+    pa = pq = None
+
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Echo:
+    """File-like object whose write() hands the value straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def _ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    if settings.JSON_BACKEND == "orjson":
+        # Same output, with DjangoJSONEncoder handling dates and Decimals
+        for row in rows:
+            yield dumps(dict(zip(columns, row)), default=encoder.default) + b"\n"
+        return
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+def _buffered(lines, size=CHUNK_SIZE):
+    buffer, length = [], 0
+    for line in lines:
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def stream_rows(columns, rows, export_format):
+    """
+    Return an iterator of encoded chunks for `rows` (tuples matching
+    `columns`) in the given export format ("ndjson" or "csv").
+    """
+    if export_format == "csv":
+        return _buffered(_csv_lines(columns, rows))
+    if export_format == "ndjson":
+        return _buffered(_ndjson_lines(columns, rows))
+    raise ValueError(f"Unsupported export format: {export_format}")
+
+
+# ----------------------------------------------------------------------
+# Bulk exports of logs and reports
+# ----------------------------------------------------------------------
+
+EXPORTABLE_MODELS = {
+    "traffic-logs": TrafficLog,
+    "energy-logs": EnergyLog,
+    "waste-logs": WasteLog,
+    "reports": CitizenReport,
+}
+
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+# Rows per keyset query
+EXPORT_WINDOW = 10000
+# Rows fetched per round trip within a window
+EXPORT_CHUNK_SIZE = 2000
+PARQUET_ROW_GROUP = 50000
+
+
+def export_formats():
+    return [*EXPORT_CONTENT_TYPES, *(["parquet"] if pa is not None else [])]
+
+
+def parse_bound(value):
+    """
+    Parse an export range bound: an ISO date (midnight) or datetime, in
+    the default time zone when it has none. Raises ValueError.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def keyset_rows(queryset, columns, window=EXPORT_WINDOW):
+    """
+    Yield `columns` of every row of `queryset` in (created_at, id) order,
+    one query per `window` rows, each resuming after the last row seen.
+    """
+    extra = [name for name in ("created_at", "id") if name not in columns]
+    created_index = (list(columns) + extra).index("created_at")
+    id_index = (list(columns) + extra).index("id")
+    ordered = queryset.order_by("created_at", "id")
+    last = None
+    while True:
+        page = ordered
+        if last is not None:
+            page = page.filter(created_at__gte=last[0]).filter(
+                Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1])
+            )
+        seen = 0
+        for row in page.values_list(*columns, *extra)[:window].iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            seen += 1
+            last = (row[created_index], row[id_index])
+            yield row[: len(columns)] if extra else row
+        if seen < window:
+            return
+
+
+def gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _arrow_type(field):
+    if field.is_relation:
+        field = field.target_field
+    internal = field.get_internal_type()
+    if internal in ("AutoField", "BigAutoField", "IntegerField", "BigIntegerField", "SmallIntegerField",
+                    "PositiveIntegerField", "PositiveSmallIntegerField", "PositiveBigIntegerField"):
+        return pa.int64()
+    if internal in ("FloatField", "DecimalField"):
+        return pa.float64()
+    if internal == "BooleanField":
+        return pa.bool_()
+    if internal == "DateTimeField":
+        return pa.timestamp("us", tz="UTC")
+    if internal == "DateField":
+        return pa.date32()
+    # Text, and JSON encoded as text
+    return pa.string()
+
+
+class _ChunkSink:
+    """Write-only file object that collects what the Parquet writer emits."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_parquet(fields, rows, row_group=PARQUET_ROW_GROUP):
+    """
+    Encode `rows` (tuples of the model `fields`' values) as a Parquet file,
+    yielding each row group as soon as it is written.
+    """
+    schema = pa.schema([(field.attname, _arrow_type(field)) for field in fields])
+    encoders = [
+        (lambda v: None if v is None else json.dumps(v, ensure_ascii=False, cls=DjangoJSONEncoder))
+        if field.get_internal_type() == "JSONField"
+        else None
+        for field in fields
+    ]
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def write(batch):
+        columns = [list(column) for column in zip(*batch)]
+        for index, encode in enumerate(encoders):
+            if encode is not None:
+                columns[index] = [encode(value) for value in columns[index]]
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group:
+            write(batch)
+            batch = []
+            yield sink.take()
+    if batch:
+        write(batch)
+    writer.close()
+    yield sink.take()
+
+
+def stream_export(model, export_format, start=None, end=None, compress=False):
+    """
+    Export every row of `model` created in [start, end) (either may be
+    None). Returns (iterator of encoded chunks, content type, file name).
+    """
+    queryset = model._default_manager.all()
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    fields = model._meta.concrete_fields
+    columns = [field.attname for field in fields]
+    rows = keyset_rows(queryset, columns)
+
+    if export_format == "parquet":
+        if pa is None:
+            raise ValueError("Parquet exports need pyarrow installed")
+        chunks, content_type = stream_parquet(fields, rows), PARQUET_CONTENT_TYPE
+    else:
+        chunks, content_type = stream_rows(columns, rows, export_format), EXPORT_CONTENT_TYPES[export_format]
+
+    filename = f"{model._meta.model_name}.{export_format}"
+    if compress:
+        chunks, content_type, filename = gzipped(chunks), "application/gzip", f"{filename}.gz"
+    return chunks, content_type, filename
@@ -0,0 +1,519 @@
+"""
+Per-location traffic forecasts from TrafficLog history.
+
+Each location (keyed like citizen reports, by its normalized address) gets
+a small model for congestion_rate, flow_speed and delay_time:
+
+- a time-of-week profile: per hour of the week (UTC) the running sum and
+  count of each metric; while an hour has few observations it leans on the
+  same hour of every weekday, and that on the location's overall mean
+- a recent trend: how far the latest observations ran above or below the
+  profile, fading with a half-life of TREND_HALF_LIFE_HOURS
+
+prediction(t) = profile[hour of week of t] + trend * fade(t - last observation)
+
+The status code is the one whose mean congestion is closest to the
+predicted congestion, learned from the same rows, so it follows whatever
+scale n8n reports in.
+
+The whole model set is a handful of NumPy arrays. fit() builds it from the
+full history in chunks; afterwards every worker folds in TrafficLog rows it
+has not seen yet (by id) at most every TRAFFIC_FORECAST_REFRESH_SECONDS,
+which is a single indexed query and an O(1) update per row. The arrays are
+kept in memory and saved to TRAFFIC_FORECAST_FILE, so a restarted worker
+only catches up on rows written since the last save.
+
+Nothing but loading the saved file runs on a request: catching up,
+saving and full fits happen in one background thread per worker, which
+updates a copy of the model and swaps it in, so requests keep answering
+from the current model (or without forecasts when there is none yet).
+`manage.py fit_traffic_forecast` runs full fits too; a worker with no
+model or one too far behind starts one, at most one per host.
+"""
+
+import copy
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .anomaly import HOURS_PER_WEEK, epoch_hour_of_week
+from .models import TrafficLog
+from .similarity import location_key
+
+try:
+    import numpy as np
+except ImportError:  # Optional: forecasts are unavailable without it
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: background fits are single-flight per process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("congestion_rate", "flow_speed", "delay_time")
+# Weight, in observations, of the coarser estimate a profile hour starts from
+PRIOR_WEIGHT = 1.0
+TREND_HALF_LIFE_HOURS = 2.0
+TREND_WEIGHT = 0.5
+# Observations replayed per location to seed the trend after a full fit
+TREND_WINDOW = 24
+MIN_OBSERVATIONS = 10
+
+FIT_CHUNK_SIZE = 20000
+# Catching up on more rows than this refits from scratch instead
+MAX_CATCH_UP = 50000
+# Rows younger than this may still be followed by lower ids committing late
+SETTLE_SECONDS = 5
+SAVE_INTERVAL_SECONDS = 300
+
+
+def _fade(hours):
+    return 0.5 ** (np.maximum(hours, 0.0) / TREND_HALF_LIFE_HOURS)
+
+
+class TrafficForecaster:
+    """
+    Model arrays for every known location. Row i of each array belongs to
+    keys[i]; `fitted_through` is the last TrafficLog id folded in.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.addresses = []
+        self.index = {}
+        self.sums = np.zeros((0, HOURS_PER_WEEK, len(METRICS)))
+        self.counts = np.zeros((0, HOURS_PER_WEEK))
+        self.trend = np.zeros((0, len(METRICS)))
+        self.trend_at = np.zeros(0)
+        self.status_codes = []
+        self.status_colors = []
+        self.status_sums = np.zeros(0)
+        self.status_counts = np.zeros(0)
+        self.fitted_through = 0
+
+    # ------------------------------------------------------------------
+    # Prediction
+    # ------------------------------------------------------------------
+
+    def _profile(self, row, slots):
+        # Hour of the week, shrunk towards the same hour on every day, which
+        # is shrunk towards the location mean
+        sums, counts = self.sums[row], self.counts[row]
+        mean = sums.sum(axis=0) / max(counts.sum(), 1)
+        hours = slots % 24
+        daily_sums = sums.reshape(7, 24, -1).sum(axis=0)[hours]
+        daily_counts = counts.reshape(7, 24).sum(axis=0)[hours, None]
+        daily = (daily_sums + PRIOR_WEIGHT * mean) / (daily_counts + PRIOR_WEIGHT)
+        return (sums[slots] + PRIOR_WEIGHT * daily) / (counts[slots, None] + PRIOR_WEIGHT)
+
+    def predict(self, location, times):
+        """
+        Predicted metrics for `location` at each datetime in `times`, as an
+        array (len(times) x METRICS), or None without enough history.
+        """
+        row = self.index.get(location_key(location))
+        if row is None or self.counts[row].sum() < MIN_OBSERVATIONS:
+            return None
+        seconds = np.array([t.timestamp() for t in times])
+        profile = self._profile(row, epoch_hour_of_week(seconds.astype(np.int64)))
+        fade = _fade((seconds - self.trend_at[row]) / 3600)
+        return profile + fade[:, None] * self.trend[row]
+
+    def status_for(self, congestion):
+        known = self.status_counts > 0
+        if not known.any():
+            return None, None
+        centers = np.where(known, self.status_sums / np.maximum(self.status_counts, 1), np.inf)
+        best = int(np.argmin(np.abs(centers - congestion)))
+        return self.status_codes[best], self.status_colors[best]
+
+    def observations(self, location):
+        row = self.index.get(location_key(location))
+        return 0 if row is None else int(self.counts[row].sum())
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def _row(self, address):
+        key = location_key(address)
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            self.keys.append(key)
+            self.addresses.append(address)
+            self.index[key] = row
+            self.sums = np.concatenate([self.sums, np.zeros((1, HOURS_PER_WEEK, len(METRICS)))])
+            self.counts = np.concatenate([self.counts, np.zeros((1, HOURS_PER_WEEK))])
+            self.trend = np.concatenate([self.trend, np.zeros((1, len(METRICS)))])
+            self.trend_at = np.concatenate([self.trend_at, np.zeros(1)])
+        return row
+
+    def _status(self, code):
+        if code not in self.status_codes:
+            self.status_codes.append(code)
+            self.status_colors.append("")
+            self.status_sums = np.append(self.status_sums, 0.0)
+            self.status_counts = np.append(self.status_counts, 0.0)
+        return self.status_codes.index(code)
+
+    def _update_trend(self, row, seconds, values):
+        # Residual against the profile before this observation is counted
+        slot = epoch_hour_of_week(int(seconds))
+        expected = self._profile(row, np.array([slot]))[0]
+        faded = self.trend[row] * _fade((seconds - self.trend_at[row]) / 3600)
+        self.trend[row] = faded + TREND_WEIGHT * (values - expected - faded)
+        self.trend_at[row] = seconds
+
+    def observe(self, pk, address, created_at, values, status_code, status_color):
+        """
+        Fold one TrafficLog row into the model (O(1)).
+        """
+        row = self._row(address)
+        seconds = created_at.timestamp()
+        values = np.asarray(values, dtype=float)
+        if self.counts[row].sum():
+            self._update_trend(row, seconds, values)
+        else:
+            self.trend_at[row] = seconds
+        slot = epoch_hour_of_week(int(seconds))
+        self.sums[row, slot] += values
+        self.counts[row, slot] += 1
+        if status_code:
+            status = self._status(status_code)
+            self.status_sums[status] += values[0]
+            self.status_counts[status] += 1
+            self.status_colors[status] = status_color or self.status_colors[status]
+        self.fitted_through = max(self.fitted_through, pk)
+
+    @classmethod
+    def fit(cls, rows):
+        """
+        Build a forecaster from (id, address, created_at, congestion_rate,
+        flow_speed, delay_time, status_code, status_color) rows in id order,
+        accumulating the profiles with NumPy one chunk at a time.
+        """
+        forecaster = cls()
+        recent = {}
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= FIT_CHUNK_SIZE:
+                forecaster._fit_chunk(chunk, recent)
+                chunk = []
+        if chunk:
+            forecaster._fit_chunk(chunk, recent)
+
+        # Seed each trend by replaying the location's latest observations
+        # against the finished profile
+        for row, observations in recent.items():
+            forecaster.trend_at[row] = observations[0][0]
+            for seconds, values in observations:
+                forecaster._update_trend(row, seconds, values)
+        return forecaster
+
+    def _fit_chunk(self, chunk, recent):
+        ids, addresses, created, *metrics, codes, colors = zip(*chunk)
+        rows = np.array([self._row(address) for address in addresses])
+        seconds = np.array([at.timestamp() for at in created])
+        slots = epoch_hour_of_week(seconds.astype(np.int64))
+        values = np.column_stack([np.asarray(metric, dtype=float) for metric in metrics])
+
+        np.add.at(self.sums, (rows, slots), values)
+        np.add.at(self.counts, (rows, slots), 1)
+        statuses = np.array([self._status(code) for code in codes])
+        np.add.at(self.status_sums, statuses, values[:, 0])
+        np.add.at(self.status_counts, statuses, 1)
+        for status, color in zip(statuses.tolist(), colors):
+            if color:
+                self.status_colors[status] = color
+
+        for row, second, value in zip(rows.tolist(), seconds.tolist(), values):
+            observations = recent.setdefault(row, [])
+            observations.append((second, value))
+            if len(observations) > TREND_WINDOW:
+                del observations[0]
+        self.fitted_through = max(self.fitted_through, max(ids))
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    keys=np.array(self.keys, dtype=str),
+                    addresses=np.array(self.addresses, dtype=str),
+                    sums=self.sums,
+                    counts=self.counts,
+                    trend=self.trend,
+                    trend_at=self.trend_at,
+                    status_codes=np.array(self.status_codes, dtype=str),
+                    status_colors=np.array(self.status_colors, dtype=str),
+                    status_sums=self.status_sums,
+                    status_counts=self.status_counts,
+                    fitted_through=np.array(self.fitted_through),
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        forecaster = cls()
+        with np.load(path, allow_pickle=False) as data:
+            forecaster.keys = data["keys"].tolist()
+            forecaster.addresses = data["addresses"].tolist()
+            forecaster.index = {key: i for i, key in enumerate(forecaster.keys)}
+            forecaster.sums = data["sums"]
+            forecaster.counts = data["counts"]
+            forecaster.trend = data["trend"]
+            forecaster.trend_at = data["trend_at"]
+            forecaster.status_codes = data["status_codes"].tolist()
+            forecaster.status_colors = data["status_colors"].tolist()
+            forecaster.status_sums = data["status_sums"]
+            forecaster.status_counts = data["status_counts"]
+            forecaster.fitted_through = int(data["fitted_through"])
+        return forecaster
+
+
+# ----------------------------------------------------------------------
+# Process-wide instance
+# ----------------------------------------------------------------------
+
+ROW_FIELDS = (
+    "id",
+    "address",
+    "created_at",
+    *METRICS,
+    "status_code",
+    "status_color",
+)
+
+_lock = threading.Lock()
+_state = {"forecaster": None, "checked_at": 0.0, "saved_at": 0.0, "file_mtime": None}
+# Held while this process refreshes or fits in the background
+_fit_lock = threading.Lock()
+
+
+def forecast_file():
+    return settings.TRAFFIC_FORECAST_FILE or os.path.join(
+        tempfile.gettempdir(), "smartcity-traffic-forecast.npz"
+    )
+
+
+def _settled_rows():
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    return TrafficLog.objects.filter(created_at__lte=settled).order_by("id").values_list(*ROW_FIELDS)
+
+
+def _file_mtime():
+    try:
+        return os.stat(forecast_file()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def fit_and_save():
+    """
+    Fit from the full history, save it and make it the process's model.
+    """
+    started = time.monotonic()
+    forecaster = TrafficForecaster.fit(_settled_rows().iterator(chunk_size=FIT_CHUNK_SIZE))
+    forecaster.save(forecast_file())
+    now = time.monotonic()
+    logger.info(
+        f"Fitted traffic forecasts for {len(forecaster.keys)} locations "
+        f"through TrafficLog {forecaster.fitted_through} in {now - started:.1f}s"
+    )
+    with _lock:
+        _state.update(forecaster=forecaster, checked_at=now, saved_at=now, file_mtime=_file_mtime())
+    return forecaster
+
+
+def _fit_with_host_lock():
+    with open(forecast_file() + ".lock", "a") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is fitting; its file is loaded on a later refresh
+                return
+        fit_and_save()
+
+
+def _catch_up(forecaster):
+    rows = list(_settled_rows().filter(id__gt=forecaster.fitted_through)[: MAX_CATCH_UP + 1])
+    if len(rows) > MAX_CATCH_UP:
+        return None
+    for pk, address, created_at, *values, code, color in rows:
+        forecaster.observe(pk, address, created_at, values, code, color)
+    return len(rows)
+
+
+def _load_saved(forecaster):
+    """
+    The saved model if the file changed since this process last loaded or
+    wrote it, else `forecaster`.
+    """
+    mtime = _file_mtime()
+    if mtime is None or mtime == _state["file_mtime"]:
+        return forecaster
+    try:
+        loaded = TrafficForecaster.load(forecast_file())
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable traffic forecast file: {e}")
+        return forecaster
+    _state.update(saved_at=time.monotonic(), file_mtime=mtime)
+    if forecaster is not None and loaded.fitted_through <= forecaster.fitted_through:
+        return forecaster
+    return loaded
+
+
+def _refresh(current):
+    """
+    Bring `current` up to date on a copy and make that the process's
+    model; fit from scratch when there is none or it is too far behind.
+    """
+    forecaster = _load_saved(current)
+    if forecaster is current and current is not None:
+        forecaster = copy.deepcopy(current)
+    folded = _catch_up(forecaster) if forecaster is not None else None
+    if folded is None:
+        _fit_with_host_lock()
+        return
+    now = time.monotonic()
+    if folded and now - _state["saved_at"] >= SAVE_INTERVAL_SECONDS:
+        forecaster.save(forecast_file())
+        _state.update(saved_at=now, file_mtime=_file_mtime())
+    with _lock:
+        # A fit_and_save() that finished meanwhile wins
+        if _state["forecaster"] is current:
+            _state["forecaster"] = forecaster
+
+
+def _refresh_in_background(current):
+    try:
+        _refresh(current)
+    except Exception as e:
+        logger.error(f"Background traffic forecast refresh failed: {e}")
+    finally:
+        connections.close_all()
+        _fit_lock.release()
+
+
+def start_background_refresh(current):
+    """
+    Refresh `current` (see _refresh) in a background thread, unless one is
+    already running in this process. Returns whether a thread was started.
+    """
+    if not _fit_lock.acquire(blocking=False):
+        return False
+    try:
+        threading.Thread(
+            target=_refresh_in_background, args=(current,), name="traffic-forecast-refresh", daemon=True
+        ).start()
+    except Exception:
+        _fit_lock.release()
+        raise
+    return True
+
+
+def get_forecaster():
+    """
+    The process's forecaster. Loads the saved model on first use; at most
+    every TRAFFIC_FORECAST_REFRESH_SECONDS starts a background refresh that
+    loads a newer saved model, folds in new TrafficLog rows or, with no
+    model or one more than MAX_CATCH_UP rows behind, fits from scratch.
+
+    Returns at once with the current model, or None while there is none:
+    it answers on the check-traffic path.
+    """
+    with _lock:
+        forecaster = _state["forecaster"]
+        if forecaster is None:
+            # A restarted worker answers from the saved file straight away
+            forecaster = _state["forecaster"] = _load_saved(None)
+        now = time.monotonic()
+        if forecaster is not None and now - _state["checked_at"] < settings.TRAFFIC_FORECAST_REFRESH_SECONDS:
+            return forecaster
+        _state["checked_at"] = now
+    start_background_refresh(forecaster)
+    return forecaster
+
+
+def predicted_traffic(location, at=None):
+    """
+    A check-traffic style payload predicted for `location` at `at` (default
+    now), marked "predicted": true, or None without enough history.
+    """
+    at = at or timezone.now()
+    forecaster = get_forecaster()
+    if forecaster is None:
+        return None
+    predicted = forecaster.predict(location, [at])
+    if predicted is None:
+        return None
+    congestion, flow_speed, delay_time = predicted[0].tolist()
+    status_code, status_color = forecaster.status_for(congestion)
+    observations = forecaster.observations(location)
+    return {
+        "address": location,
+        "congestionRate": round(congestion, 2),
+        "flowSpeed": max(int(round(flow_speed)), 0),
+        "delayTime": max(int(round(delay_time)), 0),
+        "hasIncident": False,
+        "incidentCount": 0,
+        "statusCode": status_code,
+        "statusColor": status_color,
+        "analysis": (
+            f"Predicted from {observations} past observations of {location} "
+            f"for this time of the week and the latest trend."
+        ),
+        "recommendation": "Live analysis was not available; check again for current conditions.",
+        "alternativeRoutes": [],
+        "predicted": True,
+        "predictedFor": at,
+    }
+
+
+def hourly_forecast(location, start, hours):
+    """
+    Predictions for `location` at `start` and each of the following
+    `hours - 1` hours, or None without enough history.
+    """
+    forecaster = get_forecaster()
+    if forecaster is None:
+        return None
+    times = [start + timedelta(hours=h) for h in range(hours)]
+    predicted = forecaster.predict(location, times)
+    if predicted is None:
+        return None
+    points = []
+    for at, (congestion, flow_speed, delay_time) in zip(times, predicted.tolist()):
+        status_code, _ = forecaster.status_for(congestion)
+        points.append(
+            {
+                "at": at,
+                "congestionRate": round(congestion, 2),
+                "flowSpeed": max(int(round(flow_speed)), 0),
+                "delayTime": max(int(round(delay_time)), 0),
+                "statusCode": status_code,
+            }
+        )
+    return {"address": location, "observations": forecaster.observations(location), "forecast": points}
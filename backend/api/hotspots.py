@@ -0,0 +1,141 @@
+"""
+Waste hot-spot index over WasteLog.warning_locations.
+
+warning_locations is a JSON list per WasteLog, so asking which locations
+were on the warning list most often used to mean unpacking every row in
+Python. Each new WasteLog now also writes, in its own transaction:
+
+- a WasteWarningLocation row per distinct location, indexed by
+  (key, created_at), for questions about single locations or logs
+- +1 on the WasteHotspotDaily counter of each location for the day of the
+  log (UTC), with one upsert statement
+
+Locations are matched case- and whitespace-insensitively, as route
+planning does against WasteBin names; a location listed twice in one log
+counts once. Deleting a WasteLog takes its counts back.
+
+GET /api/waste/hotspots/ sums the daily counters over a date range: at
+most (days x locations) small rows, whatever the number of logs. Rows
+written without signals (bulk_create, generate_synthetic_data) are picked
+up by `manage.py rebuild_waste_hotspots`.
+"""
+
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from .models import WasteHotspotDaily, WasteLog, WasteWarningLocation
+
+
+def location_key(name):
+    return " ".join(str(name).split()).casefold()[:255]
+
+
+def _locations(log):
+    """
+    {key: name} for the distinct locations of `log`, keeping the first
+    spelling of each.
+    """
+    locations = {}
+    for name in log.warning_locations or []:
+        key = location_key(name)
+        if key:
+            locations.setdefault(key, str(name).strip()[:255])
+    return locations
+
+
+def _bump(counts, names):
+    """
+    Add `counts` ({(day, key): n}) to the daily counters in one statement.
+    """
+    if not counts:
+        return
+    qn = connection.ops.quote_name
+    table = qn(WasteHotspotDaily._meta.db_table)
+    day, key, name, count = (qn(column) for column in ("day", "key", "name", "count"))
+    placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(counts))
+    params = [p for (d, k), n in counts.items() for p in (d, k, names[k], n)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({day}, {key}, {name}, {count}) VALUES {placeholders} "
+            f"ON CONFLICT ({day}, {key}) DO UPDATE "
+            f"SET {count} = {table}.{count} + excluded.{count}, {name} = excluded.{name}",
+            params,
+        )
+
+
+def record(log):
+    """
+    Index a newly created WasteLog.
+    """
+    locations = _locations(log)
+    if not locations:
+        return
+    day = timezone.localdate(log.created_at)
+    with transaction.atomic():
+        WasteWarningLocation.objects.bulk_create(
+            WasteWarningLocation(waste_log=log, name=name, key=key, created_at=log.created_at)
+            for key, name in locations.items()
+        )
+        _bump({(day, key): 1 for key in locations}, locations)
+
+
+def unrecord(log):
+    """
+    Take back the counts of a deleted WasteLog (its WasteWarningLocation
+    rows go with it by cascade).
+    """
+    day = timezone.localdate(log.created_at)
+    keys = list(_locations(log))
+    if not keys:
+        return
+    counters = WasteHotspotDaily.objects.filter(day=day, key__in=keys)
+    with transaction.atomic():
+        counters.filter(count__lte=1).delete()
+        counters.update(count=F("count") - 1)
+
+
+def rebuild(batch_size=2000):
+    """
+    Recreate the whole index from WasteLog. Returns (logs, locations).
+    """
+    logs = warnings = 0
+    with transaction.atomic():
+        WasteWarningLocation.objects.all().delete()
+        WasteHotspotDaily.objects.all().delete()
+        counts, names, batch = Counter(), {}, []
+        queryset = WasteLog.objects.only("id", "warning_locations", "created_at").order_by("id")
+        for log in queryset.iterator(chunk_size=batch_size):
+            logs += 1
+            day = timezone.localdate(log.created_at)
+            for key, name in _locations(log).items():
+                batch.append(WasteWarningLocation(waste_log=log, name=name, key=key, created_at=log.created_at))
+                counts[day, key] += 1
+                names[key] = name
+            if len(batch) >= batch_size:
+                WasteWarningLocation.objects.bulk_create(batch)
+                warnings += len(batch)
+                batch = []
+        WasteWarningLocation.objects.bulk_create(batch)
+        warnings += len(batch)
+        WasteHotspotDaily.objects.bulk_create(
+            (WasteHotspotDaily(day=day, key=key, name=names[key], count=n) for (day, key), n in counts.items()),
+            batch_size=batch_size,
+        )
+    return logs, warnings
+
+
+def top_hotspots(start, end, top):
+    """
+    The `top` locations most often on the warning list between the dates
+    `start` and `end` (inclusive), with the number of logs and of days.
+    """
+    rows = (
+        WasteHotspotDaily.objects.filter(day__gte=start, day__lte=end)
+        .values("key")
+        .annotate(location=Max("name"), count=Sum("count"), days=Count("id"))
+        .order_by("-count", "key")[:top]
+    )
+    return [{"location": r["location"], "count": r["count"], "days": r["days"]} for r in rows]
@@ -0,0 +1,128 @@
+"""
+Fingerprint existing citizen reports and rebuild near-duplicate groups.
+
+Reports whose group changes get a new updated_at, so change feed clients
+see the new duplicate_of links, and the cached report payloads are dropped
+at the end.
+
+Usage:
+    python manage.py backfill_report_duplicates --workers 4
+"""
+
+import multiprocessing
+import os
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.caching import invalidate_report_caches
+from api.models import CitizenReport
+from api.similarity import MAX_BUCKET_CANDIDATES, closest_match, fingerprint_rows
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Compute SimHash fingerprints for all citizen reports and rebuild duplicate groups"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes used for fingerprinting",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Reports per fingerprinting chunk and per UPDATE batch",
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options["workers"], 1)
+        batch_size = max(options["batch_size"], 1)
+
+        fingerprinted = self._fingerprint(workers, batch_size)
+        self.stdout.write(f"Fingerprinted {fingerprinted} reports")
+
+        grouped = self._group(batch_size)
+        invalidate_report_caches()
+        self.stdout.write(
+            self.style.SUCCESS(f"Linked {grouped} reports to duplicate groups")
+        )
+
+    def _fingerprint(self, workers, batch_size):
+        rows = (
+            CitizenReport.objects.order_by("id")
+            .values_list("id", "description", "location")
+            .iterator(chunk_size=batch_size)
+        )
+        total = 0
+        # Workers only hash text, they never touch the database. "spawn"
+        # keeps them from inheriting the parent's open DB connections.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+            for chunk in _chunked(rows, batch_size):
+                pending.append(pool.submit(fingerprint_rows, chunk))
+                # Bound the number of chunks held in memory
+                if len(pending) >= workers * 2:
+                    total += self._save_fingerprints(pending.popleft().result())
+            while pending:
+                total += self._save_fingerprints(pending.popleft().result())
+        return total
+
+    def _save_fingerprints(self, results):
+        reports = [CitizenReport(id=pk, **fields) for pk, fields in results]
+        CitizenReport.objects.bulk_update(reports, ["simhash", "location_key"])
+        return len(reports)
+
+    def _group(self, batch_size):
+        """
+        Replay reports in creation order against an in-memory bucket index,
+        mirroring what perform_create does for each new report.
+        """
+        window = timedelta(hours=settings.REPORT_DUPLICATE_WINDOW_HOURS)
+        buckets = defaultdict(deque)
+        changed = []
+        linked = 0
+
+        rows = (
+            CitizenReport.objects.order_by("created_at", "id")
+            .values_list(
+                "id", "issue_type", "location_key", "simhash", "created_at", "duplicate_of_id"
+            )
+            .iterator(chunk_size=batch_size)
+        )
+        for pk, issue_type, key, value, created_at, current_root in rows:
+            bucket = buckets[(issue_type, key)]
+            while bucket and bucket[0][3] < created_at - window:
+                bucket.popleft()
+
+            newest = list(islice(reversed(bucket), MAX_BUCKET_CANDIDATES))
+            root_id = closest_match(value, [c[:3] for c in newest])
+            bucket.append((pk, value, root_id, created_at))
+
+            if root_id:
+                linked += 1
+            if root_id != current_root:
+                changed.append(
+                    CitizenReport(id=pk, duplicate_of_id=root_id, updated_at=timezone.now())
+                )
+            if len(changed) >= batch_size:
+                CitizenReport.objects.bulk_update(changed, ["duplicate_of", "updated_at"])
+                changed = []
+
+        if changed:
+            CitizenReport.objects.bulk_update(changed, ["duplicate_of", "updated_at"])
+        return linked
@@ -0,0 +1,65 @@
+"""
+Send queued alert emails to subscribers.
+
+Usage:
+    python manage.py dispatch_alerts                 # run forever
+    python manage.py dispatch_alerts --once          # drain the queue and exit
+
+For local testing, run an SMTP stand-in and point EMAIL_HOST/EMAIL_PORT at it:
+    python -m aiosmtpd -n -l localhost:1025
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.alerts import AlertDispatcher
+
+
+class Command(BaseCommand):
+    help = "Fan out queued alerts and send them over pooled SMTP connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when no deliveries are due")
+        parser.add_argument("--batch-size", type=int, default=200, help="Deliveries claimed per batch")
+        parser.add_argument("--connections", type=int, default=4, help="SMTP connections kept open")
+        parser.add_argument("--rate", type=float, default=0, help="Max messages per second (0 = unlimited)")
+        parser.add_argument("--max-attempts", type=int, default=5, help="Attempts before a delivery is marked failed")
+        parser.add_argument("--backoff", type=float, default=30, help="Base retry delay in seconds, doubled per attempt")
+        parser.add_argument("--poll-interval", type=float, default=5, help="Seconds to sleep when the queue is empty")
+
+    def handle(self, *args, **options):
+        dispatcher = AlertDispatcher(
+            connections=max(options["connections"], 1),
+            rate=options["rate"],
+            batch_size=max(options["batch_size"], 1),
+            max_attempts=max(options["max_attempts"], 1),
+            backoff_seconds=options["backoff"],
+        )
+        totals = {"sent": 0, "retried": 0, "failed": 0}
+        try:
+            while True:
+                stats = dispatcher.run_once()
+                for key in totals:
+                    totals[key] += stats[key]
+                if stats["claimed"]:
+                    self.stdout.write(
+                        f"Sent {stats['sent']}, retrying {stats['retried']}, "
+                        f"failed {stats['failed']} (fanned out {stats['fanned_out']}, "
+                        f"suppressed {stats['suppressed']} duplicate alerts)"
+                    )
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done: {totals['sent']} sent, {totals['retried']} retries scheduled, "
+                f"{totals['failed']} failed"
+            )
+        )
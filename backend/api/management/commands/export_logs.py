@@ -0,0 +1,59 @@
+"""
+Export traffic logs, energy logs, waste logs or citizen reports created in
+a date range to a file, streamed the same way as GET /api/export/<model>/.
+
+Usage:
+    python manage.py export_logs traffic-logs --from 2026-01-01 --to 2026-02-01 \
+        --format parquet --output traffic-january.parquet
+    python manage.py export_logs reports --format csv --gzip --output reports.csv.gz
+"""
+
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exports import EXPORTABLE_MODELS, export_formats, parse_bound, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream a date range of logs or reports to CSV, NDJSON or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=list(EXPORTABLE_MODELS))
+        parser.add_argument("--from", dest="start", help="First day or datetime (inclusive)")
+        parser.add_argument("--to", dest="end", help="Last day or datetime (exclusive)")
+        parser.add_argument("--format", default="csv", choices=["csv", "ndjson", "parquet"])
+        parser.add_argument("--gzip", action="store_true", help="Compress the output")
+        parser.add_argument("--output", help="File to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        if options["format"] not in export_formats():
+            raise CommandError("Parquet exports need pyarrow installed (pip install pyarrow)")
+        try:
+            start, end = (parse_bound(options[name]) if options[name] else None for name in ("start", "end"))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks, _, _ = stream_export(
+            EXPORTABLE_MODELS[options["model"]], options["format"], start, end, options["gzip"]
+        )
+        started = time.monotonic()
+        written = 0
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
+
+        if options["output"]:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Wrote {written / 1e6:.1f} MB to {options['output']} in {time.monotonic() - started:.1f}s"
+                )
+            )
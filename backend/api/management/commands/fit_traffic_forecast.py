@@ -0,0 +1,30 @@
+"""
+Fit the per-location traffic forecasts from the full TrafficLog history and
+save them to TRAFFIC_FORECAST_FILE.
+
+Needs NumPy. Workers keep their loaded model up to date on their own; run
+this after importing history, after a restore, or from cron (e.g. nightly)
+so a restarted worker has little to catch up on.
+
+Usage:
+    python manage.py fit_traffic_forecast
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import forecast
+
+
+class Command(BaseCommand):
+    help = "Fit and save the per-location traffic forecasts"
+
+    def handle(self, *args, **options):
+        if forecast.np is None:
+            raise CommandError("NumPy is required for traffic forecasts (pip install numpy)")
+        forecaster = forecast.fit_and_save()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fitted {len(forecaster.keys)} locations through TrafficLog "
+                f"{forecaster.fitted_through}, saved to {forecast.forecast_file()}"
+            )
+        )
@@ -0,0 +1,27 @@
+"""
+Insert the traffic logs left in TRAFFIC_SPOOL_DIR by workers that died
+before flushing them (TRAFFIC_WRITE_BEHIND).
+
+Running workers do this on their own every minute; run it after the last
+worker has stopped, e.g. on deploy or before moving to another host, so
+nothing waits for the next start. Files of live workers are skipped.
+
+Usage:
+    python manage.py flush_traffic_spool
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import spool
+
+
+class Command(BaseCommand):
+    help = "Insert traffic logs spooled by workers that are no longer running"
+
+    def handle(self, *args, **options):
+        if spool.fcntl is None:
+            raise CommandError("The traffic spool needs POSIX file locks")
+        files, rows = spool.recover()
+        self.stdout.write(
+            self.style.SUCCESS(f"Inserted {rows} traffic logs from {files} spool files in {spool.spool_dir()}")
+        )
@@ -0,0 +1,116 @@
+"""
+Fill the log, report and subscriber tables with realistic synthetic data
+for scale testing. See benchmarks/synthetic.py for the distributions.
+
+Deterministic: the same --seed and --end give the same rows. Chunks are
+generated and written in parallel worker processes (COPY on PostgreSQL);
+SQLite allows one writer, so it always uses a single worker.
+
+Afterwards, rebuild the derived state the generator does not maintain:
+    python manage.py backfill_report_duplicates
+    python manage.py rescan_energy_anomalies
+    python manage.py fit_traffic_forecast
+    python manage.py rebuild_waste_hotspots
+
+Usage:
+    python manage.py generate_synthetic_data --traffic 5000000 --reports 500000 \
+        --days 180 --workers 8 --seed 1
+"""
+
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.caching import invalidate_dashboard_cache, invalidate_report_caches
+from api.models import WasteBin
+from benchmarks import synthetic
+
+
+class Command(BaseCommand):
+    help = "Generate realistic synthetic logs, reports and subscribers at scale"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--traffic", type=int, default=200_000, help="Traffic logs")
+        parser.add_argument("--energy", type=int, default=20_000, help="Energy logs")
+        parser.add_argument("--waste", type=int, default=10_000, help="Waste logs")
+        parser.add_argument("--reports", type=int, default=100_000, help="Citizen reports")
+        parser.add_argument("--subscribers", type=int, default=50_000, help="Subscribers")
+        parser.add_argument("--days", type=int, default=90, help="Length of the generated history")
+        parser.add_argument("--end", help="End of the history (ISO datetime, default: this hour)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--images", action="store_true", help="Write small PNGs for some reports")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--chunk-size", type=int, default=50_000, help="Rows per worker task")
+
+    def handle(self, *args, **options):
+        if options["end"]:
+            end = parse_datetime(options["end"])
+            if end is None:
+                raise CommandError(f"Invalid --end: {options['end']}")
+            if timezone.is_naive(end):
+                end = timezone.make_aware(end)
+        else:
+            end = timezone.now().replace(minute=0, second=0, microsecond=0)
+        start = end - timezone.timedelta(days=max(options["days"], 1))
+        counts = {table: max(options[table], 0) for table in synthetic.TABLES}
+        workers = 1 if connection.vendor == "sqlite" else max(options["workers"], 1)
+        chunks = list(synthetic.plan_chunks(counts, start, end, max(options["chunk_size"], 1)))
+
+        if counts["waste"]:
+            WasteBin.objects.bulk_create(synthetic.waste_bins(options["seed"]), ignore_conflicts=True)
+
+        self.stdout.write(
+            f"Generating {sum(counts.values()):,} rows from {start:%Y-%m-%d} to {end:%Y-%m-%d} "
+            f"in {len(chunks)} chunks with {workers} worker(s)"
+        )
+        started = time.monotonic()
+        written, seconds = Counter(), Counter()
+        # Workers open their own connections; "spawn" keeps them from
+        # inheriting the parent's
+        connection.close()
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=synthetic.init_worker) as pool:
+            futures = [
+                pool.submit(synthetic.generate_chunk, table, chunk, rows, chunk_start, chunk_end,
+                            options["seed"], options["images"])
+                for table, chunk, rows, chunk_start, chunk_end in chunks
+            ]
+            for future in as_completed(futures):
+                table, rows, elapsed = future.result()
+                written[table] += rows
+                seconds[table] += elapsed
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"  {table}: {written[table]:,}/{counts[table]:,}")
+
+        if connection.vendor == "postgresql":
+            # Fresh planner statistics, so benchmarks see realistic plans
+            with connection.cursor() as cursor:
+                for model_name, _, _ in synthetic.TABLES.values():
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(f'api_{model_name.lower()}')}")
+        invalidate_dashboard_cache()
+        invalidate_report_caches()
+
+        elapsed = time.monotonic() - started
+        for table in synthetic.TABLES:
+            if written[table]:
+                self.stdout.write(
+                    f"  {table:<12} {written[table]:>12,} rows  "
+                    f"{written[table] / max(seconds[table], 1e-9):>10,.0f} rows/s per worker"
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {sum(written.values()):,} rows in {elapsed:.1f}s "
+                f"({sum(written.values()) / max(elapsed, 1e-9):,.0f} rows/s)"
+            )
+        )
+        self.stdout.write(
+            "Rebuild derived state with backfill_report_duplicates, "
+            "rescan_energy_anomalies, fit_traffic_forecast and rebuild_waste_hotspots"
+        )
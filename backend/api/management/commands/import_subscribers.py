@@ -0,0 +1,42 @@
+"""
+Import newsletter subscribers from a CSV file.
+
+Usage:
+    python manage.py import_subscribers emails.csv --batch-size 5000
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.subscriber_import import DEFAULT_BATCH_SIZE, import_emails, read_csv_emails, summarize
+
+
+class Command(BaseCommand):
+    help = "Bulk import subscriber emails from a CSV file, skipping existing ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with an 'email' column (or emails in the first column)")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Rows per INSERT statement",
+        )
+
+    def handle(self, *args, **options):
+        batches = []
+        with open(options["path"], newline="", encoding="utf-8-sig") as csv_file:
+            for stats in import_emails(read_csv_emails(csv_file), options["batch_size"]):
+                batches.append(stats)
+                self.stdout.write(
+                    f"Batch {stats['batch']}: {stats['inserted']} inserted, "
+                    f"{stats['duplicates']} duplicates, {stats['invalid']} invalid "
+                    f"({stats['elapsed_ms']} ms)"
+                )
+
+        totals = summarize(batches)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {totals['inserted']} of {totals['received']} emails "
+                f"in {totals['batches']} batches"
+            )
+        )
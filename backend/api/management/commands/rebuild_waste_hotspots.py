@@ -0,0 +1,23 @@
+"""
+Rebuild the waste hot-spot index (WasteWarningLocation rows and the
+WasteHotspotDaily counters) from WasteLog.warning_locations.
+
+New waste logs are indexed as they are saved; run this once after
+migrating, and after loading logs without model signals (bulk_create,
+generate_synthetic_data, a restore of the waste log table alone).
+
+Usage:
+    python manage.py rebuild_waste_hotspots
+"""
+
+from django.core.management.base import BaseCommand
+
+from api import hotspots
+
+
+class Command(BaseCommand):
+    help = "Rebuild the waste hot-spot index from WasteLog"
+
+    def handle(self, *args, **options):
+        logs, locations = hotspots.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {locations} warning locations from {logs} waste logs"))
@@ -0,0 +1,385 @@
+"""
+Request-level performance metrics exposed in Prometheus text format.
+
+RequestMetricsMiddleware records, per view:
+- wall time
+- DB query count and DB time (through a connection execute wrapper)
+- time spent in outbound calls such as n8n (see `track_outbound`)
+- response size
+
+Other modules add process-level counters and gauges (for example database
+connection and pool statistics in api/dbconn.py) with register_collector().
+
+Each process keeps its own histograms. When METRICS_DIR is set, a
+background thread in every process writes a snapshot to
+METRICS_DIR/metrics-<pid>.json every METRICS_FLUSH_INTERVAL seconds,
+and /metrics sums all snapshots so the numbers cover every gunicorn worker.
+Histograms and counters of a worker that has exited stay in the sums, so
+totals never go backwards; its gauges are dropped, since they describe
+connections that no longer exist.
+The directory should be emptied when the server starts (see entrypoint.sh).
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+PREFIX = "smartcity"
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (help, buckets, label names)
+HISTOGRAMS = {
+    "http_request_duration_seconds": (
+        "Wall time per request", TIME_BUCKETS, ("view", "method", "status")
+    ),
+    "http_request_db_queries": (
+        "Database queries per request", COUNT_BUCKETS, ("view",)
+    ),
+    "http_request_db_seconds": (
+        "Database time per request", TIME_BUCKETS, ("view",)
+    ),
+    "http_request_outbound_seconds": (
+        "Time spent in outbound HTTP calls per request", TIME_BUCKETS, ("view", "service")
+    ),
+    "http_response_size_bytes": (
+        "Response body size", SIZE_BUCKETS, ("view",)
+    ),
+}
+
+# name -> (help, label names); totals since process start, summed across workers
+COUNTERS = {
+    "db_connections_opened_total": (
+        "Physical database connections opened", ("alias",)
+    ),
+    "report_list_cache_lookups_total": (
+        "Report list cache lookups by result (hit/miss)", ("result",)
+    ),
+}
+
+# name -> (help, label names, how to merge values from several workers)
+GAUGES = {
+    "db_connection_age_seconds": (
+        "Age of the oldest open persistent database connection", ("alias",), max
+    ),
+    "db_pool_size": ("Connections held by the pools", ("alias",), sum),
+    "db_pool_in_use": ("Pool connections checked out by requests", ("alias",), sum),
+    "db_pool_waiting": ("Requests waiting for a pool connection", ("alias",), sum),
+}
+
+
+class _Registry:
+    """
+    Per-process histogram storage.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms = {}
+        # Callables yielding (name, labels, value) for COUNTERS and GAUGES
+        self.collectors = []
+        # (name, labels) -> latest collected value
+        self.values = {}
+        self.dirty = False
+        self.flusher_pid = None
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self.lock:
+            series = self.histograms.get((name, labels))
+            if series is None:
+                series = self.histograms[(name, labels)] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+            self.dirty = True
+
+    def collect(self):
+        """
+        Run the collectors. Called from request threads, since database
+        connections are per thread.
+        """
+        values = {
+            (name, labels): value
+            for collector in self.collectors
+            for name, labels, value in collector()
+        }
+        with self.lock:
+            self.values.update(values)
+            self.dirty = True
+
+    def snapshot(self, flushing=False):
+        """
+        Copy of the current data. Only a flush marks it clean, so a scrape
+        does not hold back the next flush.
+        """
+        with self.lock:
+            if flushing:
+                self.dirty = False
+            return {
+                "histograms": [[n, list(l), list(s)] for (n, l), s in self.histograms.items()],
+                "values": [[n, list(l), v] for (n, l), v in self.values.items()],
+            }
+
+
+registry = _Registry()
+
+
+def register_collector(collector):
+    """
+    Add a callable that yields (name, labels, value) for COUNTERS/GAUGES
+    entries. It runs in the request thread at the end of every request.
+    """
+    registry.collectors.append(collector)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "outbound")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.outbound = {}
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def track_outbound(service):
+    """
+    Attribute the time spent in the block to an outbound `service` call.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            elapsed = time.perf_counter() - started
+            stats.outbound[service] = stats.outbound.get(service, 0.0) + elapsed
+
+
+def _view_name(view_func):
+    view_class = getattr(view_func, "view_class", None) or getattr(view_func, "cls", None)
+    if view_class is not None:
+        return view_class.__name__
+    return getattr(view_func, "__qualname__", "unknown")
+
+
+def _snapshot_path():
+    return Path(settings.METRICS_DIR) / f"metrics-{os.getpid()}.json"
+
+
+def flush():
+    """
+    Write this process's snapshot to METRICS_DIR (atomically).
+    """
+    if not settings.METRICS_DIR:
+        return
+    path = _snapshot_path()
+    tmp = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(registry.snapshot(flushing=True)))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def flush_if_dirty():
+    if registry.dirty:
+        flush()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        flush_if_dirty()
+
+
+def _ensure_flusher():
+    # Once per process: threads do not survive a fork (gunicorn --preload)
+    if registry.flusher_pid != os.getpid():
+        registry.flusher_pid = os.getpid()
+        threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+        atexit.register(flush)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records per-view request metrics. Keep it first in MIDDLEWARE so the
+    wall time covers the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.METRICS_DIR:
+            _ensure_flusher()
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_count_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+
+        view = getattr(request, "_metrics_view", "unresolved")
+        status = f"{response.status_code // 100}xx"
+        registry.observe("http_request_duration_seconds", (view, request.method, status), elapsed)
+        registry.observe("http_request_db_queries", (view,), stats.queries)
+        registry.observe("http_request_db_seconds", (view,), stats.db_seconds)
+        for service, seconds in stats.outbound.items():
+            registry.observe("http_request_outbound_seconds", (view, service), seconds)
+        if not response.streaming:
+            registry.observe("http_response_size_bytes", (view,), len(response.content))
+        registry.collect()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = _view_name(view_func)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by another user
+    return True
+
+
+def _merged_snapshots():
+    """
+    Merge snapshots from every worker (plus this process's live data).
+    Histograms and counters are summed; gauges use their GAUGES merge and
+    skip workers that have exited.
+    """
+    snapshots = []  # (snapshot, worker alive)
+    if settings.METRICS_DIR:
+        own = _snapshot_path().name
+        for path in Path(settings.METRICS_DIR).glob("metrics-*.json"):
+            if path.name == own:
+                continue
+            try:
+                snapshot = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            pid = path.stem.removeprefix("metrics-")
+            snapshots.append((snapshot, pid.isdigit() and _pid_alive(int(pid))))
+    snapshots.append((registry.snapshot(), True))
+
+    histograms, values = {}, {}
+    for snapshot, alive in snapshots:
+        for name, labels, value in snapshot.get("values", ()):
+            if name in COUNTERS or (name in GAUGES and alive):
+                values.setdefault((name, tuple(labels)), []).append(value)
+        for name, labels, series in snapshot["histograms"]:
+            if name not in HISTOGRAMS:
+                continue
+            key = (name, tuple(labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = list(series)
+            else:
+                for i, value in enumerate(series):
+                    merged[i] += value
+
+    merged_values = {}
+    for (name, labels), collected in values.items():
+        merge = GAUGES[name][2] if name in GAUGES else sum
+        merged_values[(name, labels)] = merge(collected)
+    return histograms, merged_values
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render():
+    """
+    Render all metrics in Prometheus text exposition format.
+    """
+    histograms, values = _merged_snapshots()
+    lines = []
+
+    for kind, metrics in (("counter", COUNTERS), ("gauge", GAUGES)):
+        for name, (help_text, label_names, *_) in metrics.items():
+            full = f"{PREFIX}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for (series_name, labels), value in sorted(values.items()):
+                if series_name == name:
+                    lines.append(f"{full}{_labels(label_names, labels)} {value}")
+
+    for name, (help_text, buckets, label_names) in HISTOGRAMS.items():
+        full = f"{PREFIX}_{name}"
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} histogram")
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, series):
+                cumulative += count
+                lines.append(f"{full}_bucket{_labels(label_names, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{full}_bucket{_labels(label_names, labels, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{full}_sum{_labels(label_names, labels)} {series[-2]}")
+            lines.append(f"{full}_count{_labels(label_names, labels)} {series[-1]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    GET /metrics
+
+    Prometheus scrape endpoint. Internal only: nginx does not expose it.
+    """
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
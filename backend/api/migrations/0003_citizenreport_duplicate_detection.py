@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_citizenreport_status_subscriber'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citizenreport',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, help_text='First report of the near-duplicate group this report belongs to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='api.citizenreport'),
+        ),
+        migrations.AddField(
+            model_name='citizenreport',
+            name='location_key',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the normalized location, used for duplicate bucketing', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='citizenreport',
+            name='simhash',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='64-bit SimHash of the normalized description', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='citizenreport',
+            index=models.Index(fields=['issue_type', 'location_key', 'created_at'], name='api_citizen_issue_t_f81861_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_citizenreport_duplicate_detection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('traffic', 'Traffic Alert'), ('energy', 'Energy Anomaly')], help_text='What produced the alert', max_length=20)),
+                ('source_id', models.BigIntegerField(help_text='ID of the log that produced the alert')),
+                ('subject', models.CharField(help_text='Email subject', max_length=255)),
+                ('body', models.TextField(help_text='Email body')),
+                ('fanned_out_at', models.DateTimeField(blank=True, help_text='When deliveries were created for all subscribers', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Alert',
+                'verbose_name_plural': 'Alerts',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('fanned_out_at__isnull', True)), fields=['created_at'], name='api_alert_pending_fanout_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AlertDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(help_text='Recipient address', max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time of the next attempt (also the lease expiry while sending)')),
+                ('last_error', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='api.alert')),
+            ],
+            options={
+                'verbose_name': 'Alert Delivery',
+                'verbose_name_plural': 'Alert Deliveries',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='api_alertde_status_5c1bb4_idx')],
+                'constraints': [models.UniqueConstraint(fields=('alert', 'email'), name='api_alertdelivery_unique_recipient')],
+            },
+        ),
+    ]
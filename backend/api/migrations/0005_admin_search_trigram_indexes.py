@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# Django's icontains on Postgres compiles to UPPER(col::text) LIKE UPPER(%s),
+# so the trigram indexes are on that exact expression.
+TRIGRAM_INDEXES = [
+    ("api_trafficlog_address_trgm", "api_trafficlog", "address"),
+    ("api_citizenreport_reporter_trgm", "api_citizenreport", "reporter_name"),
+    ("api_citizenreport_location_trgm", "api_citizenreport", "location"),
+    ("api_citizenreport_description_trgm", "api_citizenreport", "description"),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON "{table}" USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0004_alert_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_admin_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnergyBaseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=32)),
+                ('slot', models.SmallIntegerField(help_text='Hour of the week (0 = Monday 00:00 UTC), -1 for all hours')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0.0)),
+                ('var', models.FloatField(default=0.0)),
+            ],
+            options={
+                'verbose_name': 'Energy Baseline',
+                'verbose_name_plural': 'Energy Baselines',
+            },
+        ),
+        migrations.AddField(
+            model_name='energylog',
+            name='anomaly_flags',
+            field=models.JSONField(blank=True, default=list, help_text='Metrics whose z-score reached the threshold'),
+        ),
+        migrations.AddField(
+            model_name='energylog',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, help_text='Largest |z-score| over the scored metrics (empty while baselines warm up)', null=True),
+        ),
+        migrations.AddField(
+            model_name='energylog',
+            name='anomaly_zscores',
+            field=models.JSONField(blank=True, default=dict, help_text='z-score of each metric against its baseline'),
+        ),
+        migrations.AddField(
+            model_name='energylog',
+            name='is_anomaly',
+            field=models.BooleanField(default=False, help_text='Whether the backend flagged any metric'),
+        ),
+        migrations.AlterField(
+            model_name='energylog',
+            name='anomalies_detected',
+            field=models.BooleanField(default=False, help_text='Whether n8n reported anomalies'),
+        ),
+        migrations.AddIndex(
+            model_name='energylog',
+            index=models.Index(condition=models.Q(('is_anomaly', True)), fields=['-created_at'], name='api_energylog_anomaly_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='energybaseline',
+            constraint=models.UniqueConstraint(fields=('metric', 'slot'), name='api_energybaseline_metric_slot_uniq'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_energy_anomaly_detection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WasteBin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Name used in warning_locations', max_length=255, unique=True)),
+                ('address', models.CharField(blank=True, max_length=500)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Waste Bin',
+                'verbose_name_plural': 'Waste Bins',
+                'ordering': ['name'],
+            },
+        ),
+    ]
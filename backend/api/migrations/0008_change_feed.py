@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# Change feed indexes on tables that ingest writes to continuously
+FEED_INDEXES = [
+    ("citizenreport", models.Index(fields=["updated_at", "id"], name="api_citizenreport_feed_idx")),
+    ("energylog", models.Index(fields=["created_at", "id"], name="api_energylog_feed_idx")),
+    ("subscriber", models.Index(fields=["created_at", "id"], name="api_subscriber_feed_idx")),
+    ("trafficlog", models.Index(fields=["created_at", "id"], name="api_trafficlog_feed_idx")),
+    ("wastelog", models.Index(fields=["created_at", "id"], name="api_wastelog_feed_idx")),
+]
+
+
+def create_feed_indexes(apps, schema_editor):
+    for model_name, index in FEED_INDEXES:
+        model = apps.get_model("api", model_name)
+        if schema_editor.connection.vendor == "postgresql":
+            # Builds without blocking inserts into the table
+            columns = ", ".join(f'"{model._meta.get_field(f).column}"' for f in index.fields)
+            schema_editor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index.name}" '
+                f'ON "{model._meta.db_table}" ({columns})'
+            )
+        else:
+            schema_editor.add_index(model, index)
+
+
+def drop_feed_indexes(apps, schema_editor):
+    for model_name, index in FEED_INDEXES:
+        model = apps.get_model("api", model_name)
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+        else:
+            schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0007_waste_bin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(help_text='Change feed name of the model, e.g. reports', max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Tombstone',
+                'verbose_name_plural': 'Tombstones',
+                'indexes': [models.Index(fields=['deleted_at', 'id'], name='api_tombstone_feed_idx')],
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index) for model_name, index in FEED_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_feed_indexes, drop_feed_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpoolBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Batch file name', max_length=100, unique=True)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('flushed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Spool Batch',
+                'verbose_name_plural': 'Spool Batches',
+            },
+        ),
+        migrations.AlterField(
+            model_name='trafficlog',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_traffic_write_behind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WasteHotspotDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('key', models.CharField(help_text='Normalized location name', max_length=255)),
+                ('name', models.CharField(help_text='Latest spelling of the location', max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Waste Hotspot (daily)',
+                'verbose_name_plural': 'Waste Hotspots (daily)',
+                'ordering': ['-day', '-count'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'key'), name='api_wastehotspotdaily_day_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WasteWarningLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Location as sent by n8n', max_length=255)),
+                ('key', models.CharField(help_text='Normalized name (see api/hotspots.py)', max_length=255)),
+                ('created_at', models.DateTimeField(help_text='Copied from the waste log')),
+                ('waste_log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='warnings', to='api.wastelog')),
+            ],
+            options={
+                'verbose_name': 'Waste Warning Location',
+                'verbose_name_plural': 'Waste Warning Locations',
+                'indexes': [models.Index(fields=['key', 'created_at'], name='api_wastewa_key_f24521_idx'), models.Index(fields=['created_at'], name='api_wastewa_created_a9ebc0_idx')],
+            },
+        ),
+    ]
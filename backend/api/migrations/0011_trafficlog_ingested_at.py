@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+OLD_INDEX = models.Index(fields=["created_at", "id"], name="api_trafficlog_feed_idx")
+NEW_INDEX = models.Index(fields=["ingested_at", "id"], name="api_trafficlog_ingest_idx")
+
+
+def backfill_ingested_at(apps, schema_editor):
+    # Rows inserted so far are delivered by created_at, as before
+    TrafficLog = apps.get_model("api", "TrafficLog")
+    TrafficLog.objects.update(ingested_at=models.F("created_at"))
+
+
+def swap_feed_index(apps, schema_editor):
+    model = apps.get_model("api", "TrafficLog")
+    if schema_editor.connection.vendor == "postgresql":
+        # Builds without blocking inserts into the table
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{NEW_INDEX.name}" '
+            f'ON "{model._meta.db_table}" ("ingested_at", "id")'
+        )
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{OLD_INDEX.name}"')
+    else:
+        schema_editor.add_index(model, NEW_INDEX)
+        schema_editor.remove_index(model, OLD_INDEX)
+
+
+def restore_feed_index(apps, schema_editor):
+    model = apps.get_model("api", "TrafficLog")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{OLD_INDEX.name}" '
+            f'ON "{model._meta.db_table}" ("created_at", "id")'
+        )
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{NEW_INDEX.name}"')
+    else:
+        schema_editor.add_index(model, OLD_INDEX)
+        schema_editor.remove_index(model, NEW_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0010_waste_hotspots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trafficlog',
+            name='ingested_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_ingested_at, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(model_name='trafficlog', name=OLD_INDEX.name),
+                migrations.AddIndex(model_name='trafficlog', index=NEW_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(swap_feed_index, restore_feed_index),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_trafficlog_ingested_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='dedupe_key',
+            field=models.CharField(blank=True, help_text='Alerts with the same key are sent at most once per ALERT_DEDUPE_SECONDS', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='suppressed',
+            field=models.BooleanField(default=False, help_text='Not sent: a recent alert with the same key already was'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['dedupe_key', 'created_at'], name='api_alert_dedupe__83be3f_idx'),
+        ),
+    ]
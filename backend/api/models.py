@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import connections, models, transaction
 from django.utils import timezone
 
+from .caching import invalidate_report_caches
+
 
 class TrafficLog(models.Model):
     """
@@ -52,7 +54,11 @@ class TrafficLog(models.Model):
     )
     alert_content = models.TextField(blank=True, help_text="Alert notification content")
 
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Set explicitly when spooled rows are written later (see api/spool.py)
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    # When the row reached the database; the change feed reads this, since
+    # a spooled row can be inserted long after its created_at
+    ingested_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
@@ -61,6 +67,8 @@ class TrafficLog(models.Model):
         indexes = [
             models.Index(fields=["-created_at", "status_code"]),
             models.Index(fields=["address", "-created_at"]),
+            # Change feed position (see api/changes.py)
+            models.Index(fields=["ingested_at", "id"], name="api_trafficlog_ingest_idx"),
         ]
 
     def __str__(self):
@@ -78,7 +86,23 @@ class EnergyLog(models.Model):
         default=dict, help_text="Voltage statistics (min, max, avg)"
     )
     anomalies_detected = models.BooleanField(
-        default=False, help_text="Whether anomalies were detected"
+        default=False, help_text="Whether n8n reported anomalies"
+    )
+
+    # Backend anomaly detection (see api/anomaly.py)
+    anomaly_score = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Largest |z-score| over the scored metrics (empty while baselines warm up)",
+    )
+    anomaly_zscores = models.JSONField(
+        default=dict, blank=True, help_text="z-score of each metric against its baseline"
+    )
+    anomaly_flags = models.JSONField(
+        default=list, blank=True, help_text="Metrics whose z-score reached the threshold"
+    )
+    is_anomaly = models.BooleanField(
+        default=False, help_text="Whether the backend flagged any metric"
     )
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
@@ -88,6 +112,12 @@ class EnergyLog(models.Model):
         verbose_name_plural = "Energy Logs"
         indexes = [
             models.Index(fields=["-created_at"]),
+            models.Index(
+                fields=["-created_at"],
+                condition=models.Q(is_anomaly=True),
+                name="api_energylog_anomaly_idx",
+            ),
+            models.Index(fields=["created_at", "id"], name="api_energylog_feed_idx"),
         ]
 
     def __str__(self):
@@ -95,6 +125,35 @@ class EnergyLog(models.Model):
         return f"Energy Log - {self.total_consumption:.2f} kWh - {anomaly_text} ({self.created_at.strftime('%Y-%m-%d %H:%M')})"
 
 
+class EnergyBaseline(models.Model):
+    """
+    Running statistics of one energy metric, for anomaly scoring.
+
+    One row per (metric, hour of the week) plus one per metric with
+    slot = GLOBAL_SLOT covering all hours. Updated on every EnergyLog
+    ingest and rebuilt by `manage.py rescan_energy_anomalies`.
+    """
+
+    GLOBAL_SLOT = -1
+
+    metric = models.CharField(max_length=32)
+    slot = models.SmallIntegerField(help_text="Hour of the week (0 = Monday 00:00 UTC), -1 for all hours")
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0.0)
+    var = models.FloatField(default=0.0)
+
+    class Meta:
+        verbose_name = "Energy Baseline"
+        verbose_name_plural = "Energy Baselines"
+        constraints = [
+            models.UniqueConstraint(fields=["metric", "slot"], name="api_energybaseline_metric_slot_uniq"),
+        ]
+
+    def __str__(self):
+        slot = "all hours" if self.slot == self.GLOBAL_SLOT else f"hour {self.slot}"
+        return f"{self.metric} ({slot}): mean {self.mean:.2f}, n={self.count}"
+
+
 class WasteLog(models.Model):
     """
     Model to store waste tracking data from n8n workflow.
@@ -120,12 +179,97 @@ class WasteLog(models.Model):
         verbose_name_plural = "Waste Logs"
         indexes = [
             models.Index(fields=["-created_at"]),
+            models.Index(fields=["created_at", "id"], name="api_wastelog_feed_idx"),
         ]
 
     def __str__(self):
         return f"Waste Log - {self.avg_fill_level:.1f}% avg - {self.critical_count} critical ({self.created_at.strftime('%Y-%m-%d %H:%M')})"
 
 
+class WasteBin(models.Model):
+    """
+    A waste collection point. `name` matches the entries n8n sends in
+    WasteLog.warning_locations; the coordinates are used for route planning.
+    """
+
+    name = models.CharField(max_length=255, unique=True, help_text="Name used in warning_locations")
+    address = models.CharField(max_length=500, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name = "Waste Bin"
+        verbose_name_plural = "Waste Bins"
+
+    def __str__(self):
+        return self.name
+
+
+class WasteWarningLocation(models.Model):
+    """
+    One entry of a WasteLog's warning_locations, kept in sync on ingest so
+    locations can be queried with an index instead of unpacking JSON.
+    """
+
+    waste_log = models.ForeignKey(WasteLog, on_delete=models.CASCADE, related_name="warnings")
+    name = models.CharField(max_length=255, help_text="Location as sent by n8n")
+    key = models.CharField(max_length=255, help_text="Normalized name (see api/hotspots.py)")
+    created_at = models.DateTimeField(help_text="Copied from the waste log")
+
+    class Meta:
+        verbose_name = "Waste Warning Location"
+        verbose_name_plural = "Waste Warning Locations"
+        indexes = [
+            models.Index(fields=["key", "created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} (log {self.waste_log_id})"
+
+
+class WasteHotspotDaily(models.Model):
+    """
+    Number of waste logs per day that listed a location in
+    warning_locations. Maintained incrementally; see api/hotspots.py.
+    """
+
+    day = models.DateField()
+    key = models.CharField(max_length=255, help_text="Normalized location name")
+    name = models.CharField(max_length=255, help_text="Latest spelling of the location")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-day", "-count"]
+        verbose_name = "Waste Hotspot (daily)"
+        verbose_name_plural = "Waste Hotspots (daily)"
+        constraints = [
+            models.UniqueConstraint(fields=["day", "key"], name="api_wastehotspotdaily_day_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} on {self.day}: {self.count}"
+
+
+class CitizenReportQuerySet(models.QuerySet):
+    def set_status(self, status):
+        """
+        Move every report in the queryset to `status` with a single UPDATE.
+
+        Reports already in that status are left untouched so their
+        updated_at stays meaningful. Returns the number of rows changed.
+        """
+        updated = self.exclude(status=status).update(
+            status=status, updated_at=timezone.now()
+        )
+        if updated:
+            # QuerySet.update() sends no signals, so invalidate explicitly
+            transaction.on_commit(invalidate_report_caches)
+        return updated
+
+
 class CitizenReport(models.Model):
     """
     Model for citizens to report issues related to city services.
@@ -170,6 +314,30 @@ class CitizenReport(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Near-duplicate detection (see api/similarity.py)
+    simhash = models.BigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="64-bit SimHash of the normalized description",
+    )
+    location_key = models.CharField(
+        max_length=16,
+        blank=True,
+        editable=False,
+        help_text="Hash of the normalized location, used for duplicate bucketing",
+    )
+    duplicate_of = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="duplicates",
+        help_text="First report of the near-duplicate group this report belongs to",
+    )
+
+    objects = CitizenReportQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
         verbose_name = "Citizen Report"
@@ -177,12 +345,66 @@ class CitizenReport(models.Model):
         indexes = [
             models.Index(fields=["-created_at", "status"]),
             models.Index(fields=["issue_type", "status"]),
+            models.Index(fields=["issue_type", "location_key", "created_at"]),
+            models.Index(fields=["updated_at", "id"], name="api_citizenreport_feed_idx"),
         ]
 
     def __str__(self):
         return f"{self.get_issue_type_display()} at {self.location} - {self.get_status_display()} (by {self.reporter_name})"
 
 
+class SubscriberQuerySet(models.QuerySet):
+    def insert_new(self, emails, now=None):
+        """
+        Insert `emails` with a single INSERT ... ON CONFLICT (email) DO NOTHING
+        and return the (id, email) rows that were actually inserted.
+
+        Emails must already be normalized. Existing subscribers are skipped by
+        the database, so concurrent signups for the same email cannot race.
+        """
+        emails = list(emails)
+        if not emails:
+            return []
+
+        connection = connections[self.db]
+        if connection.vendor not in ("postgresql", "sqlite"):
+            # No ON CONFLICT ... RETURNING; fall back to one query per row
+            created = []
+            for email in emails:
+                subscriber, was_created = self.get_or_create(email=email)
+                if was_created:
+                    created.append((subscriber.id, email))
+            return created
+
+        qn = connection.ops.quote_name
+        created_at = self.model._meta.get_field("created_at").get_db_prep_save(
+            now or timezone.now(), connection
+        )
+        values = ", ".join(["(%s, %s)"] * len(emails))
+        params = []
+        for email in emails:
+            params.extend([email, created_at])
+        sql = (
+            f"INSERT INTO {qn(self.model._meta.db_table)} ({qn('email')}, {qn('created_at')}) "
+            f"VALUES {values} ON CONFLICT ({qn('email')}) DO NOTHING "
+            f"RETURNING {qn('id')}, {qn('email')}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def subscribe(self, email):
+        """
+        Subscribe a normalized email in one statement.
+        Returns (subscriber, created); subscriber is None if it already existed.
+        """
+        now = timezone.now()
+        rows = self.insert_new([email], now=now)
+        if not rows:
+            return None, False
+        return self.model(id=rows[0][0], email=email, created_at=now), True
+
+
 class Subscriber(models.Model):
     """
     Model for newsletter subscribers.
@@ -196,6 +418,8 @@ class Subscriber(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    objects = SubscriberQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
         verbose_name = "Subscriber"
@@ -203,7 +427,185 @@ class Subscriber(models.Model):
         indexes = [
             models.Index(fields=["-created_at"]),
             models.Index(fields=["email"]),
+            models.Index(fields=["created_at", "id"], name="api_subscriber_feed_idx"),
         ]
 
     def __str__(self):
         return self.email
+
+
+class Alert(models.Model):
+    """
+    Outbox entry for an alert emailed to every subscriber.
+
+    Rows are written on the request path when a TrafficLog carries
+    alert_content or an EnergyLog reports anomalies. The dispatch_alerts
+    command fans them out into AlertDelivery rows and sends them; an alert
+    whose dedupe_key was already sent within ALERT_DEDUPE_SECONDS is
+    suppressed instead (see api/alerts.py).
+    """
+
+    SOURCE_CHOICES = [
+        ("traffic", "Traffic Alert"),
+        ("energy", "Energy Anomaly"),
+    ]
+
+    source = models.CharField(
+        max_length=20, choices=SOURCE_CHOICES, help_text="What produced the alert"
+    )
+    source_id = models.BigIntegerField(help_text="ID of the log that produced the alert")
+    subject = models.CharField(max_length=255, help_text="Email subject")
+    body = models.TextField(help_text="Email body")
+    dedupe_key = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Alerts with the same key are sent at most once per ALERT_DEDUPE_SECONDS",
+    )
+    fanned_out_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When deliveries were created for all subscribers",
+    )
+    suppressed = models.BooleanField(
+        default=False, help_text="Not sent: a recent alert with the same key already was"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Alert"
+        verbose_name_plural = "Alerts"
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(fanned_out_at__isnull=True),
+                name="api_alert_pending_fanout_idx",
+            ),
+            models.Index(fields=["dedupe_key", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_source_display()}: {self.subject}"
+
+    @classmethod
+    def from_traffic_log(cls, log):
+        """
+        Return an unsaved Alert for `log`, or None if it carries no alert.
+        """
+        if not log.alert_content:
+            return None
+        return cls(
+            source="traffic",
+            source_id=log.id,
+            subject=f"Traffic alert: {log.address}"[:255],
+            body=log.alert_content,
+            # Repeated checks of the same jammed address
+            dedupe_key=f"traffic:{' '.join(log.address.split()).casefold()}"[:255],
+        )
+
+    @classmethod
+    def from_energy_log(cls, log):
+        """
+        Return an unsaved Alert for `log`, or None if no anomaly was detected.
+        """
+        if not (log.anomalies_detected or log.is_anomaly):
+            return None
+        voltage = log.voltage_stats or {}
+        return cls(
+            source="energy",
+            source_id=log.id,
+            subject="Energy anomaly detected",
+            dedupe_key="energy",
+            body=(
+                f"Anomalies were detected in the latest energy readings.\n"
+                f"Total consumption: {log.total_consumption:.2f} kWh\n"
+                f"Average power: {log.avg_power:.2f} W\n"
+                f"Voltage: min {voltage.get('min')}, max {voltage.get('max')}, "
+                f"average {voltage.get('average')}"
+                + (f"\nUnusual metrics: {', '.join(log.anomaly_flags)}" if log.anomaly_flags else "")
+            ),
+        )
+
+
+class AlertDelivery(models.Model):
+    """
+    Per-recipient delivery state for an Alert.
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    alert = models.ForeignKey(
+        Alert, on_delete=models.CASCADE, related_name="deliveries"
+    )
+    email = models.EmailField(max_length=255, help_text="Recipient address")
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default="pending"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Earliest time of the next attempt (also the lease expiry while sending)",
+    )
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Alert Delivery"
+        verbose_name_plural = "Alert Deliveries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["alert", "email"], name="api_alertdelivery_unique_recipient"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.email} - {self.status} ({self.alert_id})"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row, so the change feed can report deletions.
+    Written by a post_delete signal for every model the feed covers.
+    """
+
+    model = models.CharField(max_length=32, help_text="Change feed name of the model, e.g. reports")
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Tombstone"
+        verbose_name_plural = "Tombstones"
+        indexes = [
+            models.Index(fields=["deleted_at", "id"], name="api_tombstone_feed_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted {self.deleted_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class SpoolBatch(models.Model):
+    """
+    Marker committed together with the rows of one spool batch file, so a
+    batch replayed after a crash is not inserted twice. Deleted again once
+    the file is gone.
+    """
+
+    name = models.CharField(max_length=100, unique=True, help_text="Batch file name")
+    rows = models.PositiveIntegerField(default=0)
+    flushed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Spool Batch"
+        verbose_name_plural = "Spool Batches"
+
+    def __str__(self):
+        return f"{self.name} ({self.rows} rows)"
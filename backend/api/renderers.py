@@ -0,0 +1,75 @@
+"""
+orjson-based JSON renderer and parser for DRF.
+
+Selected with JSON_BACKEND (see core/settings.py). Output matches the stock
+JSONRenderer byte for byte: datetimes, Decimals, lazy strings, numpy values
+and the like go through DRF's own encoder fallback, so JSONField contents
+(`alternative_routes`, `voltage_stats`, `warning_locations`) and serializer
+output render exactly as before, only faster. NaN and Infinity render as
+null instead of raising. Indented or ASCII-only output (Accept parameters,
+UNICODE_JSON/COMPACT_JSON off) falls back to the stock renderer.
+"""
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Optional: JSON_BACKEND falls back to the stdlib codec
+    orjson = None
+
+_encoder = JSONEncoder()
+
+if orjson is not None:
+    # Datetimes go through DRF's encoder so UTC renders as "...Z" as before
+    DUMPS_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data, default=_encoder.default):
+    """
+    Serialize `data` to UTF-8 JSON bytes, using `default` for types orjson
+    does not handle natively.
+    """
+    return orjson.dumps(data, default=default, option=DUMPS_OPTIONS)
+
+
+class OrjsonRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if indent or self.ensure_ascii or not self.compact:
+            # Formatting orjson does not offer
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = dumps(data)
+        # Same escaping as JSONRenderer, so the output is safe inside <script>
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class OrjsonParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", "utf-8").lower()
+        if encoding not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+def json_parser_class():
+    """
+    The configured JSON parser, for views that list their parsers explicitly.
+    """
+    return next(
+        (parser for parser in api_settings.DEFAULT_PARSER_CLASSES if issubclass(parser, JSONParser)),
+        JSONParser,
+    )
@@ -2,11 +2,70 @@
 Serializers for Smart City API models.
 """
 
+import re
+
 from rest_framework import serializers
 from .models import TrafficLog, EnergyLog, WasteLog, CitizenReport, Subscriber
 
+_DISPLAY_SOURCE_RE = re.compile(r"^get_(\w+)_display$")
+
+
+def parse_fieldset(request):
+    """
+    Return (fields, omit) requested with ?fields=a,b and ?omit=c.
+    `fields` is None when the client did not restrict the fieldset.
+    """
+    params = request.query_params
+
+    def _split(name):
+        return {f.strip() for f in params.get(name, "").split(",") if f.strip()}
+
+    fields = _split("fields")
+    return (fields or None), _split("omit")
+
+
+def model_columns(serializer):
+    """
+    Return the model columns needed to render `serializer`'s fields, for use
+    with QuerySet.only(). Returns None if a field reads something other
+    than a plain column, in which case nothing should be deferred.
+    """
+    model = serializer.Meta.model
+    concrete = {f.name for f in model._meta.concrete_fields}
+    columns = {model._meta.pk.name}
+
+    for field in serializer.fields.values():
+        source = field.source
+        match = _DISPLAY_SOURCE_RE.match(source)
+        if match:
+            source = match.group(1)
+        if source not in concrete:
+            return None
+        columns.add(source)
+    return columns
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin for sparse fieldsets on read requests:
+    ?fields=id,status keeps only those fields, ?omit=description drops them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in ("GET", "HEAD"):
+            return
 
-class TrafficLogSerializer(serializers.ModelSerializer):
+        fields, omit = parse_fieldset(request)
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        for name in omit:
+            self.fields.pop(name, None)
+
+
+class TrafficLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for TrafficLog model."""
 
     class Meta:
@@ -30,7 +89,30 @@ class TrafficLogSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at"]
 
 
-class EnergyLogSerializer(serializers.ModelSerializer):
+class TrafficLogListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Compact TrafficLog serializer for list endpoints.
+    Leaves out the analysis text, alerts and alternative routes.
+    """
+
+    class Meta:
+        model = TrafficLog
+        fields = [
+            "id",
+            "address",
+            "congestion_rate",
+            "flow_speed",
+            "delay_time",
+            "has_incident",
+            "incident_count",
+            "status_code",
+            "status_color",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+
+class EnergyLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for EnergyLog model."""
 
     class Meta:
@@ -41,9 +123,20 @@ class EnergyLogSerializer(serializers.ModelSerializer):
             "avg_power",
             "voltage_stats",
             "anomalies_detected",
+            "anomaly_score",
+            "anomaly_zscores",
+            "anomaly_flags",
+            "is_anomaly",
+            "created_at",
+        ]
+        read_only_fields = [
+            "id",
+            "anomaly_score",
+            "anomaly_zscores",
+            "anomaly_flags",
+            "is_anomaly",
             "created_at",
         ]
-        read_only_fields = ["id", "created_at"]
 
 
 class WasteLogSerializer(serializers.ModelSerializer):
@@ -62,7 +155,7 @@ class WasteLogSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at"]
 
 
-class CitizenReportSerializer(serializers.ModelSerializer):
+class CitizenReportSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for CitizenReport model."""
 
     # Make issue_type and status human-readable in responses
@@ -83,6 +176,7 @@ class CitizenReportSerializer(serializers.ModelSerializer):
             "location",
             "status",
             "status_display",
+            "duplicate_of",
             "created_at",
             "updated_at",
         ]
@@ -90,15 +184,81 @@ class CitizenReportSerializer(serializers.ModelSerializer):
             "id",
             "status",
             "status_display",
+            "duplicate_of",
+            "created_at",
+            "updated_at",
+        ]
+
+
+class CitizenReportListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Compact CitizenReport serializer for list endpoints.
+    Leaves out the description, image URL and display labels; clients that
+    need them ask for them with ?fields=.
+    """
+
+    class Meta:
+        model = CitizenReport
+        fields = [
+            "id",
+            "reporter_name",
+            "issue_type",
+            "location",
+            "status",
+            "duplicate_of",
             "created_at",
             "updated_at",
         ]
+        read_only_fields = fields
+
+
+class BulkStatusUpdateSerializer(serializers.Serializer):
+    """
+    Serializer for bulk status updates.
+    Reports are selected either by `ids` or by a `filter` on status/issue_type.
+    """
+
+    class FilterSerializer(serializers.Serializer):
+        status = serializers.ChoiceField(
+            choices=CitizenReport.STATUS_CHOICES, required=False
+        )
+        issue_type = serializers.ChoiceField(
+            choices=CitizenReport.ISSUE_TYPE_CHOICES, required=False
+        )
+
+    status = serializers.ChoiceField(choices=CitizenReport.STATUS_CHOICES)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=10000,
+    )
+    filter = FilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if "ids" in attrs and "filter" in attrs:
+            raise serializers.ValidationError("Provide either ids or filter, not both.")
+        if "ids" not in attrs and not attrs.get("filter"):
+            raise serializers.ValidationError(
+                "Provide ids or a non-empty filter to select reports."
+            )
+        return attrs
+
+
+class DuplicateGroupSerializer(serializers.Serializer):
+    """Serializer for a group of near-duplicate citizen reports."""
+
+    root = CitizenReportSerializer()
+    duplicate_count = serializers.IntegerField()
+    latest_at = serializers.DateTimeField()
 
 
 class CheckTrafficRequestSerializer(serializers.Serializer):
     """Serializer for check-traffic request payload."""
 
     location = serializers.CharField(max_length=255, required=True)
+    # A future time gets a forecast instead of a live n8n analysis
+    at = serializers.DateTimeField(required=False)
 
 
 class N8NWebhookDataSerializer(serializers.Serializer):
@@ -156,10 +316,13 @@ class SubscriberSerializer(serializers.ModelSerializer):
         model = Subscriber
         fields = ["id", "email", "created_at"]
         read_only_fields = ["id", "created_at"]
+        # Uniqueness is enforced by INSERT ... ON CONFLICT in
+        # Subscriber.objects.subscribe(), not by an extra SELECT
+        extra_kwargs = {"email": {"validators": []}}
 
     def validate_email(self, value):
         """
-        Validate email format and check for duplicates.
+        Normalize the email for consistent storage.
         """
         # Convert to lowercase for consistency
         value = value.lower().strip()
@@ -167,13 +330,11 @@ class SubscriberSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """
-        Handle unique constraint violation with a clear error message.
+        Subscribe in a single statement, with a clear error for duplicates.
         """
-        try:
-            return super().create(validated_data)
-        except Exception as e:
-            if "unique" in str(e).lower() or "duplicate" in str(e).lower():
-                raise serializers.ValidationError(
-                    {"email": "This email is already subscribed to our newsletter."}
-                )
-            raise
+        subscriber, created = Subscriber.objects.subscribe(validated_data["email"])
+        if not created:
+            raise serializers.ValidationError(
+                {"email": "This email is already subscribed to our newsletter."}
+            )
+        return subscriber
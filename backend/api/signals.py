@@ -0,0 +1,72 @@
+"""
+Model signal handlers for the api app.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import hotspots
+from .caching import invalidate_dashboard_cache, invalidate_report_caches
+from .changes import FEED_NAMES
+from .models import Alert, CitizenReport, EnergyLog, Tombstone, TrafficLog, WasteLog
+
+
+@receiver(post_save, sender=CitizenReport)
+@receiver(post_delete, sender=CitizenReport)
+def citizen_report_changed(sender, **kwargs):
+    # Invalidate after commit so no reader can re-cache the old rows
+    transaction.on_commit(invalidate_report_caches)
+
+
+@receiver(post_save, sender=TrafficLog)
+def traffic_log_saved(sender, instance, created, **kwargs):
+    if created and settings.ALERT_OUTBOX_ENABLED:
+        alert = Alert.from_traffic_log(instance)
+        if alert is not None:
+            alert.save()
+
+
+@receiver(post_save, sender=EnergyLog)
+def energy_log_saved(sender, instance, created, **kwargs):
+    if created and settings.ALERT_OUTBOX_ENABLED:
+        alert = Alert.from_energy_log(instance)
+        if alert is not None:
+            alert.save()
+
+
+@receiver(post_save, sender=TrafficLog)
+@receiver(post_save, sender=EnergyLog)
+@receiver(post_save, sender=WasteLog)
+def log_saved(sender, **kwargs):
+    # The dashboard shows the latest row of each log table
+    transaction.on_commit(invalidate_dashboard_cache)
+
+
+def record_tombstone(sender, instance, **kwargs):
+    # Lets the change feed report the deletion
+    Tombstone.objects.create(model=FEED_NAMES[sender], object_id=instance.pk)
+
+
+for _model in FEED_NAMES:
+    post_delete.connect(record_tombstone, sender=_model, dispatch_uid=f"tombstone-{_model._meta.label}")
+
+
+@receiver(pre_delete, sender=CitizenReport)
+def citizen_report_deleting(sender, instance, **kwargs):
+    # duplicate_of is cleared by SET_NULL without a save(); bump updated_at
+    # so the change feed picks up the affected reports
+    CitizenReport.objects.filter(duplicate_of=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=WasteLog)
+def waste_log_indexed(sender, instance, created, **kwargs):
+    if created:
+        hotspots.record(instance)
+
+
+@receiver(post_delete, sender=WasteLog)
+def waste_log_unindexed(sender, instance, **kwargs):
+    hotspots.unrecord(instance)
@@ -0,0 +1,145 @@
+"""
+Near-duplicate detection for CitizenReport.
+
+Each report gets a 64-bit SimHash of its normalized description and a
+location key derived from its normalized location. Reports are bucketed by
+(issue_type, location_key), so finding candidates for a new report is a
+single index lookup on a handful of rows instead of a pairwise scan.
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 4
+_MASK = (1 << SIMHASH_BITS) - 1
+_WORD_RE = re.compile(r"\w+")
+
+# Upper bound on candidates fetched from one bucket, newest first
+MAX_BUCKET_CANDIDATES = 500
+
+
+def normalize_text(text):
+    """
+    Lowercase, strip diacritics and punctuation, collapse whitespace.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.lower().replace("đ", "d")
+    return " ".join(_WORD_RE.findall(text))
+
+
+def _hash64(value):
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _to_signed(value):
+    # Stored in a BigIntegerField, which is a signed 64-bit column
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def simhash(text):
+    """
+    Return the signed 64-bit SimHash of `text`, using character shingles
+    as weighted features. Shingles are far more stable than word features
+    on the short descriptions citizens write.
+    """
+    text = normalize_text(text)
+    if not text:
+        return 0
+    features = Counter(
+        text[i : i + SHINGLE_SIZE]
+        for i in range(max(len(text) - SHINGLE_SIZE + 1, 1))
+    )
+
+    weights = [0] * SIMHASH_BITS
+    for feature, weight in features.items():
+        h = _hash64(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += weight if h >> bit & 1 else -weight
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return _to_signed(fingerprint)
+
+
+def location_key(location):
+    """
+    Return a short stable key for the normalized location string.
+    """
+    return hashlib.blake2b(
+        normalize_text(location).encode("utf-8"), digest_size=8
+    ).hexdigest()
+
+
+def hamming_distance(a, b):
+    return ((a ^ b) & _MASK).bit_count()
+
+
+def fingerprint(description, location):
+    """
+    Return the fingerprint fields stored on a CitizenReport.
+
+    Pure function so it can run in worker processes during backfills.
+    """
+    return {
+        "simhash": simhash(description),
+        "location_key": location_key(location),
+    }
+
+
+def fingerprint_rows(rows):
+    """
+    Fingerprint a chunk of (id, description, location) rows.
+    """
+    return [(pk, fingerprint(description, location)) for pk, description, location in rows]
+
+
+def closest_match(value, candidates, max_distance=None):
+    """
+    Return the group root id for the closest candidate within `max_distance`.
+
+    `candidates` is an iterable of (id, simhash, duplicate_of_id) tuples.
+    Returns None if no candidate is close enough.
+    """
+    if max_distance is None:
+        max_distance = settings.REPORT_DUPLICATE_MAX_DISTANCE
+
+    best_root, best_distance = None, max_distance + 1
+    for pk, candidate_hash, root_id in candidates:
+        if candidate_hash is None:
+            continue
+        distance = hamming_distance(value, candidate_hash)
+        if distance < best_distance:
+            best_root, best_distance = root_id or pk, distance
+    return best_root
+
+
+def find_duplicate_root(issue_type, fields, created_at, exclude_id=None):
+    """
+    Look up the bucket of recent reports for (issue_type, location_key) and
+    return the id of the group root the new report should join, if any.
+    """
+    from .models import CitizenReport
+
+    window = timedelta(hours=settings.REPORT_DUPLICATE_WINDOW_HOURS)
+    candidates = CitizenReport.objects.filter(
+        issue_type=issue_type,
+        location_key=fields["location_key"],
+        created_at__gte=created_at - window,
+        created_at__lte=created_at,
+    )
+    if exclude_id is not None:
+        candidates = candidates.exclude(id=exclude_id)
+    candidates = candidates.order_by("-created_at").values_list(
+        "id", "simhash", "duplicate_of_id"
+    )[:MAX_BUCKET_CANDIDATES]
+    return closest_match(fields["simhash"], candidates)
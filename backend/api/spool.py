@@ -0,0 +1,285 @@
+"""
+Write-behind persistence for TrafficLog rows (TRAFFIC_WRITE_BEHIND).
+
+check-traffic appends the row to a local spool file instead of inserting
+it, so the response no longer waits for the INSERT and its index updates.
+A flusher thread in each worker moves the rows into the database with one
+bulk_create every TRAFFIC_SPOOL_FLUSH_ROWS rows or TRAFFIC_SPOOL_FLUSH_MS
+milliseconds, whichever comes first.
+
+Spool layout, in TRAFFIC_SPOOL_DIR:
+
+- traffic-<pid>.spool: the worker's active file, one JSON row per line.
+  The worker holds an exclusive flock on it for as long as it runs.
+- traffic-<pid>-<ns>.batch: an active file renamed for flushing. Its rows
+  are inserted in one transaction together with a SpoolBatch row named
+  after the file; the file is then deleted, then the SpoolBatch row.
+
+Crash recovery: flocks die with their process, so any spool or batch file
+that can be locked belongs to a dead worker. Every flusher checks for such
+files at start and then every RECOVER_INTERVAL seconds, claims them with
+the lock and flushes them. A batch whose SpoolBatch row exists was already
+committed (the crash came before the file was deleted) and is only
+removed, so every row is inserted exactly once. A torn last line from a
+crash mid-write is skipped. `manage.py flush_traffic_spool` runs the same
+recovery by hand.
+
+Rows keep the time of the request as created_at; ingested_at records the
+insert, which is what the change feed follows. Alerts and dashboard
+cache invalidation, which post_save does for single inserts, are done
+explicitly for each batch.
+
+Rows are handed to the OS on every append, which survives a worker crash;
+TRAFFIC_SPOOL_FSYNC also survives losing the machine, at the cost of an
+fsync per request. Needs POSIX file locks; elsewhere rows are inserted
+synchronously as before.
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import invalidate_dashboard_cache
+from .models import Alert, SpoolBatch, TrafficLog
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: write-behind is unavailable
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RECOVER_INTERVAL = 60
+_SPOOL_FILE_RE = re.compile(r"^traffic-\d+(-\d+\.batch|\.spool)$")
+
+
+def spool_dir():
+    return settings.TRAFFIC_SPOOL_DIR or os.path.join(tempfile.gettempdir(), "smartcity-traffic-spool")
+
+
+def enabled():
+    return settings.TRAFFIC_WRITE_BEHIND and fcntl is not None
+
+
+def _lock(fd, block=False):
+    """
+    Take the exclusive flock on `fd`. Returns False if another open file
+    holds it (only when not blocking).
+    """
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _same_file(f, path):
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(f.fileno())
+    return (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino)
+
+
+def _batch_name():
+    return f"traffic-{os.getpid()}-{time.time_ns()}.batch"
+
+
+def _read_rows(f):
+    rows = []
+    for line in f:
+        if not line.endswith(b"\n"):
+            logger.warning(f"Skipping a torn spool line ({len(line)} bytes)")
+            break
+        rows.append(json.loads(line))
+    return rows
+
+
+def flush_batch(path, f):
+    """
+    Insert the rows of the batch file `path`, open and locked as `f`,
+    exactly once, then delete it. Returns the number of rows inserted.
+    """
+    name = os.path.basename(path)
+    f.seek(0)
+    rows = _read_rows(f)
+    inserted = 0
+    with transaction.atomic():
+        if not SpoolBatch.objects.filter(name=name).exists():
+            logs = [TrafficLog(**{**row, "created_at": parse_datetime(row["created_at"])}) for row in rows]
+            TrafficLog.objects.bulk_create(logs)
+            if settings.ALERT_OUTBOX_ENABLED:
+                Alert.objects.bulk_create(
+                    alert for alert in (Alert.from_traffic_log(log) for log in logs) if alert is not None
+                )
+            SpoolBatch.objects.create(name=name, rows=len(logs))
+            transaction.on_commit(invalidate_dashboard_cache)
+            inserted = len(logs)
+    os.unlink(path)
+    f.close()
+    try:
+        SpoolBatch.objects.filter(name=name).delete()
+    except DatabaseError as e:
+        # Only a leftover marker: the file it guarded is gone
+        logger.warning(f"Could not delete spool marker {name}: {e}")
+    return inserted
+
+
+def recover(directory=None):
+    """
+    Flush the spool and batch files of dead workers. Returns (files, rows).
+    """
+    directory = directory or spool_dir()
+    try:
+        names = sorted(n for n in os.listdir(directory) if _SPOOL_FILE_RE.match(n))
+    except FileNotFoundError:
+        return 0, 0
+    files = rows = 0
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            f = open(path, "r+b")
+        except FileNotFoundError:
+            continue  # Claimed by someone else meanwhile
+        # Once locked, the file may since have been flushed and deleted, or
+        # (for .spool) replaced by its owner's next active file
+        if not _lock(f.fileno()) or not _same_file(f, path):
+            f.close()
+            continue
+        if name.endswith(".spool"):
+            batch = os.path.join(directory, _batch_name())
+            os.rename(path, batch)
+            path = batch
+        try:
+            rows += flush_batch(path, f)
+            files += 1
+        except Exception:
+            f.close()
+            raise
+    if files:
+        logger.info(f"Recovered {rows} spooled traffic logs from {files} orphaned files")
+    return files, rows
+
+
+class TrafficSpool:
+    """
+    The active spool file of this process and its flusher thread.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, f"traffic-{os.getpid()}.spool")
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.file = None
+        self.pending = 0
+        self.batches = []  # (path, file) rotated but not yet flushed
+        self.flush_lock = threading.Lock()
+        self.thread = None
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            # Appends always go to the end; reads (when flushing) seek to 0
+            f = open(self.path, "a+b")
+            _lock(f.fileno(), block=True)
+            # A recovering worker may have claimed a file left under this
+            # pid by a dead process while we waited for the lock
+            if _same_file(f, self.path):
+                return f
+            f.close()
+
+    def append(self, fields):
+        row = {**fields, "created_at": timezone.now().isoformat()}
+        line = json.dumps(row, separators=(",", ":")).encode() + b"\n"
+        with self.lock:
+            if self.file is None:
+                self.file = self._open()
+            self.file.write(line)
+            self.file.flush()
+            if settings.TRAFFIC_SPOOL_FSYNC:
+                os.fsync(self.file.fileno())
+            self.pending += 1
+            if self.pending >= settings.TRAFFIC_SPOOL_FLUSH_ROWS:
+                self.condition.notify()
+
+    def _rotate(self):
+        # The renamed file stays open, so this process keeps its lock
+        with self.lock:
+            if self.file is None or not self.pending:
+                return
+            batch = os.path.join(self.directory, _batch_name())
+            os.rename(self.path, batch)
+            self.batches.append((batch, self.file))
+            self.file = None
+            self.pending = 0
+
+    def flush(self):
+        """
+        Insert everything spooled so far. Returns the number of rows.
+        """
+        with self.flush_lock:
+            self._rotate()
+            inserted = 0
+            while self.batches:
+                path, f = self.batches[0]
+                inserted += flush_batch(path, f)
+                self.batches.pop(0)
+            return inserted
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="traffic-spool", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        recovered_at = 0.0
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.pending >= settings.TRAFFIC_SPOOL_FLUSH_ROWS,
+                    timeout=settings.TRAFFIC_SPOOL_FLUSH_MS / 1000,
+                )
+            try:
+                close_old_connections()
+                self.flush()
+                if time.monotonic() - recovered_at >= RECOVER_INTERVAL:
+                    recover(self.directory)
+                    recovered_at = time.monotonic()
+            except Exception as e:
+                # The batch stays in the spool and is retried on the next round
+                logger.error(f"Flushing spooled traffic logs failed: {e}")
+
+
+_spool = {"pid": None, "spool": None}
+_spool_lock = threading.Lock()
+
+
+def _flush_at_exit(spool):
+    try:
+        spool.flush()
+    except Exception as e:
+        logger.error(f"Spooled traffic logs left for recovery at exit: {e}")
+
+
+def get_spool():
+    """
+    This process's spool, with its flusher started on first use.
+    """
+    with _spool_lock:
+        if _spool["pid"] != os.getpid():
+            spool = TrafficSpool(spool_dir())
+            spool.start()
+            atexit.register(_flush_at_exit, spool)
+            _spool.update(pid=os.getpid(), spool=spool)
+        return _spool["spool"]
@@ -0,0 +1,94 @@
+"""
+Bulk subscriber import from CSV files or lists of emails.
+
+Emails are inserted in multi-row INSERT ... ON CONFLICT DO NOTHING batches,
+so re-running an import is safe and existing subscribers are skipped by
+the database.
+"""
+
+import csv
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from .models import Subscriber
+
+DEFAULT_BATCH_SIZE = 5000
+# Two bind parameters per row; stays under SQLite's and Postgres' limits
+MAX_BATCH_SIZE = 10000
+
+
+def normalize_email(value):
+    """
+    Return the normalized email, or None if it is not a valid address
+    (including values that are not strings, such as JSON numbers).
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower()
+    if not value or len(value) > 255:
+        return None
+    try:
+        validate_email(value)
+    except ValidationError:
+        return None
+    return value
+
+
+def read_csv_emails(text_stream):
+    """
+    Yield email cells from a CSV stream.
+    Uses the "email" column when the first row is a header, otherwise the
+    first column.
+    """
+    column = 0
+    for index, row in enumerate(csv.reader(text_stream)):
+        if not row:
+            continue
+        if index == 0:
+            header = [cell.strip().lower() for cell in row]
+            if "email" in header:
+                column = header.index("email")
+                continue
+        if column < len(row):
+            yield row[column]
+
+
+def import_emails(emails, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import `emails` in batches and yield one stats dict per batch.
+    """
+    batch_size = min(max(batch_size, 1), MAX_BATCH_SIZE)
+    iterator = iter(emails)
+    batch_number = 0
+
+    while raw := list(islice(iterator, batch_size)):
+        batch_number += 1
+        started = time.perf_counter()
+
+        normalized = [normalize_email(value) for value in raw]
+        valid = list(dict.fromkeys(email for email in normalized if email))
+        inserted = Subscriber.objects.insert_new(valid)
+
+        invalid = normalized.count(None)
+        yield {
+            "batch": batch_number,
+            "received": len(raw),
+            "invalid": invalid,
+            "duplicates": len(raw) - invalid - len(inserted),
+            "inserted": len(inserted),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+def summarize(batches):
+    """
+    Sum per-batch stats into import totals.
+    """
+    totals = {"batches": len(batches), "received": 0, "invalid": 0, "duplicates": 0, "inserted": 0}
+    for batch in batches:
+        for key in ("received", "invalid", "duplicates", "inserted"):
+            totals[key] += batch[key]
+    return totals
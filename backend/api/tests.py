@@ -1,3 +1,1579 @@
-from django.test import TestCase
+"""
+Tests for the api app.
 
-# Create your tests here.
+Per-endpoint query budgets: every API endpoint declares how many queries it
+may run and how many rows it may fetch, measured against seeded data of
+realistic size. A change that adds an N+1 loop, a duplicate count or an
+unbounded fetch fails here with the offending SQL listed, instead of showing
+up as latency in production.
+
+Budgets are upper bounds, not exact counts: lower them when an endpoint gets
+cheaper, and raise one only together with the reason in the commit message.
+
+SharedMemoryCache: semantics, eviction and cross-process atomicity; the
+deploy check warns about a per-process cache under several workers.
+
+PrimaryReplicaRouter: routing decisions, with the replica list patched in;
+cached payloads never opt in to replica reads.
+
+Energy anomaly scoring: the per-ingest and the vectorized batch paths give
+the same scores.
+
+Waste routes: the planner finds the obvious order on a straight street and
+computes distances between the requested bins only.
+
+Traffic forecasts: a weekly rush hour is learned; check-traffic falls back
+to the forecast when n8n times out or is slow, and a late n8n answer is
+still saved. Without a model, one fit runs in the background, never on the
+request, and new rows are folded into a copy of the model in the
+background while requests keep using the current one.
+
+check-traffic admission: 429 with Retry-After per client, 503 when every
+n8n slot and queue place is taken, and slots freed when a call fails.
+
+Bulk exports: staff only; keyset windows return every row once, ties on
+created_at included.
+
+Change feed: staff only; updates and deletions arrive once, in fixed-size
+polls.
+
+Synthetic data: chunks are reproducible and keep their timestamps.
+
+Duplicate reports: near-duplicate descriptions of one issue at one
+location are grouped, distinct ones are not, and the backfill gives the
+same groups when run again; it drops the cached lists and bumps updated_at
+of the reports whose link changed.
+
+Bulk status updates: staff only; one UPDATE that bumps updated_at and
+drops the cached report payloads.
+
+Subscribers: subscribe is one upsert; the staff-only bulk import skips
+invalid (including non-string) and existing emails.
+
+Alert dispatch: one message per subscriber over the locmem backend,
+repeated alerts for an address suppressed, leased claims, retries with
+backoff and the failed state.
+
+Report facets: counts per issue type, status and day for known reports,
+refreshed for every worker sharing the cache after a report is created
+or changes status.
+
+Sparse fieldsets: lists are compact by default, ?fields= and ?omit= return
+exactly the named fields (unknown names are ignored), and only the columns
+those fields need are selected.
+
+Report list cache: a report write makes the next list a miss with the new
+data, hits and misses are counted, and lists over the row limit are served
+uncached.
+
+Waste hot-spots: counters follow creates and deletes and match a rebuild.
+
+Traffic write-behind: spooled rows are inserted once with their request
+time, including those left behind by a dead worker, and still reach change
+feed clients whose cursor has passed that time.
+
+Connection settings: DB_CONN_MAX_AGE and DB_POOL end up in DATABASES, for
+the primary and every replica.
+
+JSON codec: the orjson renderer and parser give the same bytes and values
+as DRF's stock ones for datetimes, Decimals, UUIDs, numpy values and
+serialized reports, and JSON_BACKEND picks the pair.
+
+Metrics: /metrics sums the snapshots of every worker, keeps the totals of
+workers that have exited but not their gauges, and skips unreadable files;
+a scrape does not stop the scraped worker from flushing.
+"""
+
+import csv
+import gzip
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import runpy
+import smtplib
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipIf
+
+import requests
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api import (
+    admission, anomaly, caching, checks, db_routers, exports, forecast, hotspots, metrics, renderers, spool, views,
+    waste_routes,
+)
+from api.admission import TokenBucketThrottle
+from api.alerts import AlertDispatcher, claim_deliveries, fan_out
+from api.cache_backends import SharedMemoryCache
+from api.models import (
+    Alert,
+    AlertDelivery,
+    CitizenReport,
+    EnergyBaseline,
+    SpoolBatch,
+    Subscriber,
+    TrafficLog,
+    WasteBin,
+    WasteHotspotDaily,
+    WasteLog,
+    WasteWarningLocation,
+)
+from api.serializers import CitizenReportListSerializer, TrafficLogListSerializer
+from api.similarity import MAX_BUCKET_CANDIDATES
+from api.views import _save_traffic_log as save_traffic_log
+from benchmarks.fake_n8n import traffic_payload
+from benchmarks import synthetic
+from benchmarks.seed import seed_database
+
+# Seeded row counts, sized like a few weeks of production traffic
+SEED = {
+    "reports": 2000,
+    "traffic": 2000,
+    "energy": 300,
+    "waste": 300,
+    "subscribers": 3000,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class _QueryRecorder:
+    """
+    Execute wrapper that records every statement run on the connection.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params, many))
+        return execute(sql, params, many, context)
+
+    def row_counts(self):
+        """
+        Return (sql, params, rows) for every SELECT, counting the rows each
+        one returns by re-running it wrapped in COUNT(*).
+        """
+        counted = []
+        with connection.cursor() as cursor:
+            for sql, params, many in self.queries:
+                if many or not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                cursor.execute(f"SELECT COUNT(*) FROM ({sql}) AS budget_subquery", params)
+                counted.append((sql, params, cursor.fetchone()[0]))
+        return counted
+
+
+class QueryBudgetMixin:
+    """
+    Adds assertQueryBudget() to a TestCase.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_rows):
+        """
+        Fail if the block runs more than `max_queries` statements or its
+        SELECTs fetch more than `max_rows` rows in total.
+
+        Streaming responses must be consumed inside the block.
+        """
+        recorder = _QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            yield recorder
+
+        rows = recorder.row_counts()
+        total_rows = sum(count for _, _, count in rows)
+        problems = []
+        if len(recorder.queries) > max_queries:
+            problems.append(f"{len(recorder.queries)} queries (budget {max_queries})")
+        if total_rows > max_rows:
+            problems.append(f"{total_rows} rows fetched (budget {max_rows})")
+        if problems:
+            rows_by_sql = {(sql, repr(params)): count for sql, params, count in rows}
+            listing = "\n".join(
+                f"  {i}. [{rows_by_sql.get((sql, repr(params)), '-')} rows] {sql} {params!r}"
+                for i, (sql, params, _) in enumerate(recorder.queries, 1)
+            )
+            raise QueryBudgetExceeded(
+                f"Query budget exceeded: {', '.join(problems)}\n{listing}"
+            )
+
+
+class EndpointQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_database(**SEED, seed=7)
+        # Near-duplicate groups: 100 roots with three duplicates each
+        ids = list(CitizenReport.objects.order_by("id").values_list("id", flat=True)[:400])
+        CitizenReport.objects.bulk_update(
+            [CitizenReport(id=pk, duplicate_of_id=ids[i % 100]) for i, pk in enumerate(ids[100:])],
+            ["duplicate_of"],
+        )
+
+    def setUp(self):
+        # Facets and other cached results must be computed, not served
+        cache.clear()
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, path)
+        return response
+
+    def test_dashboard(self):
+        with self.assertQueryBudget(max_queries=6, max_rows=10):
+            self.get("/api/dashboard/")
+        with self.assertQueryBudget(max_queries=0, max_rows=0):
+            self.get("/api/dashboard/")
+
+    def test_reports_list(self):
+        # Unpaginated, so every report is fetched once; nothing per row
+        with self.assertQueryBudget(max_queries=1, max_rows=SEED["reports"]):
+            self.get("/api/reports/")
+
+    @override_settings(REPORT_LIST_CACHE_MAX_ROWS=SEED["reports"])
+    def test_reports_list_filtered(self):
+        with self.assertQueryBudget(max_queries=1, max_rows=SEED["reports"]):
+            self.get("/api/reports/", status="pending", fields="id,status")
+        # Repeated by every staff browser; served from cache until a write
+        with self.assertQueryBudget(max_queries=0, max_rows=0):
+            self.get("/api/reports/", fields="id,status", status="pending")
+
+    def test_report_detail(self):
+        with self.assertQueryBudget(max_queries=1, max_rows=1):
+            self.get("/api/reports/1/")
+
+    def test_report_duplicates(self):
+        # One grouped count, then the group roots with in_bulk
+        with self.assertQueryBudget(max_queries=2, max_rows=100):
+            response = self.get("/api/reports/duplicates/", limit=50)
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual({group["duplicate_count"] for group in response.data}, {3})
+
+    def test_report_facets(self):
+        # One grouped count plus one daily count, then served from cache
+        with self.assertQueryBudget(max_queries=2, max_rows=50):
+            facets = self.get("/api/reports/facets/").data
+        with self.assertQueryBudget(max_queries=0, max_rows=0):
+            self.assertEqual(self.get("/api/reports/facets/").data, facets)
+
+        # Recounted row by row
+        rows = list(CitizenReport.objects.values_list("issue_type", "status"))
+        issue_types, statuses = Counter(t for t, _ in rows), Counter(s for _, s in rows)
+        self.assertEqual(facets["total"], SEED["reports"])
+        self.assertEqual(
+            facets["by_issue_type"], {key: issue_types[key] for key, _ in CitizenReport.ISSUE_TYPE_CHOICES}
+        )
+        self.assertEqual(facets["by_status"], {key: statuses[key] for key, _ in CitizenReport.STATUS_CHOICES})
+
+    def test_traffic_logs_page(self):
+        with self.assertQueryBudget(max_queries=1, max_rows=101):
+            self.get("/api/traffic-logs/")
+
+    def test_subscribers_full_list(self):
+        # A single SELECT; the count comes from the fetched rows
+        with self.assertQueryBudget(max_queries=1, max_rows=SEED["subscribers"]):
+            self.get("/api/subscribers/")
+
+    def test_subscribers_keyset_page(self):
+        with self.assertQueryBudget(max_queries=1, max_rows=500):
+            self.get("/api/subscribers/", after_id=100, limit=500)
+
+    def test_subscribers_export_page(self):
+        self.assertEqual(self.client.get("/api/subscribers/export/").status_code, 403)
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        # Session and user lookups, then one page
+        with self.assertQueryBudget(max_queries=3, max_rows=1002):
+            self.get("/api/subscribers/export/", limit=1000)
+
+    def test_subscribe(self):
+        with self.assertQueryBudget(max_queries=1, max_rows=0):
+            response = self.client.post(
+                "/api/subscribe/", {"email": "new.reader@example.com"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_check_traffic(self):
+        n8n_response = mock.Mock(status_code=200)
+        n8n_response.json.return_value = traffic_payload("Nguyen Hue, District 1")
+        with mock.patch.dict("os.environ", {"N8N_TRAFFIC_WEBHOOK": "http://n8n.test/webhook"}), \
+                mock.patch("api.views.requests.post", return_value=n8n_response):
+            # The TrafficLog insert, plus the alert outbox row for incidents
+            with self.assertQueryBudget(max_queries=2, max_rows=0):
+                response = self.client.post(
+                    "/api/check-traffic/",
+                    {"location": "Nguyen Hue, District 1"},
+                    content_type="application/json",
+                )
+        self.assertEqual(response.status_code, 200)
+
+    def test_save_stats(self):
+        payload = {
+            "energyOptimizationData": {
+                "summary": {"total_consumption": 150.5, "anomalies": False, "average_power": 450.2},
+                "statistics": {"voltage": {"min": 210, "max": 230, "average": 220}},
+            },
+        }
+        self.client.post("/api/webhook/save-stats/", payload, content_type="application/json")
+        # Anomaly scoring reads and writes the same few baseline rows on
+        # every ingest, independent of the EnergyLog history
+        with self.assertQueryBudget(max_queries=5, max_rows=10):
+            response = self.client.post("/api/webhook/save-stats/", payload, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_create_report(self):
+        payload = {
+            "reporter_name": "Budget Test",
+            "issue_type": "waste",
+            "description": "Overflowing bins attracting animals near the market",
+            "location": "Le Loi, District 1",
+        }
+        # One bounded duplicate-bucket lookup, then the INSERT
+        with self.assertQueryBudget(max_queries=2, max_rows=MAX_BUCKET_CANDIDATES):
+            response = self.client.post("/api/reports/", payload, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_bulk_status(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        pending = CitizenReport.objects.filter(id__in=range(1, 201)).exclude(status="resolved").count()
+        # Session and user lookups, then the single UPDATE
+        with self.assertQueryBudget(max_queries=3, max_rows=2):
+            response = self.client.post(
+                "/api/reports/bulk-status/",
+                {"status": "resolved", "ids": list(range(1, 201))},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], pending)
+
+    def test_admin_changelists(self):
+        User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(User.objects.get(username="admin"))
+        for path in ("/admin/api/trafficlog/", "/admin/api/citizenreport/"):
+            # Session, user, count and one 50-row page; no text/JSON columns
+            with self.assertQueryBudget(max_queries=4, max_rows=60):
+                response = self.get(path)
+            self.assertNotIn("analysis", str(response.context["cl"].result_list.query))
+            with self.assertQueryBudget(max_queries=4, max_rows=60):
+                older = self.get(path + response.context["older_url"])
+            first, last = older.context["cl"].result_list[0], response.context["cl"].result_list[49]
+            self.assertLess((first.created_at, first.pk), (last.created_at, last.pk))
+
+
+def _energy_history(weeks, spike_at):
+    rng = random.Random(3)
+    start = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+    rows = []
+    for hour in range(weeks * 7 * 24):
+        consumption = 100 + 40 * math.sin(2 * math.pi * (hour % 24) / 24) + rng.gauss(0, 3)
+        if hour == spike_at:
+            consumption += 60
+        voltage = {"min": 210 + rng.gauss(0, 1), "max": 230 + rng.gauss(0, 1), "average": 220}
+        rows.append((hour + 1, start + timedelta(hours=hour), consumption, consumption * 4, voltage))
+    return rows
+
+
+class EnergyAnomalyTests(TestCase):
+    @mock.patch.object(anomaly, "MIN_SAMPLES_SEASONAL", 2)
+    def test_online_and_batch_scores_agree(self):
+        rows = _energy_history(weeks=3, spike_at=400)
+        online = {
+            pk: anomaly.observe(anomaly.snapshot_values(consumption, power, voltage), at)
+            for pk, at, consumption, power, voltage in rows
+        }
+        batch, baselines = anomaly.rescan(rows)
+
+        self.assertEqual(online, batch)
+        self.assertEqual(online[401]["anomaly_flags"], ["total_consumption", "avg_power"])
+        self.assertEqual(len(baselines), EnergyBaseline.objects.count())
+        stored = {(b.metric, b.slot): b for b in EnergyBaseline.objects.all()}
+        for baseline in baselines:
+            self.assertAlmostEqual(stored[(baseline.metric, baseline.slot)].mean, baseline.mean)
+
+
+class WasteRouteTests(TestCase):
+    def test_route_orders_bins_along_a_street(self):
+        # Bins along one street: the best open path visits them in order
+        WasteBin.objects.bulk_create(
+            WasteBin(name=f"Bin {i}", latitude=10.77, longitude=106.60 + i * 0.01) for i in range(12)
+        )
+        names = [f"bin {i}" for i in random.Random(5).sample(range(12), 12)] + ["Unknown corner"]
+        WasteLog.objects.create(avg_fill_level=80, warning_locations=names)
+
+        response = self.client.get("/api/waste/route/")
+        self.assertEqual(response.status_code, 200)
+        order = [stop["name"] for stop in response.data["stops"]]
+        self.assertIn(order, ([f"Bin {i}" for i in range(12)], [f"Bin {i}" for i in reversed(range(12))]))
+        self.assertEqual(response.data["unresolved"], ["Unknown corner"])
+
+        response = self.client.get("/api/waste/route/", {"depot": "10.77,106.60"})
+        self.assertEqual(response.data["stops"][0]["name"], "Bin 0")
+        self.assertAlmostEqual(response.data["total_km"], 2 * response.data["return_leg_km"], places=2)
+
+    def test_distances_cover_only_the_requested_bins(self):
+        WasteBin.objects.bulk_create(
+            WasteBin(name=f"Bin {i}", latitude=10.70 + i * 0.001, longitude=106.60) for i in range(200)
+        )
+        with mock.patch.object(waste_routes, "haversine_matrix", wraps=waste_routes.haversine_matrix) as matrix:
+            route = waste_routes.plan_route(["Bin 3", "bin 7", "BIN 3", "Bin 150"])
+        latitudes, _ = matrix.call_args.args
+        self.assertEqual(len(latitudes), 3)
+        self.assertEqual(len(route["stops"]), 3)
+
+        # Renamed and removed bins are picked up by the name index
+        WasteBin.objects.filter(name="Bin 7").update(name="Bin 7A", updated_at=timezone.now())
+        WasteBin.objects.filter(name="Bin 150").delete()
+        route = waste_routes.plan_route(["Bin 3", "Bin 7", "Bin 7a", "Bin 150"])
+        self.assertEqual(sorted(stop["name"] for stop in route["stops"]), ["Bin 3", "Bin 7A"])
+        self.assertEqual(route["unresolved"], ["Bin 7", "Bin 150"])
+
+        self.assertEqual(waste_routes.plan_route(["Nowhere"])["stops"], [])
+
+
+class TrafficHistoryMixin:
+    def setUp(self):
+        # The history starts on a Monday, 00:00 UTC, five weeks ago
+        midnight = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.START = midnight - timedelta(weeks=5, days=midnight.weekday())
+        # Three weeks of hourly logs with a jam at 08:00 on weekdays
+        TrafficLog.objects.bulk_create(
+            TrafficLog(
+                address="Nguyen Hue, District 1",
+                congestion_rate=0.9 if hour % 24 == 8 and hour % 168 < 120 else 0.2,
+                flow_speed=10 if hour % 24 == 8 and hour % 168 < 120 else 40,
+                delay_time=0,
+                status_code="HEAVY" if hour % 24 == 8 and hour % 168 < 120 else "CLEAR",
+            )
+            for hour in range(3 * 168)
+        )
+        for hour, pk in enumerate(TrafficLog.objects.order_by("id").values_list("id", flat=True)):
+            TrafficLog.objects.filter(id=pk).update(created_at=self.START + timedelta(hours=hour))
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(TRAFFIC_FORECAST_FILE=os.path.join(directory.name, "forecast.npz"))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        state = mock.patch.object(
+            forecast, "_state", {"forecaster": None, "checked_at": 0.0, "saved_at": 0.0, "file_mtime": None}
+        )
+        state.start()
+        self.addCleanup(state.stop)
+        self.addCleanup(self.wait_for_background_refresh)
+
+    def wait_for_background_refresh(self):
+        with forecast._fit_lock:
+            pass
+
+
+class TrafficForecastTests(TrafficHistoryMixin, TestCase):
+    def test_forecast_learns_rush_hour(self):
+        forecast.fit_and_save()
+        # A Tuesday, a week or more after the history ends, from 07:00
+        at = self.START + timedelta(weeks=4, days=1, hours=7)
+        response = self.client.get(
+            "/api/traffic/forecast/", {"location": "nguyen hue, district 1", "at": at.isoformat(), "hours": 3}
+        )
+        self.assertEqual(response.status_code, 200)
+        points = response.data["forecast"]
+        self.assertEqual([p["statusCode"] for p in points], ["CLEAR", "HEAVY", "CLEAR"])
+        self.assertGreater(points[1]["congestionRate"], 0.8)
+
+        # A saved model gives the same answer after a restart
+        forecast._state.update(forecaster=None, file_mtime=None)
+        again = self.client.get(
+            "/api/traffic/forecast/", {"location": "Nguyen Hue, District 1", "at": at.isoformat(), "hours": 3}
+        )
+        self.assertEqual(again.data["forecast"], points)
+        self.assertEqual(self.client.get("/api/traffic/forecast/", {"location": "Unknown"}).status_code, 404)
+
+    def test_no_model_fits_in_the_background_only(self):
+        fitting, release = mock.Mock(), threading.Event()
+        fitting.side_effect = lambda: release.wait(5)
+        n8n = mock.Mock(**{"json.return_value": traffic_payload("Nguyen Hue, District 1")})
+        with mock.patch.object(forecast, "fit_and_save", fitting), \
+                mock.patch.dict("os.environ", {"N8N_TRAFFIC_WEBHOOK": "http://n8n.test/webhook"}), \
+                mock.patch("api.views.requests.post", return_value=n8n):
+            self.assertIsNone(forecast.get_forecaster())
+            response = self.client.get("/api/traffic/forecast/", {"location": "Nguyen Hue, District 1"})
+            self.assertEqual(response.status_code, 503)
+            response = self.client.post(
+                "/api/check-traffic/", {"location": "Nguyen Hue, District 1"}, content_type="application/json"
+            )
+            self.assertNotIn("predicted", response.data)
+            release.set()
+        # One fit for all of them, off the request thread
+        with forecast._fit_lock:
+            self.assertEqual(fitting.call_count, 1)
+
+    def test_check_traffic_falls_back_to_forecast(self):
+        forecast.fit_and_save()
+        with mock.patch.dict("os.environ", {"N8N_TRAFFIC_WEBHOOK": "http://n8n.test/webhook"}), \
+                mock.patch("api.views.requests.post", side_effect=requests.exceptions.Timeout) as post:
+            response = self.client.post(
+                "/api/check-traffic/", {"location": "Nguyen Hue, District 1"}, content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data["predicted"])
+
+            response = self.client.post(
+                "/api/check-traffic/",
+                {"location": "Nguyen Hue, District 1", "at": (self.START + timedelta(weeks=6, hours=8)).isoformat()},
+                content_type="application/json",
+            )
+            self.assertEqual(response.data["statusCode"], "HEAVY")
+            self.assertEqual(post.call_count, 1)
+
+
+# The late answer is saved by another thread, which must see committed rows
+class CheckTrafficLateAnswerTests(TrafficHistoryMixin, TransactionTestCase):
+    def test_slow_n8n_gets_a_forecast_and_its_answer_is_saved(self):
+        forecast.fit_and_save()
+        release, saved = threading.Event(), threading.Event()
+        payload = {**traffic_payload("Nguyen Hue, District 1"), "analysis": "Late answer"}
+
+        def slow_post(*args, **kwargs):
+            release.wait(5)
+            return mock.Mock(**{"json.return_value": payload})
+
+        def save(*args):
+            save_traffic_log(*args)
+            saved.set()
+
+        with override_settings(CHECK_TRAFFIC_FORECAST_AFTER=0.05), \
+                mock.patch.dict("os.environ", {"N8N_TRAFFIC_WEBHOOK": "http://n8n.test/webhook"}), \
+                mock.patch("api.views.requests.post", side_effect=slow_post), \
+                mock.patch("api.views._save_traffic_log", side_effect=save):
+            response = self.client.post(
+                "/api/check-traffic/", {"location": "Nguyen Hue, District 1"}, content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data["predicted"])
+            self.assertFalse(TrafficLog.objects.filter(analysis="Late answer").exists())
+
+            release.set()
+            self.assertTrue(saved.wait(5))
+        self.assertEqual(TrafficLog.objects.filter(analysis="Late answer").count(), 1)
+
+
+# The refresh thread reads TrafficLog and must see committed rows
+class TrafficForecastRefreshTests(TrafficHistoryMixin, TransactionTestCase):
+    def test_catch_up_runs_off_the_request_thread(self):
+        served = forecast.fit_and_save()
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        TrafficLog.objects.bulk_create(
+            TrafficLog(
+                address="Le Loi, District 1",
+                congestion_rate=0.5,
+                flow_speed=20,
+                delay_time=1,
+                status_code="SLOW",
+                created_at=an_hour_ago,
+            )
+            for _ in range(12)
+        )
+        forecast._state["checked_at"] = 0.0
+        catching_up, release = threading.Event(), threading.Event()
+        catch_up = forecast._catch_up
+
+        def slow_catch_up(forecaster):
+            catching_up.set()
+            release.wait(5)
+            return catch_up(forecaster)
+
+        with mock.patch.object(forecast, "_catch_up", side_effect=slow_catch_up):
+            self.assertIs(forecast.get_forecaster(), served)
+            self.assertTrue(catching_up.wait(5))
+            # Requests keep the current model while a copy catches up
+            self.assertIs(forecast.get_forecaster(), served)
+            release.set()
+            self.wait_for_background_refresh()
+
+        refreshed = forecast.get_forecaster()
+        self.assertIsNot(refreshed, served)
+        self.assertEqual(refreshed.observations("Le Loi, District 1"), 12)
+        self.assertEqual(served.observations("Le Loi, District 1"), 0)
+
+
+class CheckTrafficAdmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            N8N_MAX_IN_FLIGHT=1,
+            N8N_QUEUE_SIZE=0,
+            N8N_SLOT_FILE=os.path.join(directory.name, "n8n.slots"),
+            CHECK_TRAFFIC_FORECAST_AFTER=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for patcher in (
+            mock.patch.object(admission, "_slots", None),
+            mock.patch.object(forecast, "predicted_traffic", return_value=None),
+            mock.patch.dict("os.environ", {"N8N_TRAFFIC_WEBHOOK": "http://n8n.test/webhook"}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.n8n = mock.Mock(**{"json.return_value": traffic_payload("Le Loi, District 1")})
+
+    def check(self, ip="10.0.0.1"):
+        return self.client.post(
+            "/api/check-traffic/", {"location": "Le Loi, District 1"}, content_type="application/json",
+            HTTP_X_REAL_IP=ip,
+        )
+
+    @mock.patch.object(TokenBucketThrottle, "THROTTLE_RATES", {"check_traffic": "2/min"})
+    def test_clients_over_their_rate_get_429(self):
+        with mock.patch("api.views.requests.post", return_value=self.n8n):
+            self.assertEqual([self.check().status_code for _ in range(2)], [200, 200])
+            response = self.check()
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response["Retry-After"], "30")
+            self.assertEqual(self.check(ip="10.0.0.2").status_code, 200)
+
+    def test_full_queue_gets_503(self):
+        with mock.patch("api.views.requests.post", return_value=self.n8n) as post:
+            with admission.n8n_slot():
+                response = self.check()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "2")
+            post.assert_not_called()
+            self.assertEqual(self.check().status_code, 200)
+
+    def test_slot_is_released_when_the_call_fails(self):
+        with mock.patch("api.views.requests.post", side_effect=requests.exceptions.ConnectionError):
+            self.assertEqual(self.check().status_code, 503)
+        with mock.patch("api.views.requests.post", return_value=self.n8n):
+            self.assertEqual(self.check().status_code, 200)
+        with self.assertRaises(ValueError):
+            with admission.n8n_slot():
+                raise ValueError
+        with admission.n8n_slot():
+            pass
+
+
+class BulkExportTests(TestCase):
+    def test_staff_only(self):
+        self.assertEqual(self.client.get("/api/export/reports/").status_code, 403)
+        self.client.force_login(User.objects.create_user("citizen"))
+        self.assertEqual(self.client.get("/api/export/reports/").status_code, 403)
+
+    def test_export_walks_windows_across_ties(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        seed_database(reports=0, traffic=250, energy=0, waste=0, subscribers=0)
+        first = TrafficLog.objects.order_by("id").first()
+        TrafficLog.objects.filter(id__lt=first.id + 120).update(created_at=first.created_at)
+
+        with mock.patch.object(exports, "EXPORT_WINDOW", 50):
+            response = self.client.get("/api/export/traffic-logs/", {"format": "csv", "gzip": "1"})
+            body = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="trafficlog.csv.gz"')
+        ids = [int(row[0]) for row in list(csv.reader(io.StringIO(body)))[1:]]
+        self.assertEqual(sorted(ids), list(TrafficLog.objects.order_by("id").values_list("id", flat=True)))
+
+        self.assertEqual(self.client.get("/api/export/traffic-logs/", {"from": "yesterday"}).status_code, 400)
+
+
+@override_settings(CHANGE_FEED_SETTLE_SECONDS=0)
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+
+    def poll(self, **params):
+        response = self.client.get("/api/changes/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_feed_reports_updates_and_deletions(self):
+        reports = [
+            CitizenReport.objects.create(
+                reporter_name="Feed", issue_type="waste", description=f"Report {i}", location="District 1"
+            )
+            for i in range(3)
+        ]
+        Subscriber.objects.create(email="feed@example.com")
+
+        first = self.poll(models="reports,subscribers", limit=2)
+        self.assertEqual(len(first["changes"]), 3)
+        self.assertTrue(first["has_more"])
+        # Session and user, then one query per model plus the tombstones,
+        # whatever the table size
+        with self.assertNumQueries(5):
+            second = self.poll(since=first["next"], limit=2)
+        self.assertEqual([(c["model"], c["id"]) for c in second["changes"]], [("reports", reports[2].id)])
+        self.assertFalse(second["has_more"])
+
+        reports[0].status = "in_progress"
+        reports[0].save()
+        deleted_id = reports[1].id
+        reports[1].delete()
+        third = self.poll(since=second["next"])
+        self.assertEqual(
+            [(c["op"], c["id"]) for c in third["changes"]],
+            [("upsert", reports[0].id), ("delete", deleted_id)],
+        )
+        self.assertEqual(third["changes"][0]["data"]["status"], "in_progress")
+        self.assertEqual(self.poll(since=third["next"])["changes"], [])
+
+        self.assertEqual(self.client.get("/api/changes/", {"since": "garbage"}).status_code, 400)
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/changes/").status_code, 403)
+        self.client.force_login(User.objects.create_user("citizen"))
+        self.assertEqual(self.client.get("/api/changes/").status_code, 403)
+
+
+class SyntheticDataTests(TestCase):
+    def test_chunks_are_reproducible_and_keep_timestamps(self):
+        end = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        start = end - timedelta(days=7)
+        for table, (model_name, generator, _) in synthetic.TABLES.items():
+            first, second = (list(generator(random.Random(f"1:{table}:0"), 1, 50, start, end)) for _ in range(2))
+            self.assertEqual(first, second)
+            self.assertTrue(all(start <= row["created_at"] <= end for row in first))
+
+        for table, chunk, rows, chunk_start, chunk_end in synthetic.plan_chunks({"traffic": 250}, start, end, 100):
+            synthetic.generate_chunk(table, chunk, rows, chunk_start, chunk_end, seed=1)
+        self.assertEqual(TrafficLog.objects.count(), 250)
+        oldest = TrafficLog.objects.order_by("created_at").first()
+        self.assertEqual(oldest, TrafficLog.objects.order_by("id").first())
+        self.assertLess(oldest.created_at, start + timedelta(days=1))
+
+
+class DuplicateReportTests(TestCase):
+    BINS = "Overflowing garbage bins near the Ben Thanh market entrance, smells terrible"
+    BINS_AGAIN = "Overflowing garbage bins near Ben Thanh market entrance - smells terrible!!"
+    LIGHT = "Street light broken at the corner, very dark at night"
+
+    def report(self, description, location="Le Loi, District 1", issue_type="waste"):
+        response = self.client.post(
+            "/api/reports/",
+            {"reporter_name": "Dup", "issue_type": issue_type, "description": description, "location": location},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return CitizenReport.objects.get(id=response.data["id"])
+
+    def test_near_duplicates_at_one_location_are_grouped(self):
+        first = self.report(self.BINS)
+        self.assertIsNone(first.duplicate_of_id)
+        self.assertEqual(self.report(self.BINS_AGAIN, location="le loi,  District 1").duplicate_of_id, first.id)
+        self.assertEqual(self.report(self.BINS).duplicate_of_id, first.id)
+
+        self.assertIsNone(self.report(self.LIGHT).duplicate_of_id)
+        self.assertIsNone(self.report(self.BINS, location="Nguyen Hue, District 1").duplicate_of_id)
+        self.assertIsNone(self.report(self.BINS, issue_type="traffic").duplicate_of_id)
+
+        groups = self.client.get("/api/reports/duplicates/").data
+        self.assertEqual([(g["root"]["id"], g["duplicate_count"]) for g in groups], [(first.id, 2)])
+
+    def test_backfill_is_idempotent(self):
+        # Imported without fingerprints, as before duplicate detection
+        CitizenReport.objects.bulk_create(
+            CitizenReport(reporter_name="Old", issue_type="waste", description=text, location="Le Loi, District 1")
+            for text in (self.BINS, self.LIGHT, self.BINS_AGAIN, self.BINS)
+        )
+        groups = lambda: list(CitizenReport.objects.order_by("id").values_list("simhash", "duplicate_of_id"))
+        updated = lambda: list(CitizenReport.objects.order_by("id").values_list("updated_at", flat=True))
+        imported = updated()
+        cache.clear()
+        self.assertEqual(self.client.get("/api/reports/")["X-Cache"], "MISS")
+
+        call_command("backfill_report_duplicates", workers=1, stdout=io.StringIO())
+        first = groups()
+        root = CitizenReport.objects.order_by("id").first().id
+        self.assertEqual([duplicate_of for _, duplicate_of in first], [None, None, root, root])
+        self.assertTrue(all(value is not None for value, _ in first))
+        # New links reach change feed clients and the cached lists
+        linked = updated()
+        self.assertEqual(linked[:2], imported[:2])
+        self.assertTrue(all(after > before for before, after in zip(imported[2:], linked[2:])))
+        response = self.client.get("/api/reports/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(sorted(r["duplicate_of"] or 0 for r in response.json()), [0, 0, root, root])
+
+        output = io.StringIO()
+        call_command("backfill_report_duplicates", workers=1, stdout=output)
+        self.assertEqual(groups(), first)
+        self.assertEqual(updated(), linked)
+        self.assertIn("Linked 2 reports", output.getvalue())
+
+
+class BulkStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reports = [
+            CitizenReport.objects.create(
+                reporter_name="Bulk",
+                issue_type="waste",
+                description=f"Report {i}",
+                location="District 5",
+                status="pending",
+            )
+            for i in range(3)
+        ]
+
+    def post(self, payload):
+        return self.client.post("/api/reports/bulk-status/", payload, content_type="application/json")
+
+    def test_only_staff_can_change_status(self):
+        payload = {"status": "resolved", "filter": {"status": "pending"}}
+        self.assertEqual(self.post(payload).status_code, 403)
+        self.client.force_login(User.objects.create_user("citizen"))
+        self.assertEqual(self.post(payload).status_code, 403)
+        self.assertFalse(CitizenReport.objects.exclude(status="pending").exists())
+
+    def test_update_counts_bumps_and_invalidates(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        self.client.get("/api/reports/facets/")
+        self.assertEqual(self.client.get("/api/reports/")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/api/reports/")["X-Cache"], "HIT")
+        before = self.reports[0].updated_at
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post({"status": "resolved", "ids": [r.id for r in self.reports[:2]]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertGreater(CitizenReport.objects.get(id=self.reports[0].id).updated_at, before)
+        self.assertIsNone(cache.get(caching.REPORT_FACETS_CACHE_KEY))
+        listed = self.client.get("/api/reports/")
+        self.assertEqual(listed["X-Cache"], "MISS")
+        self.assertEqual(sorted(r["status"] for r in listed.json()), ["pending", "resolved", "resolved"])
+
+        # Reports already in the target status are not touched again
+        self.assertEqual(self.post({"status": "resolved", "filter": {"issue_type": "waste"}}).data["updated"], 1)
+
+
+class SubscriberImportTests(TestCase):
+    def setUp(self):
+        Subscriber.objects.create(email="existing@example.com")
+
+    def post(self, data, **kwargs):
+        return self.client.post("/api/subscribers/import/?batch_size=3", data, **kwargs)
+
+    def test_subscribe_is_a_single_upsert(self):
+        with self.assertNumQueries(1):
+            first = self.client.post("/api/subscribe/", {"email": "new@example.com"}, content_type="application/json")
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            again = self.client.post("/api/subscribe/", {"email": "new@example.com"}, content_type="application/json")
+        self.assertEqual((again.status_code, again.data["error"]), (400, "Already subscribed"))
+
+        rows = Subscriber.objects.insert_new(["new@example.com", "other@example.com", "existing@example.com"])
+        self.assertEqual([email for _, email in rows], ["other@example.com"])
+        self.assertEqual(Subscriber.objects.count(), 3)
+
+    def test_import_needs_staff(self):
+        payload = {"emails": ["reader@example.com"]}
+        self.assertEqual(self.post(payload, content_type="application/json").status_code, 403)
+        self.client.force_login(User.objects.create_user("citizen"))
+        self.assertEqual(self.post(payload, content_type="application/json").status_code, 403)
+        self.assertFalse(Subscriber.objects.filter(email="reader@example.com").exists())
+
+    def test_import_skips_invalid_and_existing_emails(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        emails = [
+            " Reader@Example.com ", "reader@example.com", "EXISTING@example.com",
+            "not-an-email", 42, {"email": "x@example.com"}, None, "second@example.com",
+        ]
+        response = self.post({"emails": emails}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["totals"],
+            {"batches": 3, "received": 8, "invalid": 4, "duplicates": 2, "inserted": 2},
+        )
+        self.assertEqual(
+            set(Subscriber.objects.values_list("email", flat=True)),
+            {"existing@example.com", "reader@example.com", "second@example.com"},
+        )
+
+        upload = io.BytesIO(b"name,email\nReader,reader@example.com\nThird,third@example.com\n")
+        upload.name = "subscribers.csv"
+        response = self.post({"file": upload})
+        self.assertEqual(response.data["totals"]["inserted"], 1)
+        self.assertEqual(response.data["totals"]["duplicates"], 1)
+        self.assertEqual(self.post({"emails": "a@example.com"}, content_type="application/json").status_code, 400)
+
+
+class AlertDispatchTests(TestCase):
+    def setUp(self):
+        Subscriber.objects.bulk_create(Subscriber(email=f"reader{i}@example.com") for i in range(3))
+        self.dispatcher = AlertDispatcher(connections=2, max_attempts=2, backoff_seconds=30)
+        self.addCleanup(self.dispatcher.close)
+
+    def jam(self, address):
+        return TrafficLog.objects.create(
+            address=address, congestion_rate=0.95, flow_speed=5, status_code="SEVERE", alert_content="Jam"
+        )
+
+    def test_fan_out_sends_one_message_per_subscriber(self):
+        self.jam("Nguyen Hue, District 1")
+        stats = self.dispatcher.run_once()
+        self.assertEqual((stats["fanned_out"], stats["sent"]), (3, 3))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f"reader{i}@example.com" for i in range(3)])
+        self.assertEqual(mail.outbox[0].subject, "Traffic alert: Nguyen Hue, District 1")
+        self.assertEqual(self.dispatcher.run_once()["claimed"], 0)
+
+    def test_repeated_alerts_for_an_address_are_suppressed(self):
+        self.jam("Nguyen Hue, District 1")
+        self.jam("nguyen hue,  District 1")
+        self.jam("Le Loi, District 1")
+        stats = self.dispatcher.run_once()
+        self.assertEqual((stats["suppressed"], stats["sent"]), (1, 6))
+
+        # Once the window has passed, the address alerts again
+        Alert.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        self.jam("Nguyen Hue, District 1")
+        self.assertEqual(self.dispatcher.run_once()["sent"], 3)
+        self.assertEqual(Alert.objects.filter(suppressed=True).count(), 1)
+        with override_settings(ALERT_DEDUPE_SECONDS=0):
+            self.jam("Nguyen Hue, District 1")
+            self.assertEqual(self.dispatcher.run_once()["sent"], 3)
+
+    def test_claims_are_leased(self):
+        self.jam("Le Loi, District 1")
+        fan_out(Alert.objects.get())
+        self.assertEqual(len(claim_deliveries(batch_size=2, lease_seconds=60)), 2)
+        self.assertEqual(len(claim_deliveries(batch_size=10, lease_seconds=60)), 1)
+        self.assertEqual(claim_deliveries(batch_size=10, lease_seconds=60), [])
+        # A crashed dispatcher's rows come back once the lease expires
+        AlertDelivery.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(claim_deliveries(batch_size=10, lease_seconds=60)), 3)
+
+    def test_failed_sends_back_off_then_fail(self):
+        self.jam("Le Loi, District 1")
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=smtplib.SMTPServerDisconnected("Connection unexpectedly closed"),
+        ):
+            before = timezone.now()
+            self.assertEqual(self.dispatcher.run_once()["retried"], 3)
+            for delivery in AlertDelivery.objects.all():
+                self.assertEqual((delivery.status, delivery.attempts), ("pending", 1))
+                self.assertEqual(delivery.last_error, "Connection unexpectedly closed")
+                self.assertGreaterEqual(delivery.next_attempt_at, before + timedelta(seconds=24))
+                self.assertLessEqual(delivery.next_attempt_at, timezone.now() + timedelta(seconds=36))
+            self.assertEqual(self.dispatcher.run_once()["claimed"], 0)
+
+            AlertDelivery.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(self.dispatcher.run_once()["failed"], 3)
+        self.assertEqual(set(AlertDelivery.objects.values_list("status", "attempts")), {("failed", 2)})
+        AlertDelivery.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.dispatcher.run_once()["claimed"], 0)
+        self.assertEqual(mail.outbox, [])
+
+
+class ReportFacetsTests(TestCase):
+    # (issue_type, status, days ago)
+    REPORTS = [
+        ("traffic", "pending", 0),
+        ("traffic", "resolved", 0),
+        ("waste", "pending", 1),
+        ("waste", "pending", 3),
+        ("energy", "rejected", 40),
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "facets.cache")
+        shared = override_settings(
+            CACHES={"default": {"BACKEND": "api.cache_backends.SharedMemoryCache", "LOCATION": self.path}}
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+        today = timezone.localdate()
+        for issue_type, status, days_ago in self.REPORTS:
+            report = CitizenReport.objects.create(
+                reporter_name="Facets", issue_type=issue_type, description="Facet", location="District 1", status=status
+            )
+            midday = datetime.combine(today - timedelta(days=days_ago), datetime.min.time()) + timedelta(hours=12)
+            CitizenReport.objects.filter(id=report.id).update(created_at=timezone.make_aware(midday))
+
+    def facets(self):
+        response = self.client.get("/api/reports/facets/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts(self):
+        facets = self.facets()
+        self.assertEqual(facets["total"], 5)
+        self.assertEqual(facets["by_issue_type"], {"traffic": 2, "waste": 2, "energy": 1, "other": 0})
+        self.assertEqual(facets["by_status"], {"pending": 3, "in_progress": 0, "resolved": 1, "rejected": 1})
+        self.assertEqual(
+            [(row["issue_type"], row["status"], row["count"]) for row in facets["by_issue_type_status"]],
+            [("energy", "rejected", 1), ("traffic", "pending", 1), ("traffic", "resolved", 1), ("waste", "pending", 2)],
+        )
+        daily = facets["daily"]
+        self.assertEqual(len(daily), 30)
+        self.assertEqual(daily[-1], {"date": timezone.localdate().isoformat(), "count": 2})
+        # Only the last 30 days
+        self.assertEqual({i: day["count"] for i, day in enumerate(daily) if day["count"]}, {29: 2, 28: 1, 26: 1})
+
+    def test_writes_refresh_facets_in_every_worker(self):
+        before = self.facets()
+        # Another gunicorn worker, mapping the same cache file
+        other_worker = SharedMemoryCache(self.path, {})
+        self.assertEqual(other_worker.get(caching.REPORT_FACETS_CACHE_KEY)["total"], 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/reports/",
+                {"reporter_name": "New", "issue_type": "other", "description": "Fallen tree", "location": "District 9"},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(other_worker.get(caching.REPORT_FACETS_CACHE_KEY))
+        created = self.facets()
+        self.assertEqual(created["total"], before["total"] + 1)
+        self.assertEqual(created["by_issue_type"]["other"], 1)
+        self.assertEqual(created["daily"][-1]["count"], 3)
+
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/reports/bulk-status/",
+                {"status": "in_progress", "filter": {"status": "pending"}},
+                content_type="application/json",
+            )
+        self.assertIsNone(other_worker.get(caching.REPORT_FACETS_CACHE_KEY))
+        pending = created["by_status"]["pending"]
+        by_status = self.facets()["by_status"]
+        self.assertEqual((by_status["pending"], by_status["in_progress"]), (0, pending))
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.report = CitizenReport.objects.create(
+            reporter_name="Fields",
+            issue_type="traffic",
+            description="Broken signal",
+            location="District 3",
+            status="pending",
+        )
+        TrafficLog.objects.create(
+            address="Hai Ba Trung", congestion_rate=0.5, flow_speed=20, delay_time=3, analysis="Long text"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, **params):
+        """
+        The first row's keys and the columns the SELECT on the model's
+        table read.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        row = data if "id" in data else (data["results"] if isinstance(data, dict) else data)[0]
+        table = "api_trafficlog" if "traffic" in path else "api_citizenreport"
+        sql = next(q["sql"] for q in queries if q["sql"].startswith("SELECT") and f'FROM "{table}"' in q["sql"])
+        select = sql[len("SELECT "):sql.index(" FROM ")]
+        return set(row), {column.split(".")[-1].strip('"') for column in select.split(", ")}
+
+    def test_compact_list_by_default(self):
+        compact = set(CitizenReportListSerializer.Meta.fields)
+        keys, columns = self.get("/api/reports/")
+        self.assertEqual(keys, compact)
+        self.assertEqual(columns, compact - {"duplicate_of"} | {"duplicate_of_id"})
+
+        keys, columns = self.get("/api/traffic-logs/")
+        self.assertEqual(keys, set(TrafficLogListSerializer.Meta.fields))
+        self.assertNotIn("analysis", columns)
+        self.assertNotIn("alternative_routes", columns)
+
+    def test_fields_selects_exactly_those(self):
+        keys, columns = self.get("/api/reports/", fields="id,status,description")
+        self.assertEqual(keys, {"id", "status", "description"})
+        self.assertEqual(columns, {"id", "status", "description"})
+        # Display labels read their column
+        keys, columns = self.get("/api/reports/", fields="id,status_display")
+        self.assertEqual(keys, {"id", "status_display"})
+        self.assertEqual(columns, {"id", "status"})
+
+        keys, columns = self.get(f"/api/reports/{self.report.id}/", fields="id,location")
+        self.assertEqual(keys, {"id", "location"})
+        self.assertEqual(columns, {"id", "location"})
+
+        keys, columns = self.get("/api/traffic-logs/", fields="id,analysis")
+        self.assertEqual(keys, {"id", "analysis"})
+        self.assertEqual(columns, {"id", "analysis"})
+
+    def test_omit_drops_fields_and_columns(self):
+        keys, columns = self.get("/api/reports/", omit="reporter_name,updated_at")
+        self.assertEqual(keys, set(CitizenReportListSerializer.Meta.fields) - {"reporter_name", "updated_at"})
+        self.assertFalse({"reporter_name", "updated_at", "description"} & columns)
+
+        keys, _ = self.get("/api/reports/", fields="id,status,location", omit="location")
+        self.assertEqual(keys, {"id", "status"})
+
+    def test_unknown_names_are_ignored(self):
+        keys, columns = self.get("/api/reports/", fields="id,status,nonexistent")
+        self.assertEqual(keys, {"id", "status"})
+        self.assertEqual(columns, {"id", "status"})
+
+        keys, _ = self.get("/api/reports/", omit="nonexistent")
+        self.assertEqual(keys, set(CitizenReportListSerializer.Meta.fields))
+
+
+class ReportListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_write_invalidates_cached_lists(self):
+        report = CitizenReport.objects.create(
+            reporter_name="Cache",
+            issue_type="traffic",
+            description="Broken signal",
+            location="District 3",
+            status="pending",
+        )
+        lookups = lambda: dict(caching._report_list_lookups)
+        before = lookups()
+        first = self.client.get("/api/reports/", {"status": "pending"})
+        second = self.client.get("/api/reports/", {"status": "pending"})
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual([r["id"] for r in first.json()], [report.id])
+        self.assertEqual(self.client.get("/api/reports/", {"status": "resolved"})["X-Cache"], "MISS")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CitizenReport.objects.filter(id=report.id).set_status("resolved")
+        third = self.client.get("/api/reports/", {"status": "pending"})
+        self.assertEqual((third["X-Cache"], third.json()), ("MISS", []))
+        self.assertEqual([lookups().get(r, 0) - before.get(r, 0) for r in ("hit", "miss")], [1, 3])
+
+    @override_settings(REPORT_LIST_CACHE_MAX_ROWS=2)
+    def test_lists_over_the_row_limit_are_not_cached(self):
+        CitizenReport.objects.bulk_create(
+            CitizenReport(reporter_name="Cache", issue_type=issue, description=f"Report {i}", location="District 4")
+            for i, issue in enumerate(["waste", "waste", "waste", "traffic"])
+        )
+        # Small slots, as in production: only lists within the limit fit
+        with tempfile.TemporaryDirectory() as directory:
+            shared = SharedMemoryCache(
+                os.path.join(directory, "reports.cache"), {"OPTIONS": {"SLOTS": 8, "SLOT_SIZE": 1024}}
+            )
+            with mock.patch.object(views, "cache", shared), mock.patch.object(caching, "cache", shared), \
+                    mock.patch.object(views, "allow_replica_reads") as allow:
+                first = self.client.get("/api/reports/", {"issue_type": "waste"})
+                allow.assert_not_called()
+                second = self.client.get("/api/reports/", {"issue_type": "waste"})
+                allow.assert_called_once()
+                self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "BYPASS"))
+                self.assertEqual(second.json(), first.json())
+                self.assertEqual(len(second.json()), 3)
+
+                self.client.get("/api/reports/", {"issue_type": "traffic"})
+                self.assertEqual(self.client.get("/api/reports/", {"issue_type": "traffic"})["X-Cache"], "HIT")
+
+
+class WasteHotspotTests(TestCase):
+    def hotspots(self, **params):
+        response = self.client.get("/api/waste/hotspots/", params)
+        self.assertEqual(response.status_code, 200)
+        return [(h["location"], h["count"], h["days"]) for h in response.data["hotspots"]]
+
+    def test_counters_follow_logs(self):
+        log = dict(avg_fill_level=80, critical_count=1, warning_count=2)
+        first = WasteLog.objects.create(**log, warning_locations=["Bin A", " bin  a", "Bin B"])
+        WasteLog.objects.create(**log, warning_locations=["Bin A"])
+        # Bypasses signals, like generate_synthetic_data
+        old = WasteLog.objects.bulk_create([WasteLog(**log, warning_locations=["Bin C"])])[0]
+        WasteLog.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=3))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.hotspots(), [("Bin A", 2, 1), ("Bin B", 1, 1)])
+        first.delete()
+        self.assertEqual(self.hotspots(), [("Bin A", 1, 1)])
+
+        WasteLog.objects.create(**log, warning_locations=["Bin B"])
+        counters = list(WasteHotspotDaily.objects.values_list("day", "key", "count").order_by("key"))
+        self.assertEqual(hotspots.rebuild(), (3, 3))
+        self.assertEqual(list(WasteHotspotDaily.objects.values_list("day", "key", "count").order_by("key"))[:2], counters)
+        self.assertEqual(WasteWarningLocation.objects.filter(key="bin c").count(), 1)
+        today = timezone.localdate()
+        self.assertEqual(
+            self.hotspots(**{"from": str(today - timedelta(days=7)), "to": str(today), "top": 1}), [("Bin A", 1, 1)]
+        )
+        self.assertEqual(self.client.get("/api/waste/hotspots/", {"top": 0}).status_code, 400)
+
+
+class TrafficSpoolTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(
+            TRAFFIC_WRITE_BEHIND=True, TRAFFIC_SPOOL_DIR=self.directory, ALERT_OUTBOX_ENABLED=True
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_check_traffic_spools_and_flushes_once(self):
+        # Flushed by hand instead of by the thread
+        traffic_spool = spool.TrafficSpool(self.directory)
+        payload = {**traffic_payload("Le Loi, District 1"), "alert_content": "Jam"}
+        n8n = mock.Mock(**{"json.return_value": payload})
+        with mock.patch.dict("os.environ", {"N8N_TRAFFIC_WEBHOOK": "http://n8n.test/webhook"}), \
+                mock.patch("api.views.requests.post", return_value=n8n), \
+                mock.patch.object(spool, "get_spool", return_value=traffic_spool):
+            before = timezone.now()
+            with self.assertNumQueries(0):
+                response = self.client.post(
+                    "/api/check-traffic/", {"location": "Le Loi, District 1"}, content_type="application/json"
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(TrafficLog.objects.exists())
+
+        self.assertEqual(traffic_spool.flush(), 1)
+        log = TrafficLog.objects.get()
+        self.assertLess(log.created_at, before + timedelta(seconds=1))
+        self.assertGreaterEqual(log.created_at, before)
+        self.assertEqual(Alert.objects.get().source_id, log.id)
+        self.assertFalse(SpoolBatch.objects.exists())
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(traffic_spool.flush(), 0)
+
+    def test_recover_files_of_dead_workers(self):
+        fields = {"address": "Hai Ba Trung", "congestion_rate": 0.5, "flow_speed": 20, "delay_time": 3}
+        line = lambda at: (json.dumps({**fields, "created_at": at.isoformat()}) + "\n").encode()
+        hour_ago = timezone.now() - timedelta(hours=1)
+        # A worker that died mid-write, and one that died after committing
+        with open(os.path.join(self.directory, "traffic-999999.spool"), "wb") as f:
+            f.write(line(hour_ago) + line(hour_ago) + b'{"address": "torn')
+        with open(os.path.join(self.directory, "traffic-999998-1.batch"), "wb") as f:
+            f.write(line(hour_ago))
+        SpoolBatch.objects.create(name="traffic-999998-1.batch", rows=1)
+
+        self.assertEqual(spool.recover(self.directory), (2, 2))
+        self.assertEqual(list(TrafficLog.objects.values_list("created_at", flat=True)), [hour_ago, hour_ago])
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertFalse(SpoolBatch.objects.exists())
+
+    @override_settings(CHANGE_FEED_SETTLE_SECONDS=0)
+    def test_recovered_rows_reach_feed_clients_past_their_time(self):
+        fields = {"address": "Hai Ba Trung", "congestion_rate": 0.5, "flow_speed": 20, "delay_time": 3}
+        TrafficLog.objects.create(**fields)
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        feed = self.client.get("/api/changes/", {"models": "traffic-logs"}).data
+        self.assertEqual(len(feed["changes"]), 1)
+
+        hour_ago = timezone.now() - timedelta(hours=1)
+        with open(os.path.join(self.directory, "traffic-999999.spool"), "wb") as f:
+            f.write((json.dumps({**fields, "created_at": hour_ago.isoformat()}) + "\n").encode())
+        self.assertEqual(spool.recover(self.directory), (1, 1))
+
+        changes = self.client.get("/api/changes/", {"since": feed["next"]}).data["changes"]
+        recovered = TrafficLog.objects.get(created_at=hour_ago)
+        self.assertEqual([(c["op"], c["id"]) for c in changes], [("upsert", recovered.id)])
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def test_failure_lists_offending_sql(self):
+        with self.assertRaises(QueryBudgetExceeded) as ctx:
+            with self.assertQueryBudget(max_queries=1, max_rows=100):
+                for _ in range(3):
+                    list(connection.cursor().execute("SELECT 1"))
+        message = str(ctx.exception)
+        self.assertIn("3 queries (budget 1)", message)
+        self.assertEqual(message.count("SELECT 1"), 3)
+
+
+def _shared_cache(path):
+    return SharedMemoryCache(path, {"OPTIONS": {"SLOTS": 64, "SLOT_SIZE": 1024}})
+
+
+def _increment_many(path):
+    cache = _shared_cache(path)
+    for _ in range(200):
+        cache.incr("counter")
+
+
+class SharedMemoryCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "test.cache")
+        self.cache = _shared_cache(self.path)
+
+    def test_get_set_versions_and_expiry(self):
+        self.cache.set("key", {"a": 1})
+        self.cache.set("key", "v2", version=2)
+        self.cache.set("short", 1, timeout=0.01)
+        self.assertEqual(self.cache.get("key"), {"a": 1})
+        self.assertEqual(self.cache.get("key", version=2), "v2")
+        self.assertFalse(self.cache.add("key", "other"))
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get("short"))
+        self.assertTrue(self.cache.delete("key"))
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_oversized_values_are_not_cached(self):
+        self.cache.set("big", "small")
+        self.cache.set("big", "x" * 2048)
+        self.assertIsNone(self.cache.get("big"))
+
+    def test_full_window_evicts_least_recently_used(self):
+        for i in range(500):
+            self.cache.set(f"key-{i}", i)
+        self.assertEqual(sum(self.cache.get(f"key-{i}") is not None for i in range(500)), self.cache.slots)
+        self.assertEqual(self.cache.get("key-499"), 499)
+
+    def test_visible_and_atomic_across_processes(self):
+        self.cache.set("counter", 0)
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=_increment_many, args=(self.path,)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get("counter"), 800)
+
+
+@mock.patch.object(db_routers, "replica_aliases", return_value=["replica_0"])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_routers.PrimaryReplicaRouter()
+        db_routers._lag_checks.clear()
+
+    def route(self, pinned=False, allowed=True):
+        state = db_routers.RoutingState(pinned=pinned)
+        token = db_routers._state.set(state)
+        try:
+            if allowed:
+                db_routers.allow_replica_reads()
+            return self.router.db_for_read(None)
+        finally:
+            db_routers._state.reset(token)
+
+    def test_only_opted_in_unpinned_reads_use_the_replica(self, _):
+        with mock.patch.object(db_routers, "_replica_lag", return_value=0.0):
+            self.assertEqual(self.route(), "replica_0")
+            self.assertEqual(self.route(allowed=False), "default")
+            self.assertEqual(self.route(pinned=True), "default")
+        self.assertEqual(self.router.db_for_read(None), "default")
+        self.assertEqual(self.router.db_for_write(None), "default")
+
+    def test_lagging_or_failing_replica_falls_back_to_primary(self, _):
+        with mock.patch.object(db_routers, "_replica_lag", return_value=60.0):
+            self.assertEqual(self.route(), "default")
+        db_routers._lag_checks.clear()
+        with mock.patch.object(db_routers, "_replica_lag", side_effect=DatabaseError("down")) as lag:
+            self.assertEqual(self.route(), "default")
+            self.assertEqual(self.route(), "default")
+        self.assertEqual(lag.call_count, 1)  # The result is cached
+
+    def test_open_transaction_reads_from_primary(self, _):
+        with mock.patch.object(db_routers, "_replica_lag", return_value=0.0), \
+                mock.patch.object(connections["default"], "in_atomic_block", True):
+            self.assertEqual(self.route(), "default")
+
+
+class CachedPayloadRoutingTests(TestCase):
+    def test_cached_payloads_are_rebuilt_from_the_primary(self):
+        cache.clear()
+        with mock.patch.object(db_routers, "allow_replica_reads") as allow:
+            for path in ("/api/dashboard/", "/api/reports/facets/", "/api/reports/"):
+                self.assertEqual(self.client.get(path).status_code, 200)
+            allow.assert_not_called()
+            self.client.get("/api/traffic-logs/")
+            allow.assert_called_once()
+
+
+class SharedCacheDeployCheckTests(SimpleTestCase):
+    def test_locmem_with_several_workers_warns(self):
+        locmem = {"default": {"BACKEND": checks.LOCMEM_BACKEND}}
+        with override_settings(CACHES=locmem, GUNICORN_WORKERS=3):
+            self.assertEqual([w.id for w in checks.check_shared_cache(None)], ["api.W001"])
+        with override_settings(CACHES=locmem, GUNICORN_WORKERS=1):
+            self.assertEqual(checks.check_shared_cache(None), [])
+        shared = {"default": {"BACKEND": "api.cache_backends.SharedMemoryCache"}}
+        with override_settings(CACHES=shared, GUNICORN_WORKERS=3):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class ConnectionSettingsTests(SimpleTestCase):
+    SETTINGS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "core", "settings.py")
+
+    def configured_databases(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            for name in list(os.environ):
+                if name.startswith("DB_") and name not in environ:
+                    del os.environ[name]
+            return runpy.run_path(self.SETTINGS)["DATABASES"]
+
+    def test_persistent_connections_by_default(self):
+        databases = self.configured_databases(DATABASE_URL="postgres://app@db/smartcity")
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 60)
+        self.assertIs(databases["default"]["CONN_HEALTH_CHECKS"], True)
+        self.assertNotIn("pool", databases["default"].get("OPTIONS", {}))
+
+    def test_conn_max_age_none_and_health_checks(self):
+        databases = self.configured_databases(
+            DATABASE_URL="postgres://app@db/smartcity",
+            DATABASE_REPLICA_URLS="postgres://app@replica/smartcity",
+            DB_CONN_MAX_AGE="None",
+            DB_CONN_HEALTH_CHECKS="false",
+        )
+        for alias in ("default", "replica_0"):
+            self.assertIsNone(databases[alias]["CONN_MAX_AGE"])
+            self.assertIs(databases[alias]["CONN_HEALTH_CHECKS"], False)
+
+    def test_pool_replaces_persistent_connections(self):
+        databases = self.configured_databases(
+            DATABASE_URL="postgres://app@db/smartcity",
+            DATABASE_REPLICA_URLS="postgres://app@replica/smartcity",
+            DB_POOL="true",
+            DB_CONN_MAX_AGE="600",
+            DB_POOL_MAX_SIZE="4",
+        )
+        for alias in ("default", "replica_0"):
+            self.assertEqual(databases[alias]["CONN_MAX_AGE"], 0)
+            pool = databases[alias]["OPTIONS"]["pool"]
+            self.assertEqual((pool["min_size"], pool["max_size"]), (2, 4))
+        self.assertEqual(databases["replica_0"]["HOST"], "replica")
+
+    def test_pool_is_ignored_on_sqlite(self):
+        databases = self.configured_databases(DATABASE_URL="sqlite:///:memory:", DB_POOL="true")
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 60)
+        self.assertNotIn("OPTIONS", databases["default"])
+
+
+@skipIf(renderers.orjson is None, "orjson is not installed")
+class OrjsonCodecTests(TestCase):
+    def assertSameJson(self, data):
+        stock = JSONRenderer().render(data)
+        self.assertEqual(renderers.OrjsonRenderer().render(data), stock)
+        self.assertEqual(
+            renderers.OrjsonParser().parse(io.BytesIO(stock)),
+            JSONParser().parse(io.BytesIO(stock)),
+        )
+
+    def test_same_output_as_the_stock_renderer(self):
+        data = {
+            "utc": datetime(2024, 5, 1, 8, 30, 0, 123456, tzinfo=dt_timezone.utc),
+            "offset": datetime(2024, 5, 1, 8, 30, tzinfo=dt_timezone(timedelta(hours=2))),
+            "naive": datetime(2024, 5, 1, 8, 30),
+            "day": date(2024, 5, 1),
+            "duration": timedelta(minutes=90),
+            "amount": Decimal("12.50"),
+            "amounts": [Decimal("0.1"), Decimal("-3")],
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "label": gettext_lazy("Pending"),
+            1: "integer key",
+            "text": "caf\u00e9 \u2028 </script>",
+        }
+        np = anomaly.np
+        if np is not None:
+            data.update(score=np.float64(1.5), counts=np.arange(3))
+        self.assertSameJson(data)
+
+    def test_same_output_for_serialized_reports(self):
+        CitizenReport.objects.create(
+            reporter_name="Codec",
+            issue_type="traffic",
+            description="Broken signal",
+            location="District 3",
+            status="pending",
+        )
+        response = self.client.get("/api/reports/", {"page_size": 10})
+        self.assertSameJson(response.data)
+
+    def test_invalid_json_is_a_parse_error(self):
+        with self.assertRaises(ParseError):
+            renderers.OrjsonParser().parse(io.BytesIO(b'{"status": '))
+
+    def test_json_backend_selects_the_codec(self):
+        for backend, renderer, parser in (
+            ("orjson", "api.renderers.OrjsonRenderer", "api.renderers.OrjsonParser"),
+            ("stdlib", "rest_framework.renderers.JSONRenderer", "rest_framework.parsers.JSONParser"),
+        ):
+            with mock.patch.dict(os.environ, {"JSON_BACKEND": backend}):
+                rest_framework = runpy.run_path(ConnectionSettingsTests.SETTINGS)["REST_FRAMEWORK"]
+            self.assertEqual(rest_framework["DEFAULT_RENDERER_CLASSES"][0], renderer)
+            self.assertEqual(rest_framework["DEFAULT_PARSER_CLASSES"][0], parser)
+
+
+class MetricsMergeTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        patcher = mock.patch.object(metrics, "registry", metrics._Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_worker(self, pid, duration, opened, in_use):
+        worker = metrics._Registry()
+        worker.observe("http_request_duration_seconds", ("DashboardView", "GET", "2xx"), duration)
+        worker.values[("db_connections_opened_total", ("default",))] = opened
+        worker.values[("db_pool_in_use", ("default",))] = in_use
+        with open(os.path.join(self.dir, f"metrics-{pid}.json"), "w") as f:
+            json.dump(worker.snapshot(), f)
+
+    def exited_pid(self):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        return process.pid
+
+    def render(self):
+        with override_settings(METRICS_DIR=self.dir):
+            return metrics.render().splitlines()
+
+    def test_worker_snapshots_are_merged(self):
+        self.write_worker(os.getppid(), 0.02, opened=2, in_use=1)
+        self.write_worker(self.exited_pid(), 0.3, opened=3, in_use=4)
+        with open(os.path.join(self.dir, "metrics-999999999.json"), "w") as f:
+            f.write('{"histograms": [')  # torn write
+
+        lines = self.render()
+        series = 'view="DashboardView",method="GET",status="2xx"'
+        self.assertIn(f'smartcity_http_request_duration_seconds_count{{{series}}} 2', lines)
+        self.assertIn(f'smartcity_http_request_duration_seconds_bucket{{{series},le="0.025"}} 1', lines)
+        self.assertIn(f'smartcity_http_request_duration_seconds_bucket{{{series},le="0.5"}} 2', lines)
+        self.assertIn('smartcity_db_connections_opened_total{alias="default"} 5', lines)
+        # The exited worker's connections are gone with it
+        self.assertIn('smartcity_db_pool_in_use{alias="default"} 1', lines)
+
+    def test_scrape_does_not_hold_back_the_flush(self):
+        metrics.registry.observe("http_response_size_bytes", ("DashboardView",), 512)
+        self.render()
+        with override_settings(METRICS_DIR=self.dir):
+            metrics.flush_if_dirty()
+            with open(metrics._snapshot_path()) as f:
+                flushed = json.load(f)
+        self.assertEqual(flushed["histograms"], [["http_response_size_bytes", ["DashboardView"], mock.ANY]])
+        self.assertEqual(flushed["histograms"][0][2][-1], 1)
+        self.assertFalse(metrics.registry.dirty)
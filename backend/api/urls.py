@@ -9,8 +9,17 @@ from .views import (
     SaveStatsWebhookView,
     DashboardView,
     CitizenReportViewSet,
+    TrafficLogViewSet,
+    EnergyLogViewSet,
     SubscribeView,
     SubscriberListView,
+    SubscriberExportView,
+    SubscriberImportView,
+    WasteRouteView,
+    WasteHotspotsView,
+    TrafficForecastView,
+    BulkExportView,
+    ChangeFeedView,
 )
 
 app_name = "api"
@@ -18,18 +27,39 @@ app_name = "api"
 # Create a router for ViewSets
 router = DefaultRouter()
 router.register(r'reports', CitizenReportViewSet, basename='report')
+router.register(r'traffic-logs', TrafficLogViewSet, basename='traffic-log')
+router.register(r'energy-logs', EnergyLogViewSet, basename='energy-log')
 
 urlpatterns = [
     # Traffic analysis endpoint
     path("check-traffic/", CheckTrafficView.as_view(), name="check-traffic"),
+    path("traffic/forecast/", TrafficForecastView.as_view(), name="traffic-forecast"),
     # n8n webhook receiver
     path("webhook/save-stats/", SaveStatsWebhookView.as_view(), name="save-stats"),
     # Dashboard data
     path("dashboard/", DashboardView.as_view(), name="dashboard"),
+    # Collection route for the latest (or ?log=) waste log
+    path("waste/route/", WasteRouteView.as_view(), name="waste-route"),
+    # Locations most often on the waste warning lists over a date range
+    path("waste/hotspots/", WasteHotspotsView.as_view(), name="waste-hotspots"),
     # Newsletter subscription
     path("subscribe/", SubscribeView.as_view(), name="subscribe"),
     # Subscriber list for n8n email automation
     path("subscribers/", SubscriberListView.as_view(), name="subscribers"),
-    # Include router URLs for CitizenReport ViewSet
+    path(
+        "subscribers/export/",
+        SubscriberExportView.as_view(),
+        name="subscribers-export",
+    ),
+    path(
+        "subscribers/import/",
+        SubscriberImportView.as_view(),
+        name="subscribers-import",
+    ),
+    # Bulk CSV/NDJSON/Parquet extracts of logs and reports over a date range
+    path("export/<str:model>/", BulkExportView.as_view(), name="bulk-export"),
+    # Incremental changes (and deletions) since a cursor
+    path("changes/", ChangeFeedView.as_view(), name="changes"),
+    # Include router URLs for the CitizenReport, TrafficLog and EnergyLog ViewSets
     path("", include(router.urls)),
 ]
@@ -2,40 +2,254 @@
 API Views for Smart City Backend with n8n integration.
 """
 
+import contextvars
+import io
 import os
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import date, datetime, timedelta
+
 import requests
-from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import status, generics, viewsets, filters
+from rest_framework.decorators import action
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 
 from .models import TrafficLog, EnergyLog, WasteLog, CitizenReport, Subscriber
 from .serializers import (
+    model_columns,
     TrafficLogSerializer,
+    TrafficLogListSerializer,
     EnergyLogSerializer,
     WasteLogSerializer,
     CitizenReportSerializer,
+    CitizenReportListSerializer,
+    BulkStatusUpdateSerializer,
+    DuplicateGroupSerializer,
     CheckTrafficRequestSerializer,
     N8NWebhookDataSerializer,
     SubscriberSerializer,
 )
+from . import anomaly, changes, forecast, hotspots, spool, waste_routes
+from .admission import AdmissionRejected, TokenBucketThrottle, n8n_slot
+from .caching import (
+    DASHBOARD_CACHE_KEY,
+    REPORT_FACETS_CACHE_KEY,
+    REPORT_FACETS_TIMEOUT,
+    REPORT_LIST_TOO_LARGE,
+    count_report_list_lookup,
+    report_list_cache_key,
+)
+from .db_routers import ReplicaReadMixin, allow_replica_reads
+from .exports import (
+    EXPORT_CONTENT_TYPES,
+    EXPORTABLE_MODELS,
+    export_formats,
+    parse_bound,
+    stream_export,
+    stream_rows,
+)
+from .metrics import track_outbound
+from .renderers import json_parser_class
+from .similarity import fingerprint, find_duplicate_root
+from .subscriber_import import (
+    DEFAULT_BATCH_SIZE,
+    import_emails,
+    read_csv_emails,
+    summarize,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _parse_keyset_params(request, default_limit=None, max_limit=10000):
+    """
+    Parse ?after_id= and ?limit= for keyset pagination.
+    Raises ValueError on malformed values.
+    """
+    after_id = request.query_params.get("after_id")
+    limit = request.query_params.get("limit", default_limit)
+    after_id = int(after_id) if after_id not in (None, "") else None
+    limit = min(max(int(limit), 1), max_limit) if limit not in (None, "") else None
+    return after_id, limit
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Export views use ?format= to pick the file format, not a DRF renderer.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class SparseFieldsetViewMixin:
+    """
+    ViewSet mixin pairing sparse fieldsets with column pruning.
+
+    - list uses `list_serializer_class` unless the client asks for ?fields=
+    - list/retrieve load only the columns the serializer will render
+    """
+
+    list_serializer_class = None
+
+    def get_serializer_class(self):
+        if (
+            self.action == "list"
+            and self.list_serializer_class is not None
+            and "fields" not in self.request.query_params
+        ):
+            return self.list_serializer_class
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        columns = model_columns(serializer)
+        if columns:
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+def _request_n8n(url, location):
+    with n8n_slot(), track_outbound("n8n"):
+        response = requests.post(
+            url,
+            json={"location": location},
+            timeout=30,  # 30 second timeout
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+def _traffic_log_fields(n8n_data, location):
+    return {
+        "address": n8n_data.get("address", location),
+        "congestion_rate": n8n_data.get("congestionRate", 0.0),
+        "flow_speed": n8n_data.get("flowSpeed", 0),
+        "delay_time": n8n_data.get("delayTime", 0),
+        "has_incident": n8n_data.get("hasIncident", False),
+        "incident_count": n8n_data.get("incidentCount", 0),
+        "status_code": n8n_data.get("statusCode", "CLEAR"),
+        "status_color": n8n_data.get("statusColor", "#2ecc71"),
+        "analysis": n8n_data.get("analysis", ""),
+        "recommendation": n8n_data.get("recommendation", ""),
+        "alternative_routes": n8n_data.get("alternativeRoutes", []),
+        "alert_content": n8n_data.get("alert_content", ""),
+    }
+
+
+def _save_traffic_log(n8n_data, location):
+    try:
+        fields = _traffic_log_fields(n8n_data, location)
+        if spool.enabled():
+            # Inserted in a batch by the spool's flusher thread
+            spool.get_spool().append(fields)
+            return
+        traffic_log = TrafficLog.objects.create(**fields)
+        logger.info(f"Saved TrafficLog: {traffic_log.id}")
+    except Exception as save_error:
+        logger.error(f"Failed to save TrafficLog: {save_error}")
+        # Continue even if save fails
+
+
+_n8n_executor = {"pid": None, "executor": None}
+
+
+def _executor():
+    # Created per process: threads do not survive a fork
+    if _n8n_executor["pid"] != os.getpid():
+        _n8n_executor.update(
+            pid=os.getpid(),
+            executor=ThreadPoolExecutor(max_workers=4, thread_name_prefix="n8n"),
+        )
+    return _n8n_executor["executor"]
+
+
+class N8NCall:
+    """
+    An n8n traffic request running in a background thread, so the view can
+    stop waiting without losing the answer: when n8n replies after the view
+    gave up, the thread saves the TrafficLog itself.
+    """
+
+    def __init__(self, url, location):
+        self.location = location
+        self.lock = threading.Lock()
+        self.delivered = False
+        self.abandoned = False
+        context = contextvars.copy_context()
+        self.future = _executor().submit(context.run, self._run, url)
+
+    def _run(self, url):
+        n8n_data = _request_n8n(url, self.location)
+        with self.lock:
+            if not self.abandoned:
+                self.delivered = True
+                return n8n_data
+        logger.info(f"Late n8n response for {self.location}, saving it in the background")
+        try:
+            _save_traffic_log(n8n_data, self.location)
+        finally:
+            connections.close_all()
+        return n8n_data
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def abandon(self):
+        """
+        Stop waiting. Returns False if the result was already delivered.
+        """
+        with self.lock:
+            if self.delivered:
+                return False
+            self.abandoned = True
+            return True
+
+
 class CheckTrafficView(APIView):
     """
     POST /api/check-traffic/
 
     Receives location, calls n8n webhook for traffic analysis,
     returns response immediately, and saves to TrafficLog.
+
+    Rate limited per client (429) and capped in concurrent n8n calls
+    across all workers (503 when the wait queue is full); see admission.py.
+
+    Predicted answers (see forecast.py), marked "predicted": true:
+    - for an optional future "at" time, without calling n8n
+    - when n8n has not answered within CHECK_TRAFFIC_FORECAST_AFTER
+      seconds; n8n's late answer is still saved
+    - when n8n is busy, times out or fails, instead of the error
+    A location without enough history, or a worker whose model is still
+    being fitted in the background, gets the usual n8n behaviour.
+
+    With TRAFFIC_WRITE_BEHIND the TrafficLog is spooled and inserted in a
+    batch shortly after the response (see spool.py).
     """
 
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
 
     def post(self, request):
         # Validate incoming request
@@ -47,6 +261,16 @@ class CheckTrafficView(APIView):
             )
 
         location = serializer.validated_data["location"]
+        at = serializer.validated_data.get("at")
+        if at is not None and at > timezone.now() + timedelta(minutes=1):
+            predicted = self._predict(location, at)
+            if predicted is None:
+                return Response(
+                    {"error": "Not enough traffic history to forecast this location"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            return Response(predicted, status=status.HTTP_200_OK)
+
         n8n_webhook_url = os.environ.get("N8N_TRAFFIC_WEBHOOK")
 
         if not n8n_webhook_url:
@@ -59,37 +283,22 @@ class CheckTrafficView(APIView):
         try:
             # Call n8n webhook with timeout
             logger.info(f"Calling n8n webhook for location: {location}")
-            response = requests.post(
-                n8n_webhook_url,
-                json={"location": location},
-                timeout=30,  # 30 second timeout
-            )
-            response.raise_for_status()
+            call = N8NCall(n8n_webhook_url, location)
+            wait = settings.CHECK_TRAFFIC_FORECAST_AFTER or None
+            try:
+                n8n_data = call.result(timeout=wait)
+            except FutureTimeout:
+                predicted = self._predict(location)
+                if predicted is not None and call.abandon():
+                    logger.warning(f"n8n slow for {location}, answering with a forecast")
+                    return Response(predicted, status=status.HTTP_200_OK)
+                n8n_data = call.result()
 
             # Parse n8n response
-            n8n_data = response.json()
             logger.info(f"Received response from n8n: {n8n_data}")
 
             # Save traffic data to database
-            try:
-                traffic_log = TrafficLog.objects.create(
-                    address=n8n_data.get("address", location),
-                    congestion_rate=n8n_data.get("congestionRate", 0.0),
-                    flow_speed=n8n_data.get("flowSpeed", 0),
-                    delay_time=n8n_data.get("delayTime", 0),
-                    has_incident=n8n_data.get("hasIncident", False),
-                    incident_count=n8n_data.get("incidentCount", 0),
-                    status_code=n8n_data.get("statusCode", "CLEAR"),
-                    status_color=n8n_data.get("statusColor", "#2ecc71"),
-                    analysis=n8n_data.get("analysis", ""),
-                    recommendation=n8n_data.get("recommendation", ""),
-                    alternative_routes=n8n_data.get("alternativeRoutes", []),
-                    alert_content=n8n_data.get("alert_content", ""),
-                )
-                logger.info(f"Saved TrafficLog: {traffic_log.id}")
-            except Exception as save_error:
-                logger.error(f"Failed to save TrafficLog: {save_error}")
-                # Continue even if save fails
+            _save_traffic_log(n8n_data, location)
 
             # Return n8n response to frontend
             return Response(
@@ -97,17 +306,27 @@ class CheckTrafficView(APIView):
                 status=status.HTTP_200_OK,
             )
 
+        except AdmissionRejected as e:
+            logger.warning(f"check-traffic rejected, n8n is at capacity: {location}")
+            return self._predicted_or(
+                location,
+                {"error": "Traffic analysis service is busy, please retry shortly"},
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(e.retry_after)},
+            )
         except requests.exceptions.Timeout:
             logger.error(f"n8n webhook timeout for location: {location}")
-            return Response(
+            return self._predicted_or(
+                location,
                 {"error": "Traffic analysis service timeout"},
-                status=status.HTTP_504_GATEWAY_TIMEOUT,
+                status.HTTP_504_GATEWAY_TIMEOUT,
             )
         except requests.exceptions.RequestException as e:
             logger.error(f"n8n webhook request failed: {str(e)}")
-            return Response(
+            return self._predicted_or(
+                location,
                 {"error": "Failed to connect to traffic analysis service"},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                status.HTTP_503_SERVICE_UNAVAILABLE,
             )
         except Exception as e:
             logger.error(f"Unexpected error in check-traffic: {str(e)}")
@@ -116,6 +335,22 @@ class CheckTrafficView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @staticmethod
+    def _predict(location, at=None):
+        if forecast.np is None:
+            return None
+        try:
+            return forecast.predicted_traffic(location, at)
+        except Exception as e:
+            logger.error(f"Traffic forecast failed for {location}: {e}")
+            return None
+
+    def _predicted_or(self, location, error, error_status, headers=None):
+        predicted = self._predict(location)
+        if predicted is not None:
+            return Response(predicted, status=status.HTTP_200_OK)
+        return Response(error, status=error_status, headers=headers)
+
 
 class SaveStatsWebhookView(APIView):
     """
@@ -163,16 +398,25 @@ class SaveStatsWebhookView(APIView):
                     energy_data = validated_data["energyOptimizationData"]
                     summary = energy_data["summary"]
                     voltage = energy_data["statistics"]["voltage"]
+                    voltage_stats = {
+                        "min": voltage["min"],
+                        "max": voltage["max"],
+                        "average": voltage["average"],
+                    }
 
+                    # Score against the running baselines (a few rows, not the history)
+                    anomaly_fields = anomaly.observe(
+                        anomaly.snapshot_values(
+                            summary["total_consumption"], summary["average_power"], voltage_stats
+                        ),
+                        timezone.now(),
+                    )
                     energy_log = EnergyLog.objects.create(
                         total_consumption=summary["total_consumption"],
                         avg_power=summary["average_power"],
-                        voltage_stats={
-                            "min": voltage["min"],
-                            "max": voltage["max"],
-                            "average": voltage["average"],
-                        },
+                        voltage_stats=voltage_stats,
                         anomalies_detected=summary.get("anomalies", False),
+                        **anomaly_fields,
                     )
                     saved_records["energy_log_id"] = energy_log.id
                     logger.info(f"Created EnergyLog: {energy_log.id}")
@@ -218,44 +462,20 @@ class DashboardView(APIView):
     - 5 most recent CitizenReport records
 
     Handles empty tables gracefully by returning null/zero values.
+    The payload is cached for DASHBOARD_CACHE_SECONDS and dropped as soon as
+    a new log or report change is committed. It is rebuilt from the primary:
+    a lagging replica would put the dropped data straight back in the cache.
     """
 
     permission_classes = [AllowAny]
 
     def get(self, request):
         try:
-            # Fetch latest records from each table (returns None if table is empty)
-            latest_traffic = TrafficLog.objects.order_by("-created_at").first()
-            latest_energy = EnergyLog.objects.order_by("-created_at").first()
-            latest_waste = WasteLog.objects.order_by("-created_at").first()
-
-            # Count pending citizen reports
-            pending_reports_count = CitizenReport.objects.filter(
-                status="pending"
-            ).count()
-
-            # Get 5 most recent citizen reports
-            recent_reports = CitizenReport.objects.order_by("-created_at")[:5]
-
-            # Build response data with null-safe handling
-            dashboard_data = {
-                "traffic": (
-                    TrafficLogSerializer(latest_traffic).data
-                    if latest_traffic
-                    else None
-                ),
-                "energy": (
-                    EnergyLogSerializer(latest_energy).data if latest_energy else None
-                ),
-                "waste": (
-                    WasteLogSerializer(latest_waste).data if latest_waste else None
-                ),
-                "reports": {
-                    "pending_count": pending_reports_count,
-                    "recent": CitizenReportSerializer(recent_reports, many=True).data,
-                    "total_count": CitizenReport.objects.count(),
-                },
-            }
+            dashboard_data = cache.get(DASHBOARD_CACHE_KEY)
+            if dashboard_data is None:
+                dashboard_data = self._build_dashboard()
+                if settings.DASHBOARD_CACHE_SECONDS:
+                    cache.set(DASHBOARD_CACHE_KEY, dashboard_data, settings.DASHBOARD_CACHE_SECONDS)
 
             logger.info("Dashboard data fetched successfully")
             return Response(dashboard_data, status=status.HTTP_200_OK)
@@ -267,8 +487,242 @@ class DashboardView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @staticmethod
+    def _build_dashboard():
+        # Fetch latest records from each table (returns None if table is empty)
+        latest_traffic = TrafficLog.objects.order_by("-created_at").first()
+        latest_energy = EnergyLog.objects.order_by("-created_at").first()
+        latest_waste = WasteLog.objects.order_by("-created_at").first()
+
+        # Count pending citizen reports
+        pending_reports_count = CitizenReport.objects.filter(
+            status="pending"
+        ).count()
+
+        # Get 5 most recent citizen reports
+        recent_reports = CitizenReport.objects.order_by("-created_at")[:5]
+
+        # Build response data with null-safe handling
+        dashboard_data = {
+            "traffic": (
+                TrafficLogSerializer(latest_traffic).data
+                if latest_traffic
+                else None
+            ),
+            "energy": (
+                EnergyLogSerializer(latest_energy).data if latest_energy else None
+            ),
+            "waste": (
+                WasteLogSerializer(latest_waste).data if latest_waste else None
+            ),
+            "reports": {
+                "pending_count": pending_reports_count,
+                "recent": CitizenReportSerializer(recent_reports, many=True).data,
+                "total_count": CitizenReport.objects.count(),
+            },
+        }
+        return dashboard_data
+
+
+def _parse_depot(value):
+    latitude, longitude = (float(part) for part in value.split(","))
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(value)
+    return latitude, longitude
+
+
+class WasteRouteView(ReplicaReadMixin, APIView):
+    """
+    GET /api/waste/route/
+
+    Collection route for the bins listed in a WasteLog's warning_locations:
+    the latest log, or ?log=<id>. Locations are matched by name against
+    WasteBin; unknown names come back in `unresolved`.
+
+    The route is a round trip from WASTE_DEPOT, or from ?depot=lat,lon,
+    and an open path when neither is set. See waste_routes.py.
+    """
+
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        if waste_routes.np is None:
+            return Response(
+                {"error": "Route planning needs NumPy installed"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        try:
+            depot = request.query_params.get("depot")
+            depot = _parse_depot(depot) if depot else settings.WASTE_DEPOT
+            log_id = request.query_params.get("log")
+            log_id = int(log_id) if log_id else None
+        except ValueError:
+            return Response(
+                {"error": "Invalid log or depot"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        logs = WasteLog.objects.only("id", "warning_locations", "created_at")
+        waste_log = logs.filter(id=log_id).first() if log_id else logs.order_by("-created_at").first()
+        if waste_log is None:
+            return Response({"error": "Waste log not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        started = time.perf_counter()
+        route = waste_routes.plan_route(waste_log.warning_locations, depot)
+        logger.info(
+            f"Planned waste route for log {waste_log.id}: {len(route['stops'])} stops, "
+            f"{route['total_km']} km in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        return Response(
+            {
+                "waste_log_id": waste_log.id,
+                "created_at": waste_log.created_at,
+                "depot": {"latitude": depot[0], "longitude": depot[1]} if depot else None,
+                **route,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class WasteHotspotsView(ReplicaReadMixin, APIView):
+    """
+    GET /api/waste/hotspots/?from=YYYY-MM-DD&to=YYYY-MM-DD&top=10
+
+    The locations most often on WasteLog warning lists between two dates
+    (inclusive, UTC days; default the last 30 days), with the number of
+    logs and of days that listed each. Read from the daily counters kept
+    by hotspots.py. `top` defaults to 10, max 100.
+    """
+
+    permission_classes = [AllowAny]
+    DEFAULT_DAYS = 30
+    MAX_TOP = 100
+
+    def get(self, request):
+        try:
+            end = request.query_params.get("to")
+            end = date.fromisoformat(end) if end else timezone.localdate()
+            start = request.query_params.get("from")
+            start = date.fromisoformat(start) if start else end - timedelta(days=self.DEFAULT_DAYS - 1)
+            top = int(request.query_params.get("top", 10))
+            if start > end or not 1 <= top <= self.MAX_TOP:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": f"from/to must be dates (from <= to) and top 1-{self.MAX_TOP}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            {"from": start, "to": end, "hotspots": hotspots.top_hotspots(start, end, top)},
+            status=status.HTTP_200_OK,
+        )
+
+
+class TrafficForecastView(ReplicaReadMixin, APIView):
+    """
+    GET /api/traffic/forecast/?location=<address>
+
+    Hourly congestion forecast for a location from its TrafficLog history,
+    starting at ?at= (default now) for ?hours= hours (default 24, max 168).
+    See forecast.py.
+    """
+
+    permission_classes = [AllowAny]
+    MAX_HOURS = 168
+
+    def get(self, request):
+        if forecast.np is None:
+            return Response(
+                {"error": "Traffic forecasts need NumPy installed"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        location = request.query_params.get("location", "").strip()
+        try:
+            hours = int(request.query_params.get("hours", 24))
+            at = request.query_params.get("at")
+            start = datetime.fromisoformat(at) if at else timezone.now()
+            if not location or not 1 <= hours <= self.MAX_HOURS:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": f"location is required, hours must be 1-{self.MAX_HOURS} and at an ISO datetime"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+
+        if forecast.get_forecaster() is None:
+            # A background fit is running (see forecast.get_forecaster)
+            return Response(
+                {"error": "Traffic forecasts are being prepared, please retry shortly"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "30"},
+            )
+        result = forecast.hourly_forecast(location, start, hours)
+        if result is None:
+            return Response(
+                {"error": "Not enough traffic history to forecast this location"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class TrafficLogPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    ordering = "-created_at"
+
+
+class TrafficLogViewSet(ReplicaReadMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only ViewSet for TrafficLog history.
+
+    Endpoints:
+    - GET /api/traffic-logs/ - Cursor-paginated compact list (?page_size=, max 1000)
+    - GET /api/traffic-logs/{id}/ - Full record
+
+    Supports ?fields= / ?omit= and filtering by status_code, address and has_incident.
+    """
+
+    queryset = TrafficLog.objects.all()
+    serializer_class = TrafficLogSerializer
+    list_serializer_class = TrafficLogListSerializer
+    permission_classes = [AllowAny]
+    pagination_class = TrafficLogPagination
+
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["status_code", "address", "has_incident"]
+
 
-class CitizenReportViewSet(viewsets.ModelViewSet):
+class EnergyLogViewSet(ReplicaReadMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only ViewSet for EnergyLog history with anomaly scores.
+
+    Endpoints:
+    - GET /api/energy-logs/ - Cursor-paginated list (?page_size=, max 1000)
+    - GET /api/energy-logs/{id}/ - Single record
+
+    Supports ?fields= / ?omit= and filtering by is_anomaly (backend
+    detection, see anomaly.py), anomalies_detected (n8n) and
+    anomaly_score__gte.
+    """
+
+    queryset = EnergyLog.objects.all()
+    serializer_class = EnergyLogSerializer
+    permission_classes = [AllowAny]
+    pagination_class = TrafficLogPagination
+
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        "is_anomaly": ["exact"],
+        "anomalies_detected": ["exact"],
+        "anomaly_score": ["gte"],
+    }
+
+
+class CitizenReportViewSet(ReplicaReadMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for CitizenReport model.
     
@@ -283,14 +737,22 @@ class CitizenReportViewSet(viewsets.ModelViewSet):
     - Multipart/Form-data support for image uploads
     - Filtering by status and issue_type (?status=pending&issue_type=traffic)
     - Ordering by created_at (default: latest first)
+    - Compact list rows by default; ?fields= / ?omit= select exactly what is loaded
+    - Near-duplicate grouping (GET /api/reports/duplicates/)
+    - Cached facet counts (GET /api/reports/facets/)
+    - Cached list responses until the next report write (REPORT_LIST_CACHE_SECONDS)
+    - Bulk status updates in one query, staff only (POST /api/reports/bulk-status/)
+    - Retrieve/duplicates (and list, when not cached) read from a replica
+      when one is configured
     """
 
     queryset = CitizenReport.objects.all()
     serializer_class = CitizenReportSerializer
+    list_serializer_class = CitizenReportListSerializer
     permission_classes = [AllowAny]  # Use proper permissions in production
     
     # Support multiple parsers for file uploads
-    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    parser_classes = [MultiPartParser, FormParser, json_parser_class()]
     
     # Enable filtering and ordering
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -298,15 +760,193 @@ class CitizenReportViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']  # Default ordering: latest first
 
+    @property
+    def replica_actions(self):
+        # Facets and cached lists stay on the primary: they are cached until
+        # the next write, so a lagging replica would keep them stale
+        if settings.REPORT_LIST_CACHE_SECONDS:
+            return {"retrieve", "duplicates"}
+        return {"list", "retrieve", "duplicates"}
+
+    def list(self, request, *args, **kwargs):
+        """
+        Served from cache under the current report generation (see
+        caching.py), keyed by every query parameter, the scheme and host (image URLs
+        are absolute) and the response format. Lists longer than
+        REPORT_LIST_CACHE_MAX_ROWS are not cached; repeats of them read
+        from a replica when one is configured.
+        """
+        if not settings.REPORT_LIST_CACHE_SECONDS:
+            return super().list(request, *args, **kwargs)
+
+        key = report_list_cache_key(
+            sorted(request.query_params.lists()), request.build_absolute_uri("/"), request.accepted_renderer.format
+        )
+        data = cache.get(key)
+        if data == REPORT_LIST_TOO_LARGE:
+            count_report_list_lookup("bypass")
+            allow_replica_reads()
+            response = super().list(request, *args, **kwargs)
+            response["X-Cache"] = "BYPASS"
+            return response
+        count_report_list_lookup("hit" if data is not None else "miss")
+        if data is not None:
+            return Response(data, status=status.HTTP_200_OK, headers={"X-Cache": "HIT"})
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            rows = response.data["results"] if isinstance(response.data, dict) else response.data
+            too_large = len(rows) > settings.REPORT_LIST_CACHE_MAX_ROWS
+            cache.set(
+                key, REPORT_LIST_TOO_LARGE if too_large else response.data, settings.REPORT_LIST_CACHE_SECONDS
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
     def perform_create(self, serializer):
         """
         Called when creating a new report.
         This is standalone - does NOT interact with n8n.
+
+        The report is fingerprinted and linked to the near-duplicate group
+        it belongs to (if any) in the same INSERT.
         """
-        report = serializer.save()
+        data = serializer.validated_data
+        fields = fingerprint(data.get("description", ""), data.get("location", ""))
+        root_id = find_duplicate_root(data["issue_type"], fields, timezone.now())
+
+        report = serializer.save(duplicate_of_id=root_id, **fields)
         logger.info(
             f"Created CitizenReport #{report.id}: {report.issue_type} at {report.location} by {report.reporter_name}"
         )
+        if root_id:
+            logger.info(f"CitizenReport #{report.id} is a near-duplicate of #{root_id}")
+
+    @action(detail=False, methods=["get"])
+    def duplicates(self, request):
+        """
+        GET /api/reports/duplicates/?limit=50
+
+        Lists near-duplicate groups, most recently active first.
+        Each group is its first report plus the number of duplicates.
+        """
+        try:
+            limit = min(max(int(request.query_params.get("limit", 50)), 1), 500)
+        except ValueError:
+            return Response(
+                {"error": "Invalid limit"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        groups = list(
+            CitizenReport.objects.filter(duplicate_of__isnull=False)
+            .values("duplicate_of")
+            .annotate(duplicate_count=Count("id"), latest_at=Max("created_at"))
+            .order_by("-latest_at")[:limit]
+        )
+        roots = CitizenReport.objects.in_bulk([g["duplicate_of"] for g in groups])
+
+        data = [
+            {
+                "root": roots[group["duplicate_of"]],
+                "duplicate_count": group["duplicate_count"],
+                "latest_at": group["latest_at"],
+            }
+            for group in groups
+            if group["duplicate_of"] in roots
+        ]
+        serializer = DuplicateGroupSerializer(
+            data, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], url_path="bulk-status", permission_classes=[IsAdminUser])
+    def bulk_status(self, request):
+        """
+        POST /api/reports/bulk-status/
+
+        Moves many reports to a new status with a single UPDATE. Staff only:
+        report status is otherwise read-only through the API.
+
+        Payload:
+        { "status": "resolved", "ids": [1, 2, 3] }
+        or
+        { "status": "resolved", "filter": { "status": "in_progress", "issue_type": "waste" } }
+        """
+        serializer = BulkStatusUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"error": "Invalid request", "details": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        data = serializer.validated_data
+        if "ids" in data:
+            reports = CitizenReport.objects.filter(id__in=data["ids"])
+        else:
+            reports = CitizenReport.objects.filter(**data["filter"])
+
+        updated = reports.set_status(data["status"])
+        logger.info(f"Bulk status update: {updated} reports moved to {data['status']}")
+        return Response(
+            {"success": True, "status": data["status"], "updated": updated},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        """
+        GET /api/reports/facets/
+
+        Returns report counts per issue_type x status and per day for the
+        last 30 days. Computed with two grouped queries and cached until the
+        next report write.
+        """
+        facets = cache.get(REPORT_FACETS_CACHE_KEY)
+        if facets is None:
+            facets = self._compute_facets()
+            cache.set(REPORT_FACETS_CACHE_KEY, facets, REPORT_FACETS_TIMEOUT)
+        return Response(facets, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _compute_facets(days=30):
+        # Served from the (issue_type, status) index
+        pairs = list(
+            CitizenReport.objects.values("issue_type", "status")
+            .annotate(count=Count("*"))
+            .order_by("issue_type", "status")
+        )
+        by_issue_type = {key: 0 for key, _ in CitizenReport.ISSUE_TYPE_CHOICES}
+        by_status = {key: 0 for key, _ in CitizenReport.STATUS_CHOICES}
+        for row in pairs:
+            by_issue_type[row["issue_type"]] = by_issue_type.get(row["issue_type"], 0) + row["count"]
+            by_status[row["status"]] = by_status.get(row["status"], 0) + row["count"]
+
+        # Served from the created_at index
+        today = timezone.localdate()
+        start = today - timedelta(days=days - 1)
+        per_day = dict(
+            CitizenReport.objects.filter(
+                created_at__gte=timezone.make_aware(datetime.combine(start, datetime.min.time()))
+            )
+            .annotate(day=TruncDate("created_at"))
+            .values("day")
+            .annotate(count=Count("*"))
+            .order_by()
+            .values_list("day", "count")
+        )
+        daily = [
+            {"date": day.isoformat(), "count": per_day.get(day, 0)}
+            for day in (start + timedelta(days=i) for i in range(days))
+        ]
+
+        return {
+            "total": sum(row["count"] for row in pairs),
+            "by_issue_type": by_issue_type,
+            "by_status": by_status,
+            "by_issue_type_status": pairs,
+            "daily": daily,
+            "generated_at": timezone.now().isoformat(),
+        }
 
 
 class SubscribeView(generics.CreateAPIView):
@@ -323,10 +963,12 @@ class SubscribeView(generics.CreateAPIView):
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        # Check if email already exists before validation
-        email = request.data.get("email", "").lower().strip()
-        if email and Subscriber.objects.filter(email=email).exists():
+        # Single INSERT ... ON CONFLICT DO NOTHING, so duplicates cannot race
+        email = serializer.validated_data["email"]
+        subscriber, created = Subscriber.objects.subscribe(email)
+        if not created:
             logger.warning(f"Duplicate subscription attempt: {email}")
             return Response(
                 {
@@ -336,33 +978,75 @@ class SubscribeView(generics.CreateAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Validate and save
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-
-        logger.info(f"New subscriber: {serializer.data['email']}")
+        logger.info(f"New subscriber: {email}")
         return Response(
             {
                 "success": True,
                 "message": "Successfully subscribed to newsletter!",
-                "data": serializer.data,
+                "data": self.get_serializer(subscriber).data,
             },
             status=status.HTTP_201_CREATED,
         )
 
-    def perform_create(self, serializer):
-        """
-        Save the subscriber.
-        """
-        serializer.save()
 
+class SubscriberImportView(APIView):
+    """
+    POST /api/subscribers/import/?batch_size=5000
+
+    Bulk subscriber import. Accepts either a multipart CSV upload in the
+    `file` field (an "email" column, or emails in the first column) or a
+    JSON body { "emails": ["a@example.com", ...] }.
+
+    Emails are inserted in batches, skipping invalid and already subscribed
+    addresses. Returns totals and per-batch stats. Staff only: every
+    imported address receives the alert emails.
+    """
+
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser, FormParser, json_parser_class()]
+
+    def post(self, request):
+        try:
+            batch_size = int(request.query_params.get("batch_size", DEFAULT_BATCH_SIZE))
+        except ValueError:
+            return Response(
+                {"error": "Invalid batch_size"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        upload = request.FILES.get("file")
+        if upload is not None:
+            emails = read_csv_emails(
+                io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            )
+        elif isinstance(request.data.get("emails"), list):
+            emails = request.data["emails"]
+        else:
+            return Response(
+                {"error": "Provide a CSV file or an 'emails' list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-class SubscriberListView(generics.ListAPIView):
+        batches = list(import_emails(emails, batch_size))
+        totals = summarize(batches)
+        logger.info(
+            f"Imported {totals['inserted']} of {totals['received']} subscriber emails"
+        )
+        return Response(
+            {"success": True, "totals": totals, "batches": batches},
+            status=status.HTTP_200_OK,
+        )
+
+
+class SubscriberListView(ReplicaReadMixin, generics.ListAPIView):
     """
     GET /api/subscribers/
 
     Returns list of all subscribers for n8n to send automated emails.
     In production, protect this endpoint with authentication.
+
+    Supports keyset pagination so n8n can walk the list in chunks:
+    GET /api/subscribers/?after_id=0&limit=1000 returns subscribers ordered
+    by id, plus `next_after_id` for the following request (null at the end).
     """
 
     queryset = Subscriber.objects.all()
@@ -370,16 +1054,182 @@ class SubscriberListView(generics.ListAPIView):
     permission_classes = [AllowAny]  # TODO: Add authentication in production
 
     def get(self, request, *args, **kwargs):
+        try:
+            after_id, limit = _parse_keyset_params(request)
+        except ValueError:
+            return Response(
+                {"error": "Invalid after_id or limit"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         subscribers = self.get_queryset()
-        serializer = self.get_serializer(subscribers, many=True)
+        keyset = after_id is not None or limit is not None
+        if keyset:
+            subscribers = subscribers.order_by("id")
+            if after_id is not None:
+                subscribers = subscribers.filter(id__gt=after_id)
+            if limit is not None:
+                subscribers = subscribers[:limit]
 
-        logger.info(f"n8n retrieved {subscribers.count()} subscribers for email sending")
+        data = self.get_serializer(subscribers, many=True).data
+        logger.info(f"n8n retrieved {len(data)} subscribers for email sending")
+
+        response_data = {
+            "success": True,
+            "count": len(data),
+            "subscribers": data,
+        }
+        if keyset:
+            full_page = limit is not None and len(data) == limit
+            response_data["next_after_id"] = data[-1]["id"] if full_page else None
+
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class SubscriberExportView(ReplicaReadMixin, APIView):
+    """
+    GET /api/subscribers/export/?format=ndjson|csv&after_id=&limit=
+
+    Streams subscribers ordered by id straight from a server-side cursor,
+    so memory stays constant regardless of list size. Combine with
+    ?after_id= (the last id received) and ?limit= to walk the list in chunks.
+    Staff only.
+    """
+
+    permission_classes = [IsAdminUser]
+    content_negotiation_class = ExportContentNegotiation
+
+    columns = ("id", "email", "created_at")
+    chunk_size = 2000
+
+    def get(self, request):
+        export_format = request.query_params.get("format", "ndjson")
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {"error": f"Unsupported format, use one of: {', '.join(EXPORT_CONTENT_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            after_id, limit = _parse_keyset_params(request, max_limit=1_000_000)
+        except ValueError:
+            return Response(
+                {"error": "Invalid after_id or limit"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
+        subscribers = Subscriber.objects.order_by("id")
+        if after_id is not None:
+            subscribers = subscribers.filter(id__gt=after_id)
+        if limit is not None:
+            subscribers = subscribers[:limit]
+        rows = subscribers.values_list(*self.columns).iterator(chunk_size=self.chunk_size)
+
+        response = StreamingHttpResponse(
+            stream_rows(self.columns, rows, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        if export_format == "csv":
+            response["Content-Disposition"] = 'attachment; filename="subscribers.csv"'
+        logger.info(f"Streaming subscriber export ({export_format}, after_id={after_id})")
+        return response
+
+
+class BulkExportView(ReplicaReadMixin, APIView):
+    """
+    GET /api/export/<model>/?from=&to=&format=csv|ndjson|parquet&gzip=1
+
+    Streams every traffic-logs, energy-logs, waste-logs or reports row
+    created in [from, to) (ISO dates or datetimes, both optional), oldest
+    first. Rows are read in short keyset windows, so memory stays flat and
+    no long-running query holds the tables; see exports.py. Parquet needs
+    pyarrow. Staff only: reports include reporter names.
+    """
+
+    permission_classes = [IsAdminUser]
+    content_negotiation_class = ExportContentNegotiation
+
+    def get(self, request, model):
+        model_class = EXPORTABLE_MODELS.get(model)
+        if model_class is None:
+            return Response(
+                {"error": f"Unknown export, use one of: {', '.join(EXPORTABLE_MODELS)}"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        export_format = request.query_params.get("format", "csv")
+        if export_format not in export_formats():
+            return Response(
+                {"error": f"Unsupported format, use one of: {', '.join(export_formats())}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            start, end = (
+                parse_bound(request.query_params[name]) if request.query_params.get(name) else None
+                for name in ("from", "to")
+            )
+        except ValueError:
+            return Response(
+                {"error": "Invalid from or to, use an ISO date or datetime"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        compress = request.query_params.get("gzip", "").lower() in ("1", "true", "yes")
+
+        chunks, content_type, filename = stream_export(model_class, export_format, start, end, compress)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        logger.info(f"Streaming {model} export ({export_format}, from={start}, to={end}, gzip={compress})")
+        return response
+
+
+class ChangeFeedView(APIView):
+    """
+    GET /api/changes/?since=<cursor>&models=reports,subscribers&limit=
+
+    Rows created or updated after the cursor, then deletions, with the
+    cursor to send next time. Without ?since= the feed starts from the
+    beginning of every table; ?since=now starts from the current end.
+    ?models= (default all) can only be chosen when starting, a cursor keeps
+    the models it started with. When has_more is true, poll again right
+    away. Staff only, like the exports. See changes.py.
+    """
+
+    permission_classes = [IsAdminUser]
+    DEFAULT_LIMIT = 500
+    MAX_LIMIT = 5000
+
+    def get(self, request):
+        since = request.query_params.get("since", "")
+        requested = [m.strip() for m in request.query_params.get("models", "").split(",") if m.strip()]
+        try:
+            limit = min(max(int(request.query_params.get("limit", self.DEFAULT_LIMIT)), 1), self.MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "Invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+        unknown = set(requested) - set(changes.FEEDS)
+        if unknown:
+            return Response(
+                {"error": f"Unknown models {', '.join(sorted(unknown))}, use: {', '.join(changes.FEEDS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if since and since != "now":
+            try:
+                models, positions = changes.decode_cursor(since)
+            except changes.InvalidCursor as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if requested and set(requested) != set(models):
+                return Response(
+                    {"error": "A cursor keeps the models it started with; start a new feed to change them"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            models = requested or list(changes.FEEDS)
+            positions = changes.start_positions(models) if since == "now" else {}
+
+        results, positions, has_more = changes.read_changes(models, positions, limit)
         return Response(
             {
-                "success": True,
-                "count": subscribers.count(),
-                "subscribers": serializer.data,
+                "changes": results,
+                "next": changes.encode_cursor(models, positions),
+                "has_more": has_more,
             },
             status=status.HTTP_200_OK,
         )
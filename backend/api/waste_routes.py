@@ -0,0 +1,233 @@
+"""
+Waste collection route planning.
+
+WasteLog.warning_locations lists the bins that need service by name. Names
+are resolved against WasteBin (coordinates maintained in the admin), and
+the stops are ordered with a nearest-neighbour tour improved by 2-opt, both
+vectorized with NumPy.
+
+Each worker keeps an index of bin ids by name, rebuilt when a bin is
+added, renamed or removed; it grows linearly with the number of bins.
+Planning a route loads only the requested bins and computes the
+great-circle distances between them (k x k for k stops), then runs the
+heuristic: a few hundred stops take tens of milliseconds (see
+benchmarks/waste_route.py).
+
+With WASTE_DEPOT set the route is a round trip from the depot; otherwise
+it is an open path that starts and ends wherever is shortest.
+"""
+
+import threading
+
+from django.db.models import Count, Max
+
+from .models import WasteBin
+
+try:
+    import numpy as np
+except ImportError:  # Optional: route planning is unavailable without it
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+# Moves smaller than this (km) are float noise, not improvements
+MIN_GAIN = 1e-9
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km; arguments are degrees and broadcast.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(latitudes, longitudes):
+    """
+    Pairwise distances in km between the given points.
+    """
+    lat = np.asarray(latitudes, dtype=float)
+    lon = np.asarray(longitudes, dtype=float)
+    return haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def nearest_neighbour_tour(distances, start=0):
+    n = len(distances)
+    tour = np.empty(n, dtype=int)
+    visited = np.zeros(n, dtype=bool)
+    current = start
+    for position in range(n):
+        tour[position] = current
+        visited[current] = True
+        if position + 1 < n:
+            row = np.where(visited, np.inf, distances[current])
+            current = int(np.argmin(row))
+    return tour
+
+
+def two_opt(distances, tour):
+    """
+    Improve a closed tour (tour[0] stays first) with 2-opt moves until no
+    move shortens it. Every pass scores all moves at once, then applies the
+    best move of each row as long as it does not overlap a move already
+    taken in that pass, so long tours converge in few passes.
+    """
+    tour = tour.copy()
+    n = len(tour)
+    if n < 4:
+        return tour
+    i_index, j_index = np.triu_indices(n, k=2)
+    # Reversing tour[1:] entirely is a no-op for a closed tour
+    keep = ~((i_index == 0) & (j_index == n - 1))
+    i_index, j_index = i_index[keep], j_index[keep]
+
+    while True:
+        a = tour
+        b = np.roll(tour, -1)
+        edge = distances[a, b]
+        # Replace edges (a_i, b_i) and (a_j, b_j) with (a_i, a_j) and (b_i, b_j)
+        delta = (
+            distances[a[i_index], a[j_index]]
+            + distances[b[i_index], b[j_index]]
+            - edge[i_index]
+            - edge[j_index]
+        )
+        improving = np.nonzero(delta < -MIN_GAIN)[0]
+        if not len(improving):
+            return tour
+
+        taken = np.zeros(n + 1, dtype=bool)
+        for move in improving[np.argsort(delta[improving])]:
+            i, j = i_index[move], j_index[move]
+            # The move touches positions i..j+1; skip it if an applied move did
+            if taken[i : j + 2].any():
+                continue
+            tour[i + 1 : j + 1] = tour[i + 1 : j + 1][::-1].copy()
+            taken[i : j + 2] = True
+
+
+def solve(distances, round_trip):
+    """
+    Return a visiting order (indexes into `distances`). For a round trip
+    index 0 is the depot and stays first. Otherwise a zero-cost dummy node
+    closes the tour, which turns the best tour into the best open path.
+    """
+    n = len(distances)
+    if n <= 2:
+        return np.arange(n)
+    if round_trip:
+        return two_opt(distances, nearest_neighbour_tour(distances))
+
+    padded = np.zeros((n + 1, n + 1))
+    padded[1:, 1:] = distances
+    # Start nearest-neighbour from the stop with the longest nearest edge,
+    # a cheap guess at an endpoint of the best path
+    nearest = np.where(np.eye(n, dtype=bool), np.inf, distances).min(axis=1)
+    start = int(np.argmax(nearest)) + 1
+    tour = nearest_neighbour_tour(padded, start)
+    tour = np.roll(tour, -int(np.nonzero(tour == 0)[0][0]))
+    return two_opt(padded, tour)[1:] - 1
+
+
+def route_length(distances, order, round_trip):
+    legs = distances[order[:-1], order[1:]]
+    total = float(legs.sum())
+    if round_trip and len(order) > 1:
+        total += float(distances[order[-1], order[0]])
+    return total
+
+
+class BinIndex:
+    """
+    WasteBin ids by case-folded name, as of one point in time.
+    """
+
+    def __init__(self, rows):
+        self.ids = {name.casefold(): pk for pk, name in rows}
+
+    def resolve(self, names):
+        """
+        Return (ids of the distinct known names, unknown names).
+        """
+        found, unknown, seen = [], [], set()
+        for name in names:
+            key = name.strip().casefold()
+            if key in seen:
+                continue
+            seen.add(key)
+            if key in self.ids:
+                found.append(self.ids[key])
+            else:
+                unknown.append(name)
+        return found, unknown
+
+
+_index_lock = threading.Lock()
+_index = (None, None)  # (version, BinIndex)
+
+
+def bin_index():
+    """
+    The BinIndex for the current bins, rebuilt only when a bin was added,
+    changed or removed. Each worker keeps its own copy; checking for
+    changes is one aggregate query.
+    """
+    global _index
+    summary = WasteBin.objects.aggregate(count=Count("id"), changed=Max("updated_at"))
+    version = (summary["count"], summary["changed"])
+    with _index_lock:
+        if _index[0] != version:
+            _index = (version, BinIndex(WasteBin.objects.values_list("id", "name")))
+        return _index[1]
+
+
+def plan_route(names, depot=None):
+    """
+    Order the bins called `names` into a collection route. `depot` is an
+    optional (latitude, longitude). Returns the ordered stops with the
+    distance from the previous stop, the total distance and the names that
+    matched no bin.
+    """
+    found, unresolved = bin_index().resolve(names)
+    by_id = WasteBin.objects.in_bulk(found)
+    # A bin deleted since the index was read is skipped
+    bins = [by_id[pk] for pk in found if pk in by_id]
+    distances = haversine_matrix([b.latitude for b in bins], [b.longitude for b in bins])
+
+    round_trip = depot is not None
+    if round_trip:
+        # Node 0 is the depot; only its distances are computed here
+        depot_row = haversine(
+            depot[0], depot[1], [depot[0]] + [b.latitude for b in bins], [depot[1]] + [b.longitude for b in bins]
+        )
+        padded = np.empty((len(bins) + 1, len(bins) + 1))
+        padded[1:, 1:] = distances
+        padded[0, :] = depot_row
+        padded[:, 0] = depot_row
+        distances = padded
+        nodes = [None] + bins
+    else:
+        nodes = bins
+
+    order = solve(distances, round_trip).tolist()
+    stops = []
+    for previous, node in zip([None] + order, order):
+        if nodes[node] is None:
+            continue
+        b = nodes[node]
+        stops.append(
+            {
+                "name": b.name,
+                "address": b.address,
+                "latitude": b.latitude,
+                "longitude": b.longitude,
+                "leg_km": round(float(distances[previous, node]), 3) if previous is not None else 0.0,
+            }
+        )
+
+    return {
+        "stops": stops,
+        "total_km": round(route_length(distances, np.array(order, dtype=int), round_trip), 3) if order else 0.0,
+        "return_leg_km": round(float(distances[order[-1], 0]), 3) if round_trip and stops else None,
+        "unresolved": unresolved,
+    }
@@ -0,0 +1,6 @@
+"""
+Load-test and benchmark harness for the Smart City backend.
+
+Run from the backend directory:
+    python -m benchmarks.run --server wsgi --concurrency 1,8,32
+"""
@@ -0,0 +1,57 @@
+"""
+Compare two benchmark reports written by benchmarks.run.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import argparse
+import json
+
+
+def _delta(old, new):
+    if not old or new is None:
+        return "     n/a"
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['meta'].get('commit')}")
+    print(f"candidate {candidate['meta'].get('commit')}\n")
+
+    print("Query counts")
+    for name, counts in candidate["query_counts"].items():
+        old = baseline["query_counts"].get(name, {}).get("queries")
+        print(f"  {name:14} {old!s:>4} -> {counts['queries']}")
+
+    print("\nLatency / throughput (candidate vs baseline)")
+    old_results = {(r["server"], r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    for result in candidate["results"]:
+        key = (result["server"], result["endpoint"], result["concurrency"])
+        old = old_results.get(key)
+        if old is None:
+            continue
+        print(
+            f"  {key[0]:5} {key[1]:14} c={key[2]:<4}"
+            f" p50 {_delta(old['latency_ms']['p50'], result['latency_ms']['p50'])}"
+            f" p95 {_delta(old['latency_ms']['p95'], result['latency_ms']['p95'])}"
+            f" p99 {_delta(old['latency_ms']['p99'], result['latency_ms']['p99'])}"
+            f" rps {_delta(old['throughput_rps'], result['throughput_rps'])}"
+            f" conns/req {old.get('db_connections_per_request', 'n/a')} -> "
+            f"{result.get('db_connections_per_request', 'n/a')}"
+            f" rejected {old.get('rejected', 'n/a')} -> {result.get('rejected', 'n/a')}"
+        )
+
+
+if __name__ == "__main__":
+    main()
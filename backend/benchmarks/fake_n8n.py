@@ -0,0 +1,119 @@
+"""
+Fake n8n webhook server with latency and error injection.
+
+Answers every POST with a traffic analysis payload shaped like the real
+n8n workflow response.
+
+Usage:
+    python -m benchmarks.fake_n8n --port 5678 --latency-ms 300 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATUSES = [
+    ("CLEAR", "#2ecc71"),
+    ("LIGHT", "#f1c40f"),
+    ("MODERATE", "#e67e22"),
+    ("HEAVY", "#e74c3c"),
+    ("SEVERE", "#8e44ad"),
+]
+
+
+def traffic_payload(location, rng=random):
+    status_code, status_color = rng.choice(STATUSES)
+    congestion = round(rng.random(), 2)
+    return {
+        "address": location,
+        "congestionRate": congestion,
+        "flowSpeed": int(60 * (1 - congestion)) + 5,
+        "delayTime": int(congestion * 30),
+        "hasIncident": congestion > 0.8,
+        "incidentCount": 1 if congestion > 0.8 else 0,
+        "statusCode": status_code,
+        "statusColor": status_color,
+        "analysis": f"Traffic around {location} is {status_code.lower()}.",
+        "recommendation": "Consider alternative routes during peak hours.",
+        "alternativeRoutes": ["Route A", "Route B"],
+        "alert_content": f"Heavy congestion near {location}" if congestion > 0.9 else "",
+    }
+
+
+class FakeN8NHandler(BaseHTTPRequestHandler):
+    # Set on the server instance by make_server()
+    latency_ms = 0
+    jitter_ms = 0
+    error_rate = 0.0
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            body = {}
+
+        delay = server.latency_ms + random.uniform(0, server.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+        if random.random() < server.error_rate:
+            self._reply(500, {"error": "injected failure"})
+            return
+        self._reply(200, traffic_payload(body.get("location", "Unknown")))
+
+    def _reply(self, code, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=0, latency_ms=0, jitter_ms=0, error_rate=0.0):
+    server = ThreadingHTTPServer((host, port), FakeN8NHandler)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.jitter_ms = jitter_ms
+    server.error_rate = error_rate
+    return server
+
+
+def start_in_thread(**kwargs):
+    """
+    Start a fake n8n server in a background thread.
+    Returns (server, webhook_url).
+    """
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/webhook/traffic-analysis"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5678)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Fake n8n listening on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Compare the stock DRF JSON codec with the orjson one (api/renderers.py).
+
+Renders serialized TrafficLog and CitizenReport lists of each size with both
+renderers, checks the bytes are identical, then parses them back with both
+parsers. No database is needed: rows are built in memory.
+
+Usage (from the backend directory):
+    python -m benchmarks.json_codec --rows 1000,10000,100000
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def build_payloads(rows, seed):
+    from django.utils import timezone
+
+    from api.models import CitizenReport, TrafficLog
+    from api.serializers import CitizenReportSerializer, TrafficLogSerializer
+    from benchmarks.fake_n8n import traffic_payload
+    from benchmarks.seed import DESCRIPTIONS, LOCATIONS
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    traffic = []
+    for i in range(rows):
+        data = traffic_payload(rng.choice(LOCATIONS), rng)
+        traffic.append(
+            TrafficLog(
+                id=i + 1,
+                address=data["address"],
+                congestion_rate=data["congestionRate"],
+                flow_speed=data["flowSpeed"],
+                delay_time=data["delayTime"],
+                has_incident=data["hasIncident"],
+                incident_count=data["incidentCount"],
+                status_code=data["statusCode"],
+                status_color=data["statusColor"],
+                analysis=data["analysis"],
+                recommendation=data["recommendation"],
+                alternative_routes=data["alternativeRoutes"],
+                alert_content="",
+                created_at=now,
+            )
+        )
+    reports = [
+        CitizenReport(
+            id=i + 1,
+            reporter_name=f"Người dân {i}",
+            issue_type=rng.choice(["traffic", "waste", "energy", "other"]),
+            description=rng.choice(DESCRIPTIONS),
+            location=rng.choice(LOCATIONS),
+            status="pending",
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(rows)
+    ]
+    return {
+        "traffic-logs": TrafficLogSerializer(traffic, many=True).data,
+        "reports": CitizenReportSerializer(reports, many=True).data,
+    }
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API JSON codecs")
+    parser.add_argument("--rows", default="1000,10000,100000", help="Comma-separated row counts")
+    parser.add_argument("--repeat", type=int, default=5, help="Best of N runs")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    import django
+
+    django.setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from api.renderers import OrjsonParser, OrjsonRenderer, orjson
+
+    if orjson is None:
+        raise SystemExit("orjson is not installed (pip install orjson)")
+
+    context = {"encoding": "utf-8"}
+    print(f"{'payload':14} {'rows':>7} {'size':>9}  {'render stdlib':>13} {'orjson':>9} {'x':>6}  "
+          f"{'parse stdlib':>12} {'orjson':>9} {'x':>6}")
+    for rows in (int(n) for n in args.rows.split(",")):
+        for name, data in build_payloads(rows, args.seed).items():
+            stock = JSONRenderer().render(data)
+            fast = OrjsonRenderer().render(data)
+            if stock != fast:
+                raise SystemExit(f"{name}: orjson output differs from the stock renderer")
+
+            render_stdlib = best_of(lambda: JSONRenderer().render(data), args.repeat)
+            render_orjson = best_of(lambda: OrjsonRenderer().render(data), args.repeat)
+            parse_stdlib = best_of(lambda: JSONParser().parse(io.BytesIO(stock), parser_context=context), args.repeat)
+            parse_orjson = best_of(lambda: OrjsonParser().parse(io.BytesIO(stock), parser_context=context), args.repeat)
+            print(
+                f"{name:14} {rows:>7} {len(stock) / 1024:>7.0f}KB  "
+                f"{render_stdlib * 1000:>11.1f}ms {render_orjson * 1000:>7.1f}ms {render_stdlib / render_orjson:>5.1f}x  "
+                f"{parse_stdlib * 1000:>10.1f}ms {parse_orjson * 1000:>7.1f}ms {parse_stdlib / parse_orjson:>5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
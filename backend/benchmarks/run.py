@@ -0,0 +1,392 @@
+"""
+Reproducible load test for the Smart City API.
+
+Starts a fake n8n webhook server, migrates and seeds the database, measures
+query counts per endpoint in-process, then serves the app with gunicorn
+(WSGI) and/or uvicorn (ASGI) and drives each endpoint at the requested
+concurrency levels. Writes a JSON report with p50/p95/p99 latency,
+throughput, query counts and database connections opened per request
+(scraped from the server's /metrics); compare reports with
+benchmarks.compare.
+
+Admission control (CHECK_TRAFFIC_RATE, N8N_MAX_IN_FLIGHT, N8N_QUEUE_SIZE)
+is opened up to the highest concurrency level so check-traffic is measured
+rather than its throttle; any 429/503 answers are reported as `rejected`.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --server wsgi,asgi --concurrency 1,8,32 --requests 300
+
+Compare connection handling with --conn-max-age 0 (reconnect per request),
+--conn-max-age 60 (persistent) and --db-pool (psycopg pool, PostgreSQL).
+
+Uses DATABASE_URL when set; otherwise a throwaway SQLite file, recreated
+on every run so each one seeds the same rows (--skip-seed keeps it).
+Pass an empty DATABASE_URL database for comparable runs: it is seeded as
+it is. SQLite serializes writers, so use PostgreSQL for numbers that mean
+anything.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_DB = RESULTS_DIR / "bench.sqlite3"
+METRICS_SETTLE_SECONDS = 1.5
+
+SAVE_STATS_PAYLOAD = {
+    "energyOptimizationData": {
+        "summary": {"total_consumption": 150.5, "anomalies": False, "average_power": 450.2},
+        "statistics": {"voltage": {"min": 210, "max": 230, "average": 220}},
+    },
+    "wasteTrackingData": {
+        "avgFill": 75.5,
+        "criticalCount": 3,
+        "warningCount": 5,
+        "warningLocations": ["Point A", "Point B"],
+    },
+}
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    path: str
+    payload: object = None
+
+    def body(self, rng):
+        from benchmarks.seed import LOCATIONS
+
+        if self.name == "check-traffic":
+            return {"location": rng.choice(LOCATIONS)}
+        return self.payload
+
+
+ENDPOINTS = [
+    Endpoint("check-traffic", "POST", "/api/check-traffic/"),
+    Endpoint("dashboard", "GET", "/api/dashboard/"),
+    Endpoint("reports", "GET", "/api/reports/"),
+    Endpoint("save-stats", "POST", "/api/webhook/save-stats/", SAVE_STATS_PAYLOAD),
+    Endpoint("subscribers", "GET", "/api/subscribers/"),
+]
+
+
+def configure_environment(n8n_url, args):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    os.environ["DB_CONN_MAX_AGE"] = args.conn_max_age
+    os.environ["DB_POOL"] = str(args.db_pool)
+    # Shared by the server workers so /metrics covers all of them
+    os.environ["METRICS_ENABLED"] = "True"
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="bench-metrics-")
+    os.environ["METRICS_FLUSH_INTERVAL"] = "0.5"
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{DEFAULT_DB.as_posix()}")
+    os.environ["N8N_TRAFFIC_WEBHOOK"] = n8n_url
+    # All requests come from one IP at up to the highest concurrency level:
+    # with the production admission limits nearly every check-traffic call
+    # would be answered 429/503, measuring the throttle instead of the view
+    max_concurrency = max(int(c) for c in args.concurrency.split(","))
+    os.environ["CHECK_TRAFFIC_RATE"] = "1000000/s"
+    os.environ["N8N_MAX_IN_FLIGHT"] = str(max_concurrency)
+    os.environ["N8N_QUEUE_SIZE"] = str(max_concurrency)
+    os.environ["DEBUG"] = "False"
+    os.environ["SECURE_SSL_REDIRECT"] = "False"
+    os.environ["ALLOWED_HOSTS"] = "127.0.0.1,localhost,testserver"
+
+
+def remove_default_database():
+    """
+    Delete the throwaway SQLite database and its journal files.
+    """
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        DEFAULT_DB.with_name(DEFAULT_DB.name + suffix).unlink(missing_ok=True)
+
+
+def prepare_database(args):
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+    if args.skip_seed:
+        return None
+    from benchmarks.seed import seed_database
+
+    return seed_database(
+        reports=args.seed_reports,
+        traffic=args.seed_traffic,
+        subscribers=args.seed_subscribers,
+        seed=args.seed,
+    )
+
+
+def measure_query_counts(endpoints):
+    """
+    Run each endpoint once in-process and record its query count and time.
+    """
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    rng = random.Random(0)
+    counts = {}
+    for endpoint in endpoints:
+        with CaptureQueriesContext(connection) as queries:
+            client.generic(
+                endpoint.method,
+                endpoint.path,
+                json.dumps(endpoint.body(rng)) if endpoint.method == "POST" else "",
+                content_type="application/json",
+            )
+        counts[endpoint.name] = {
+            "queries": len(queries),
+            "query_time_ms": round(sum(float(q["time"]) for q in queries) * 1000, 2),
+        }
+    return counts
+
+
+def server_command(kind, bind, workers):
+    host, port = bind.split(":")
+    if kind == "wsgi":
+        return [
+            "gunicorn", "core.wsgi:application",
+            "--bind", bind, "--workers", str(workers), "--log-level", "warning",
+        ]
+    return [
+        "uvicorn", "core.asgi:application",
+        "--host", host, "--port", port, "--workers", str(workers), "--log-level", "warning",
+    ]
+
+
+def start_server(kind, bind, workers):
+    command = server_command(kind, bind, workers)
+    if shutil.which(command[0]) is None:
+        raise SystemExit(f"{command[0]} is not installed; it is needed for the {kind} run")
+
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=os.environ.copy())
+    base_url = f"http://{bind}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(base_url + "/api/dashboard/", timeout=2).status_code < 500:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        if process.poll() is not None:
+            raise SystemExit(f"{kind} server exited with code {process.returncode}")
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f"{kind} server did not become ready on {bind}")
+
+
+def connections_opened(base_url):
+    """
+    Total database connections the server workers have opened so far.
+    """
+    # Let every worker write its latest metrics snapshot first
+    time.sleep(METRICS_SETTLE_SECONDS)
+    response = requests.get(base_url + "/metrics", timeout=10)
+    response.raise_for_status()
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in response.text.splitlines()
+        if line.startswith("smartcity_db_connections_opened_total")
+    )
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def drive(base_url, endpoint, concurrency, total, seed):
+    """
+    Send `total` requests to `endpoint` from `concurrency` threads.
+    """
+    latencies = []
+    codes = Counter()
+    lock = threading.Lock()
+
+    def worker(index, count):
+        rng = random.Random(seed + index)
+        session = requests.Session()
+        local_latencies, local_codes = [], Counter()
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                response = session.request(
+                    endpoint.method,
+                    base_url + endpoint.path,
+                    json=endpoint.body(rng) if endpoint.method == "POST" else None,
+                    timeout=60,
+                )
+                local_codes[str(response.status_code)] += 1
+            except requests.RequestException as e:
+                local_codes[e.__class__.__name__] += 1
+            local_latencies.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local_latencies)
+            codes.update(local_codes)
+
+    shares = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(shares) if n]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    # Turned away by admission control; not errors, but not served either
+    rejected = codes["429"] + codes["503"]
+    errors = sum(n for code, n in codes.items() if not code.isdigit() or int(code) >= 500) - codes["503"]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rejected": rejected,
+        "status_codes": dict(codes),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "max": round(latencies[-1], 2),
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Smart City API")
+    parser.add_argument("--server", default="wsgi", help="Comma-separated: wsgi, asgi")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint per level")
+    parser.add_argument("--endpoints", default=",".join(e.name for e in ENDPOINTS))
+    parser.add_argument("--workers", type=int, default=3, help="Server worker processes")
+    parser.add_argument("--bind", default="127.0.0.1:8765")
+    parser.add_argument("--n8n-latency-ms", type=float, default=200)
+    parser.add_argument("--n8n-jitter-ms", type=float, default=50)
+    parser.add_argument("--n8n-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-reports", type=int, default=1000)
+    parser.add_argument("--seed-traffic", type=int, default=1000)
+    parser.add_argument("--seed-subscribers", type=int, default=1000)
+    parser.add_argument("--skip-seed", action="store_true", help="Use the database as it is")
+    parser.add_argument("--conn-max-age", default="60", help="DB_CONN_MAX_AGE for the server (0 = reconnect per request)")
+    parser.add_argument("--db-pool", action="store_true", help="Use the psycopg connection pool (PostgreSQL)")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/<time>-<commit>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, str(BACKEND_DIR))
+    RESULTS_DIR.mkdir(exist_ok=True)
+
+    from benchmarks.fake_n8n import start_in_thread
+
+    n8n_server, n8n_url = start_in_thread(
+        latency_ms=args.n8n_latency_ms,
+        jitter_ms=args.n8n_jitter_ms,
+        error_rate=args.n8n_error_rate,
+    )
+    if "DATABASE_URL" not in os.environ and not args.skip_seed:
+        # Seeding on top of the previous run's rows would skew the results
+        remove_default_database()
+    configure_environment(n8n_url, args)
+    seeded = prepare_database(args)
+
+    wanted = set(args.endpoints.split(","))
+    endpoints = [e for e in ENDPOINTS if e.name in wanted]
+    query_counts = measure_query_counts(endpoints)
+
+    results = []
+    for kind in args.server.split(","):
+        process, base_url = start_server(kind, args.bind, args.workers)
+        try:
+            for endpoint in endpoints:
+                for concurrency in (int(c) for c in args.concurrency.split(",")):
+                    opened_before = connections_opened(base_url)
+                    stats = drive(base_url, endpoint, concurrency, args.requests, args.seed)
+                    stats["db_connections_per_request"] = round(
+                        (connections_opened(base_url) - opened_before) / stats["requests"], 3
+                    )
+                    results.append(
+                        {"server": kind, "endpoint": endpoint.name, "concurrency": concurrency, **stats}
+                    )
+                    print(
+                        f"{kind:5} {endpoint.name:14} c={concurrency:<4} "
+                        f"p50={stats['latency_ms']['p50']:8.1f}ms p95={stats['latency_ms']['p95']:8.1f}ms "
+                        f"p99={stats['latency_ms']['p99']:8.1f}ms {stats['throughput_rps']:8.1f} req/s "
+                        f"conns/req={stats['db_connections_per_request']:.2f} errors={stats['errors']} "
+                        f"rejected={stats['rejected']}"
+                    )
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    n8n_server.shutdown()
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": commit,
+            "python": platform.python_version(),
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "workers": args.workers,
+            "conn_max_age": args.conn_max_age,
+            "db_pool": args.db_pool,
+            "requests_per_level": args.requests,
+            "admission": {
+                name.lower(): os.environ[name]
+                for name in ("CHECK_TRAFFIC_RATE", "N8N_MAX_IN_FLIGHT", "N8N_QUEUE_SIZE")
+            },
+            "n8n": {
+                "latency_ms": args.n8n_latency_ms,
+                "jitter_ms": args.n8n_jitter_ms,
+                "error_rate": args.n8n_error_rate,
+            },
+            "seeded": seeded,
+        },
+        "query_counts": query_counts,
+        "results": results,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{(commit or 'unknown')[:8]}.json"
+    )
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Deterministic seeding for benchmark runs.
+
+Requires Django to be set up (benchmarks.run does this).
+"""
+
+import random
+
+LOCATIONS = [
+    "Nguyen Hue, District 1",
+    "Le Loi, District 1",
+    "Dien Bien Phu, Binh Thanh",
+    "Cong Hoa, Tan Binh",
+    "Vo Van Kiet, District 5",
+    "Nguyen Van Linh, District 7",
+    "Pham Van Dong, Thu Duc",
+    "Truong Chinh, Tan Phu",
+]
+
+DESCRIPTIONS = [
+    "Large pothole in the middle of the road causing slowdowns",
+    "Garbage has not been collected for several days",
+    "Street lights are out along the whole block",
+    "Traffic light stuck on red at the intersection",
+    "Overflowing bins attracting animals near the market",
+]
+
+
+def seed_database(reports=1000, traffic=1000, energy=200, waste=200, subscribers=1000, seed=42):
+    """
+    Insert benchmark rows with bulk_create. Returns the row counts inserted.
+    """
+    from api.models import CitizenReport, EnergyLog, Subscriber, TrafficLog, WasteLog
+    from api.similarity import fingerprint
+    from benchmarks.fake_n8n import traffic_payload
+
+    rng = random.Random(seed)
+    batch_size = 1000
+
+    traffic_rows = []
+    for _ in range(traffic):
+        data = traffic_payload(rng.choice(LOCATIONS), rng)
+        traffic_rows.append(
+            TrafficLog(
+                address=data["address"],
+                congestion_rate=data["congestionRate"],
+                flow_speed=data["flowSpeed"],
+                delay_time=data["delayTime"],
+                has_incident=data["hasIncident"],
+                incident_count=data["incidentCount"],
+                status_code=data["statusCode"],
+                status_color=data["statusColor"],
+                analysis=data["analysis"],
+                recommendation=data["recommendation"],
+                alternative_routes=data["alternativeRoutes"],
+                alert_content="",
+            )
+        )
+    TrafficLog.objects.bulk_create(traffic_rows, batch_size=batch_size)
+
+    EnergyLog.objects.bulk_create(
+        [
+            EnergyLog(
+                total_consumption=rng.uniform(100, 200),
+                avg_power=rng.uniform(300, 600),
+                voltage_stats={"min": 210, "max": 230, "average": rng.uniform(215, 225)},
+                anomalies_detected=False,
+            )
+            for _ in range(energy)
+        ],
+        batch_size=batch_size,
+    )
+
+    WasteLog.objects.bulk_create(
+        [
+            WasteLog(
+                avg_fill_level=rng.uniform(20, 95),
+                critical_count=rng.randint(0, 5),
+                warning_count=rng.randint(0, 10),
+                warning_locations=rng.sample(LOCATIONS, rng.randint(0, 4)),
+            )
+            for _ in range(waste)
+        ],
+        batch_size=batch_size,
+    )
+
+    statuses = ["pending"] * 4 + ["in_progress"] * 2 + ["resolved"] * 3 + ["rejected"]
+    report_rows = []
+    for i in range(reports):
+        description, location = rng.choice(DESCRIPTIONS), rng.choice(LOCATIONS)
+        report_rows.append(
+            CitizenReport(
+                reporter_name=f"Citizen {i}",
+                issue_type=rng.choice(["traffic", "waste", "energy", "other"]),
+                description=description,
+                location=location,
+                status=rng.choice(statuses),
+                # bulk_create skips perform_create, so fingerprint here
+                **fingerprint(description, location),
+            )
+        )
+    CitizenReport.objects.bulk_create(report_rows, batch_size=batch_size)
+
+    Subscriber.objects.bulk_create(
+        [Subscriber(email=f"bench{seed}-{i}@example.com") for i in range(subscribers)],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+    return {
+        "traffic": traffic,
+        "energy": energy,
+        "waste": waste,
+        "reports": reports,
+        "subscribers": subscribers,
+    }
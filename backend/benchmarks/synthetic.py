@@ -0,0 +1,404 @@
+"""
+Synthetic data at production scale, for exercising the API under realistic
+volumes (see `manage.py generate_synthetic_data`).
+
+Distributions:
+
+- addresses: a few hundred street/district combinations with Zipf-like
+  popularity, the benchmark LOCATIONS first; popular places get more
+  traffic checks, more congestion, more reports and more full bins
+- traffic: weekday rush hours at 07-09 and 17-19, quieter weekends and
+  nights; congestion follows the hour and the address, status codes and
+  incidents follow congestion
+- energy: one snapshot per interval on a daily load curve, with rare spikes
+  flagged by the n8n-side detector
+- waste: fill levels rising between the Monday/Thursday collections
+- reports: daytime submissions, an issue mix and statuses that depend on
+  age (old reports are mostly resolved); optional small PNG images
+- subscribers: daytime sign-ups spread over the window
+
+Each table is split into chunks covering consecutive time slices. A chunk
+is generated from its own random stream, seeded by (seed, table, chunk),
+so the same seed and --end produce the same rows whatever the number of
+workers. Within a chunk rows are in time order, so ids follow time as
+they do in production when a single worker runs.
+
+Rows are written without the ORM: COPY on PostgreSQL with psycopg 3, a
+multi-row INSERT elsewhere. No signals fire, so no alerts, tombstones or
+cache invalidations happen per row.
+"""
+
+import functools
+import json
+import math
+import os
+import random
+import struct
+import time
+import zlib
+from datetime import timedelta
+
+STREETS = [
+    "Nguyen Hue", "Le Loi", "Dien Bien Phu", "Cong Hoa", "Vo Van Kiet", "Nguyen Van Linh",
+    "Pham Van Dong", "Truong Chinh", "Hai Ba Trung", "Nam Ky Khoi Nghia", "Cach Mang Thang Tam",
+    "Nguyen Thi Minh Khai", "Ly Thuong Kiet", "Tran Hung Dao", "Nguyen Trai", "Xo Viet Nghe Tinh",
+    "Phan Xich Long", "Hoang Van Thu", "Nguyen Oanh", "Quang Trung", "Le Van Viet", "Kha Van Can",
+    "Au Co", "Luy Ban Bich", "Tan Ky Tan Quy", "Huynh Tan Phat", "Nguyen Huu Tho", "To Ngoc Van",
+]
+DISTRICTS = [
+    "District 1", "District 3", "District 4", "District 5", "District 6", "District 7",
+    "District 8", "District 10", "District 11", "District 12", "Binh Thanh", "Tan Binh",
+    "Tan Phu", "Phu Nhuan", "Go Vap", "Thu Duc",
+]
+# Popularity of the address at rank r is proportional to 1 / (r + 1) ** ZIPF_EXPONENT
+ZIPF_EXPONENT = 1.1
+
+FIRST_NAMES = ["An", "Binh", "Chi", "Dung", "Giang", "Hoa", "Khanh", "Lan", "Minh", "Nam", "Phuong", "Quan",
+               "Thao", "Trang", "Tuan", "Vy"]
+LAST_NAMES = ["Nguyen", "Tran", "Le", "Pham", "Hoang", "Huynh", "Phan", "Vu", "Vo", "Dang", "Bui", "Do"]
+
+ISSUE_TYPES = [("traffic", 35), ("waste", 30), ("energy", 15), ("other", 20)]
+ISSUE_TEXT = {
+    "traffic": [
+        "Traffic light stuck on red at the intersection",
+        "Large pothole in the middle of the road causing slowdowns",
+        "Illegally parked trucks blocking a lane",
+        "Flooded underpass, motorbikes turning back",
+    ],
+    "waste": [
+        "Garbage has not been collected for several days",
+        "Overflowing bins attracting animals near the market",
+        "Construction debris dumped on the sidewalk",
+        "Bad smell from the collection point",
+    ],
+    "energy": [
+        "Street lights are out along the whole block",
+        "Power cut every evening around dinner time",
+        "Sparking cable hanging over the road",
+    ],
+    "other": [
+        "Broken bench in the park",
+        "Fallen tree branch on the footpath",
+        "Loud construction noise late at night",
+    ],
+}
+DETAILS = [
+    "", " since this morning", " for a week now", " again", ", please send someone",
+    " near the school", " next to the bus stop", " in front of the market", " at the corner",
+]
+
+STATUSES = [
+    (0.2, "CLEAR", "#2ecc71"),
+    (0.4, "LIGHT", "#f1c40f"),
+    (0.6, "MODERATE", "#e67e22"),
+    (0.8, "HEAVY", "#e74c3c"),
+    (math.inf, "SEVERE", "#8e44ad"),
+]
+
+# Relative activity per hour of the day
+WEEKDAY_TRAFFIC = [2, 1, 1, 1, 2, 4, 7, 10, 10, 7, 6, 6, 6, 6, 6, 7, 8, 10, 10, 8, 6, 5, 4, 3]
+WEEKEND_TRAFFIC = [3, 2, 1, 1, 1, 2, 3, 4, 5, 6, 7, 7, 7, 7, 7, 7, 7, 7, 7, 6, 6, 5, 4, 3]
+DAYTIME = [1, 0, 0, 0, 0, 1, 3, 6, 8, 9, 9, 8, 7, 8, 8, 8, 7, 7, 6, 6, 5, 4, 3, 2]
+
+# Ho Chi Minh City inner districts, for waste bins
+LATITUDES = (10.70, 10.86)
+LONGITUDES = (106.60, 106.78)
+
+IMAGE_SHARE = 0.3
+IMAGE_DIR = "citizen_reports/synthetic"
+
+
+@functools.lru_cache(maxsize=None)
+def addresses(seed):
+    """
+    (address list, cumulative popularity weights, congestion factor per
+    address) for a seed. The benchmark LOCATIONS are the most popular.
+    """
+    from benchmarks.seed import LOCATIONS
+
+    rng = random.Random(f"{seed}:addresses")
+    others = [f"{street}, {district}" for street in STREETS for district in DISTRICTS]
+    others = [a for a in others if a not in LOCATIONS]
+    rng.shuffle(others)
+    names = list(LOCATIONS) + others
+
+    cumulative, total = [], 0.0
+    for rank in range(len(names)):
+        total += 1 / (rank + 1) ** ZIPF_EXPONENT
+        cumulative.append(total)
+    # Busy places are more congested
+    factors = [1.3 - 0.5 * rank / len(names) + rng.uniform(-0.1, 0.1) for rank in range(len(names))]
+    return names, cumulative, factors
+
+
+def _times(rng, count, start, end, hourly):
+    """
+    `count` sorted datetimes in [start, end) following the hourly activity
+    profile `hourly` (a 24-list, or a (weekday, weekend) pair of them),
+    drawn by thinning uniform times.
+    """
+    weekday, weekend = hourly if isinstance(hourly[0], list) else (hourly, hourly)
+    peak = max(max(weekday), max(weekend))
+    span = (end - start).total_seconds()
+    times = []
+    while len(times) < count:
+        at = start + timedelta(seconds=rng.random() * span)
+        profile = weekend if at.weekday() >= 5 else weekday
+        if rng.random() * peak < profile[at.hour]:
+            times.append(at)
+    times.sort()
+    return times
+
+
+def _spaced(count, start, end):
+    step = (end - start) / max(count, 1)
+    return [start + step * i for i in range(count)]
+
+
+def _status(congestion):
+    for limit, code, color in STATUSES:
+        if congestion < limit:
+            return code, color
+
+
+def traffic_rows(rng, seed, count, start, end):
+    names, cumulative, factors = addresses(seed)
+    indexes = rng.choices(range(len(names)), cum_weights=cumulative, k=count)
+    for at, index in zip(_times(rng, count, start, end, (WEEKDAY_TRAFFIC, WEEKEND_TRAFFIC)), indexes):
+        rush = (WEEKEND_TRAFFIC if at.weekday() >= 5 else WEEKDAY_TRAFFIC)[at.hour] / 10
+        congestion = min(max(0.1 + 0.6 * rush * factors[index] + rng.gauss(0, 0.08), 0.0), 1.0)
+        code, color = _status(congestion)
+        incidents = sum(rng.random() < congestion ** 4 * 0.3 for _ in range(3))
+        address = names[index]
+        yield {
+            "address": address,
+            "congestion_rate": round(congestion, 2),
+            "flow_speed": max(int(60 * (1 - congestion) + rng.gauss(5, 3)), 1),
+            "delay_time": max(int(congestion * 30 + rng.gauss(0, 3)), 0),
+            "has_incident": incidents > 0,
+            "incident_count": incidents,
+            "status_code": code,
+            "status_color": color,
+            "analysis": f"Traffic around {address} is {code.lower()}.",
+            "recommendation": "Consider alternative routes during peak hours." if congestion >= 0.6 else "",
+            "alternative_routes": ["Route A", "Route B"] if congestion >= 0.6 else [],
+            "alert_content": f"Heavy congestion near {address}" if congestion >= 0.9 else "",
+            "created_at": at,
+            "ingested_at": at,
+        }
+
+
+def energy_rows(rng, seed, count, start, end):
+    for at in _spaced(count, start, end):
+        hour = at.hour + at.minute / 60
+        load = 150 + 40 * math.sin((hour - 9) / 24 * 2 * math.pi) - (15 if at.weekday() >= 5 else 0)
+        spike = rng.random() < 0.005
+        consumption = load * (1.8 if spike else 1.0) + rng.gauss(0, 6)
+        average = 220 + rng.gauss(0, 1.5)
+        yield {
+            "total_consumption": round(consumption, 2),
+            "avg_power": round(consumption * 3.6 + rng.gauss(0, 10), 2),
+            "voltage_stats": {
+                "min": round(average - rng.uniform(5, 12) - (15 if spike else 0), 1),
+                "max": round(average + rng.uniform(5, 12), 1),
+                "average": round(average, 1),
+            },
+            "anomalies_detected": spike,
+            "created_at": at,
+        }
+
+
+def waste_rows(rng, seed, count, start, end):
+    names, cumulative, _ = addresses(seed)
+    for at in _spaced(count, start, end):
+        # Collections on Monday and Thursday mornings
+        since = min(((at.weekday() - day) * 24 + at.hour - 6) % (7 * 24) for day in (0, 3))
+        fill = min(max(20 + since * 0.9 + rng.gauss(0, 5), 0), 100)
+        warnings = min(int(fill / 10 + rng.gauss(0, 1)), 12) if fill > 50 else 0
+        locations = list(dict.fromkeys(rng.choices(names, cum_weights=cumulative, k=warnings)))
+        yield {
+            "avg_fill_level": round(fill, 1),
+            "critical_count": sum(rng.random() < 0.4 for _ in locations),
+            "warning_count": len(locations),
+            "warning_locations": locations,
+            "created_at": at,
+        }
+
+
+def _png(width, height, color):
+    """A solid-color RGB PNG."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    row = b"\x00" + bytes(color) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+def report_rows(rng, seed, count, start, end, images=False, chunk=0):
+    from django.conf import settings
+
+    from api.similarity import fingerprint
+
+    # Descriptions and locations repeat a lot, and SimHash dominates the cost
+    fingerprint = functools.lru_cache(maxsize=65536)(fingerprint)
+    names, cumulative, _ = addresses(seed)
+    kinds, weights = zip(*ISSUE_TYPES)
+    for i, at in enumerate(_times(rng, count, start, end, DAYTIME)):
+        issue_type = rng.choices(kinds, weights=weights)[0]
+        description = rng.choice(ISSUE_TEXT[issue_type]) + rng.choice(DETAILS)
+        location = rng.choices(names, cum_weights=cumulative)[0]
+
+        age_days = (end - at).total_seconds() / 86400
+        if age_days < 1:
+            status = rng.choices(["pending", "in_progress"], weights=[8, 2])[0]
+        else:
+            status = rng.choices(["pending", "in_progress", "resolved", "rejected"], weights=[2, 1, 6, 1])[0]
+        updated_at = at if status == "pending" else min(at + timedelta(days=rng.expovariate(1 / 2)), end)
+
+        image = None
+        if images and rng.random() < IMAGE_SHARE:
+            image = f"{IMAGE_DIR}/{seed}/{chunk}-{i}.png"
+            path = os.path.join(settings.MEDIA_ROOT, image)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(_png(rng.randint(32, 96), rng.randint(32, 96), [rng.randrange(256) for _ in range(3)]))
+
+        yield {
+            "reporter_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "issue_type": issue_type,
+            "description": description,
+            "image": image,
+            "location": location,
+            "status": status,
+            "created_at": at,
+            "updated_at": updated_at,
+            **fingerprint(description, location),
+        }
+
+
+def subscriber_rows(rng, seed, count, start, end, chunk=0):
+    for i, at in enumerate(_times(rng, count, start, end, DAYTIME)):
+        yield {
+            "email": f"{rng.choice(FIRST_NAMES).lower()}.{rng.choice(LAST_NAMES).lower()}"
+                     f".{seed}.{chunk}.{i}@example.com",
+            "created_at": at,
+        }
+
+
+# table -> (model name, row generator, INSERT ignores duplicates)
+TABLES = {
+    "traffic": ("TrafficLog", traffic_rows, False),
+    "energy": ("EnergyLog", energy_rows, False),
+    "waste": ("WasteLog", waste_rows, False),
+    "reports": ("CitizenReport", report_rows, False),
+    "subscribers": ("Subscriber", subscriber_rows, True),
+}
+
+
+def insert_rows(model, rows, ignore_conflicts=False, batch_size=1000):
+    """
+    Write `rows` (dicts of field name -> value; other fields get their
+    defaults) straight to the model's table. Returns the number of rows.
+    """
+    from django.db import connection, transaction
+
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = ", ".join(qn(f.column) for f in fields)
+    defaults = {f.attname: f.get_default() for f in fields}
+
+    def values(row):
+        return [row.get(f.attname, row.get(f.name, defaults[f.attname])) for f in fields]
+
+    written = 0
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if connection.vendor == "postgresql" and hasattr(raw, "copy") and not ignore_conflicts:
+            json_fields = [f.get_internal_type() == "JSONField" for f in fields]
+            with raw.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(
+                        [json.dumps(v) if is_json and v is not None else v for v, is_json in zip(values(row), json_fields)]
+                    )
+                    written += 1
+            return written
+
+        conflict = " ON CONFLICT DO NOTHING" if ignore_conflicts else ""
+        batch = []
+
+        def flush():
+            placeholders = ", ".join(["(" + ", ".join(["%s"] * len(fields)) + ")"] * len(batch))
+            params = [p for row in batch for p in row]
+            with transaction.atomic():
+                cursor.execute(f"INSERT INTO {table} ({columns}) VALUES {placeholders}{conflict}", params)
+
+        # SQLite allows at most 32766 parameters per statement
+        batch_size = min(batch_size, 30000 // len(fields))
+        for row in rows:
+            batch.append([f.get_db_prep_save(v, connection) for f, v in zip(fields, values(row))])
+            written += 1
+            if len(batch) >= batch_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+    return written
+
+
+def init_worker():
+    import django
+
+    django.setup()
+
+
+def generate_chunk(table, chunk, count, start, end, seed, images=False):
+    """
+    Generate and insert one chunk. Runs in worker processes; returns
+    (table, rows written, seconds).
+    """
+    from django.apps import apps
+
+    started = time.monotonic()
+    model_name, generator, ignore_conflicts = TABLES[table]
+    rng = random.Random(f"{seed}:{table}:{chunk}")
+    kwargs = {}
+    if table == "reports":
+        kwargs = {"images": images, "chunk": chunk}
+    elif table == "subscribers":
+        kwargs = {"chunk": chunk}
+    rows = generator(rng, seed, count, start, end, **kwargs)
+    written = insert_rows(apps.get_model("api", model_name), rows, ignore_conflicts)
+    return table, written, time.monotonic() - started
+
+
+def plan_chunks(counts, start, end, chunk_size):
+    """
+    Split each table's row count into chunks over consecutive time slices.
+    Yields (table, chunk index, rows, slice start, slice end).
+    """
+    for table, total in counts.items():
+        chunks = max(math.ceil(total / chunk_size), 1) if total else 0
+        step = (end - start) / max(chunks, 1)
+        for chunk in range(chunks):
+            rows = total // chunks + (1 if chunk < total % chunks else 0)
+            yield table, chunk, rows, start + step * chunk, start + step * (chunk + 1)
+
+
+def waste_bins(seed):
+    """
+    A WasteBin for every generated address, so waste routes resolve.
+    """
+    from api.models import WasteBin
+
+    rng = random.Random(f"{seed}:bins")
+    names, _, _ = addresses(seed)
+    return [
+        WasteBin(name=name, address=name, latitude=rng.uniform(*LATITUDES), longitude=rng.uniform(*LONGITUDES))
+        for name in names
+    ]
@@ -0,0 +1,72 @@
+"""
+Benchmark the waste collection route planner (api/waste_routes.py).
+
+For each stop count, places random bins across Ho Chi Minh City and times
+building the distance matrix, the nearest-neighbour tour and the 2-opt
+pass, and compares the route length with nearest-neighbour alone. No
+database is needed.
+
+Usage (from the backend directory):
+    python -m benchmarks.waste_route --stops 50,200,500
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Rough bounding box of the inner districts
+LATITUDES = (10.70, 10.86)
+LONGITUDES = (106.60, 106.78)
+
+
+def timed(func, repeat):
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the waste route planner")
+    parser.add_argument("--stops", default="50,200,300,500", help="Comma-separated stop counts")
+    parser.add_argument("--repeat", type=int, default=5, help="Best of N runs")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    import django
+
+    django.setup()
+    from api.waste_routes import haversine_matrix, nearest_neighbour_tour, np, route_length, solve, two_opt
+
+    if np is None:
+        raise SystemExit("NumPy is not installed (pip install numpy)")
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'stops':>6} {'matrix':>9} {'nn':>9} {'2-opt':>9} {'open path':>10}  {'nn km':>8} {'2-opt km':>9} {'saved':>6}")
+    for stops in (int(n) for n in args.stops.split(",")):
+        latitudes = rng.uniform(*LATITUDES, stops)
+        longitudes = rng.uniform(*LONGITUDES, stops)
+
+        matrix_time, distances = timed(lambda: haversine_matrix(latitudes, longitudes), args.repeat)
+        nn_time, tour = timed(lambda: nearest_neighbour_tour(distances), args.repeat)
+        opt_time, improved = timed(lambda: two_opt(distances, tour), args.repeat)
+        open_time, _ = timed(lambda: solve(distances, round_trip=False), args.repeat)
+
+        nn_km = route_length(distances, tour, round_trip=True)
+        opt_km = route_length(distances, improved, round_trip=True)
+        print(
+            f"{stops:>6} {matrix_time * 1000:>7.1f}ms {nn_time * 1000:>7.1f}ms {opt_time * 1000:>7.1f}ms "
+            f"{open_time * 1000:>8.1f}ms  {nn_km:>8.1f} {opt_km:>9.1f} {1 - opt_km / nn_km:>6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Persistent connections are per thread and pile up under ASGI; use DB_POOL
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
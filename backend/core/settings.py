@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import importlib.util
 from pathlib import Path
 import environ
 
@@ -54,6 +55,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Request metrics first, so its timings cover the whole stack
+    "api.metrics.RequestMetricsMiddleware",
+    "api.db_routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     # CORS should be placed before CommonMiddleware
     "corsheaders.middleware.CorsMiddleware",
@@ -94,6 +98,85 @@ DATABASES = {
     )
 }
 
+# Connection reuse
+# DB_CONN_MAX_AGE keeps a connection open across requests for that many
+# seconds (None = forever) instead of reconnecting on every request, and
+# DB_CONN_HEALTH_CHECKS pings a reused connection before the request uses it.
+# Persistent connections belong to one thread, which is fine under gunicorn
+# sync workers but leaks under ASGI. There, set DB_POOL=True for a
+# per-process psycopg pool (PostgreSQL with psycopg 3 only). core/asgi.py
+# turns persistent connections off unless DB_CONN_MAX_AGE is already set in
+# the process environment.
+DB_POOL = env.bool("DB_POOL", default=False)
+
+if DB_POOL and DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0  # Required with a pool
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+        # Seconds a request waits for a free connection before failing
+        "timeout": env.float("DB_POOL_TIMEOUT", default=10.0),
+        # Recycle connections so none lives forever
+        "max_lifetime": env.float("DB_POOL_MAX_LIFETIME", default=1800.0),
+    }
+else:
+    conn_max_age = env("DB_CONN_MAX_AGE", default="60")
+    DATABASES["default"]["CONN_MAX_AGE"] = (
+        None if conn_max_age.lower() == "none" else int(conn_max_age)
+    )
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool("DB_CONN_HEALTH_CHECKS", default=True)
+
+# Read replicas (see api/db_routers.py)
+# Comma-separated database URLs. Opted-in read-only views (report retrieve
+# and uncached lists, subscriber list and export, traffic logs) read from
+# them; everything else, including every cached payload, uses the primary.
+# Tests mirror them onto the primary.
+# Local check with two databases: copy db.sqlite3 to replica.sqlite3 and set
+# DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3; writes will not show up
+# on the replica-backed pages except for the client that made them.
+DATABASE_REPLICA_URLS = env.list("DATABASE_REPLICA_URLS", default=[])
+for index, url in enumerate(DATABASE_REPLICA_URLS):
+    replica = env.db_url_config(url)
+    for key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS", "OPTIONS"):
+        if key in DATABASES["default"]:
+            replica[key] = DATABASES["default"][key]
+    replica["TEST"] = {"MIRROR": "default"}
+    DATABASES[f"replica_{index}"] = replica
+
+if DATABASE_REPLICA_URLS:
+    DATABASE_ROUTERS = ["api.db_routers.PrimaryReplicaRouter"]
+
+# A client that wrote reads from the primary for this long afterwards
+REPLICA_STICKY_SECONDS = env.int("REPLICA_STICKY_SECONDS", default=5)
+# Replicas further behind than this are skipped
+REPLICA_MAX_LAG_SECONDS = env.float("REPLICA_MAX_LAG_SECONDS", default=5.0)
+REPLICA_LAG_CHECK_INTERVAL = env.float("REPLICA_LAG_CHECK_INTERVAL", default=5.0)
+
+
+# Cache
+# Defaults to a per-process in-memory cache, which is only correct with a
+# single process: cached facets, dashboard and report lists are dropped on
+# commit in the writing worker alone, so other workers would serve stale
+# payloads until they expire. With several workers on one host use
+# CACHE_URL=shmcache://smartcity, a cache in shared memory that all workers
+# read and write (see api/cache_backends.py). entrypoint.sh defaults to it,
+# and `manage.py check --deploy` warns about locmem with several workers.
+
+environ.Env.CACHE_SCHEMES["shmcache"] = "api.cache_backends.SharedMemoryCache"
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
+# How long the dashboard payload may be served from cache. New logs and
+# report changes invalidate it immediately; 0 disables caching.
+DASHBOARD_CACHE_SECONDS = env.int("DASHBOARD_CACHE_SECONDS", default=30)
+
+# How long a GET /api/reports/ response may be served from cache. Any report
+# write invalidates every cached list at once; 0 disables caching. With
+# several workers this needs the shared cache above.
+REPORT_LIST_CACHE_SECONDS = env.int("REPORT_LIST_CACHE_SECONDS", default=60)
+# Longer lists are not cached. A report takes about 110 bytes pickled, so
+# the default fits a 16 KB shmcache slot; raise it together with slot_size.
+REPORT_LIST_CACHE_MAX_ROWS = env.int("REPORT_LIST_CACHE_MAX_ROWS", default=100)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -144,7 +227,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Security settings for production
 if not DEBUG:
-    SECURE_SSL_REDIRECT = True
+    SECURE_SSL_REDIRECT = env.bool("SECURE_SSL_REDIRECT", default=True)
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
     SECURE_BROWSER_XSS_FILTER = True
@@ -155,11 +238,108 @@ if not DEBUG:
     SECURE_HSTS_PRELOAD = True
 
 # Django REST Framework
+# JSON codec for the API: "orjson" (compiled, see api/renderers.py),
+# "stdlib", or "auto" to use orjson when it is installed
+JSON_BACKEND = env("JSON_BACKEND", default="auto")
+if JSON_BACKEND == "auto":
+    JSON_BACKEND = "orjson" if importlib.util.find_spec("orjson") else "stdlib"
+
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "api.renderers.OrjsonRenderer"
+        if JSON_BACKEND == "orjson"
+        else "rest_framework.renderers.JSONRenderer",
     ],
     "DEFAULT_PARSER_CLASSES": [
-        "rest_framework.parsers.JSONParser",
+        "api.renderers.OrjsonParser"
+        if JSON_BACKEND == "orjson"
+        else "rest_framework.parsers.JSONParser",
     ],
+    "DEFAULT_THROTTLE_RATES": {
+        # Token bucket per client IP for POST /api/check-traffic/ (burst/period)
+        "check_traffic": env("CHECK_TRAFFIC_RATE", default="10/min"),
+    },
 }
+
+# Host-wide cap on concurrent n8n traffic calls (see api/admission.py).
+# GUNICORN_WORKERS is the worker count entrypoint.sh starts. By default every
+# worker but one may wait on n8n, so one is always free for the rest of the
+# API; queued requests hold a worker for at most N8N_QUEUE_TIMEOUT seconds.
+GUNICORN_WORKERS = env.int("GUNICORN_WORKERS", default=3)
+N8N_MAX_IN_FLIGHT = env.int("N8N_MAX_IN_FLIGHT", default=max(GUNICORN_WORKERS - 1, 1))
+N8N_QUEUE_SIZE = env.int("N8N_QUEUE_SIZE", default=1)
+N8N_QUEUE_TIMEOUT = env.float("N8N_QUEUE_TIMEOUT", default=2.0)
+# Lock file for the cap; defaults to /dev/shm/smartcity-n8n.slots
+N8N_SLOT_FILE = env("N8N_SLOT_FILE", default="")
+
+# Near-duplicate detection for citizen reports (see api/similarity.py)
+REPORT_DUPLICATE_MAX_DISTANCE = env.int("REPORT_DUPLICATE_MAX_DISTANCE", default=10)
+REPORT_DUPLICATE_WINDOW_HOURS = env.int("REPORT_DUPLICATE_WINDOW_HOURS", default=72)
+
+# Energy anomaly detection (see api/anomaly.py)
+# A metric is flagged at |z| >= ENERGY_ANOMALY_Z. The alphas (0 < alpha < 1)
+# are the EWMA weights of the all-hours and hour-of-week baselines; smaller
+# values remember longer. Run `manage.py rescan_energy_anomalies` after
+# changing them.
+ENERGY_ANOMALY_Z = env.float("ENERGY_ANOMALY_Z", default=4.0)
+ENERGY_ANOMALY_ALPHA = env.float("ENERGY_ANOMALY_ALPHA", default=0.05)
+ENERGY_SEASONAL_ALPHA = env.float("ENERGY_SEASONAL_ALPHA", default=0.1)
+
+# Waste collection routes (see api/waste_routes.py): "latitude,longitude"
+# of the depot routes start and end at; empty plans open paths
+WASTE_DEPOT = tuple(env.list("WASTE_DEPOT", cast=float, default=[])) or None
+
+# Traffic forecasts (see api/forecast.py)
+# check-traffic answers with a forecast when n8n has not replied within
+# CHECK_TRAFFIC_FORECAST_AFTER seconds (0 waits for n8n as before); n8n's
+# late answer is still saved. Workers fold in new TrafficLog rows in a
+# background thread every TRAFFIC_FORECAST_REFRESH_SECONDS. The model file defaults to
+# <tmp>/smartcity-traffic-forecast.npz; `manage.py fit_traffic_forecast`
+# rebuilds it. A worker without a model fits one in the background and
+# answers without forecasts meanwhile, so run the command after deploys.
+CHECK_TRAFFIC_FORECAST_AFTER = env.float("CHECK_TRAFFIC_FORECAST_AFTER", default=5.0)
+TRAFFIC_FORECAST_REFRESH_SECONDS = env.float("TRAFFIC_FORECAST_REFRESH_SECONDS", default=30.0)
+TRAFFIC_FORECAST_FILE = env("TRAFFIC_FORECAST_FILE", default="")
+
+# Change feed (see api/changes.py): rows saved in the last
+# CHANGE_FEED_SETTLE_SECONDS are held back until transactions that started
+# earlier have committed. Keep it above the longest write transaction.
+CHANGE_FEED_SETTLE_SECONDS = env.float("CHANGE_FEED_SETTLE_SECONDS", default=5.0)
+
+# Traffic log write-behind (see api/spool.py): check-traffic appends rows to
+# a spool file in TRAFFIC_SPOOL_DIR (default <tmp>/smartcity-traffic-spool,
+# must be local and persistent) and a thread per worker inserts them every
+# TRAFFIC_SPOOL_FLUSH_ROWS rows or TRAFFIC_SPOOL_FLUSH_MS. Keep the flush
+# delay well below CHANGE_FEED_SETTLE_SECONDS. TRAFFIC_SPOOL_FSYNC makes each
+# append survive a machine crash, not only a worker crash.
+TRAFFIC_WRITE_BEHIND = env.bool("TRAFFIC_WRITE_BEHIND", default=False)
+TRAFFIC_SPOOL_DIR = env("TRAFFIC_SPOOL_DIR", default="")
+TRAFFIC_SPOOL_FLUSH_ROWS = env.int("TRAFFIC_SPOOL_FLUSH_ROWS", default=200)
+TRAFFIC_SPOOL_FLUSH_MS = env.int("TRAFFIC_SPOOL_FLUSH_MS", default=500)
+TRAFFIC_SPOOL_FSYNC = env.bool("TRAFFIC_SPOOL_FSYNC", default=False)
+
+# Email alerts
+# Alerts are queued in the Alert outbox and sent by `manage.py dispatch_alerts`.
+# For local testing point EMAIL_HOST/EMAIL_PORT at an SMTP stand-in such as
+# `python -m aiosmtpd -n -l localhost:1025`.
+ALERT_OUTBOX_ENABLED = env.bool("ALERT_OUTBOX_ENABLED", default=True)
+# An alert for the same address (or energy anomaly) is sent at most once per
+# window; later ones are kept but suppressed. 0 sends every alert.
+ALERT_DEDUPE_SECONDS = env.int("ALERT_DEDUPE_SECONDS", default=1800)
+EMAIL_BACKEND = env(
+    "EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend"
+)
+EMAIL_HOST = env("EMAIL_HOST", default="localhost")
+EMAIL_PORT = env.int("EMAIL_PORT", default=25)
+EMAIL_HOST_USER = env("EMAIL_HOST_USER", default="")
+EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", default="")
+EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", default=False)
+EMAIL_TIMEOUT = env.int("EMAIL_TIMEOUT", default=10)
+DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default="alerts@localhost")
+
+# Request metrics, exposed at /metrics (see api/metrics.py)
+# With several workers, METRICS_DIR must be a directory shared by all of
+# them so /metrics can aggregate across workers.
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=True)
+METRICS_DIR = env("METRICS_DIR", default="")
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", default=1.0)
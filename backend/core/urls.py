@@ -20,9 +20,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from api.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
+    # Prometheus scrape endpoint (internal only, blocked in nginx)
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 # Serve media files in development
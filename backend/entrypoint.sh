@@ -62,12 +62,23 @@ echo "Collecting Static Files..."
 echo "=========================================="
 python manage.py collectstatic --noinput
 
+echo "=========================================="
+echo "Preparing Metrics Directory..."
+echo "=========================================="
+# Shared by all gunicorn workers so /metrics aggregates across them
+export METRICS_DIR="${METRICS_DIR:-/tmp/smartcity-metrics}"
+rm -rf "$METRICS_DIR"
+mkdir -p "$METRICS_DIR"
+
+# Gunicorn runs several workers: cache invalidation must reach all of them
+export CACHE_URL="${CACHE_URL:-shmcache://smartcity}"
+
 echo "=========================================="
 echo "Starting Gunicorn Server..."
 echo "=========================================="
 exec gunicorn core.wsgi:application \
     --bind 0.0.0.0:8000 \
-    --workers 3 \
+    --workers "${GUNICORN_WORKERS:-3}" \
     --timeout 120 \
     --access-logfile - \
     --error-logfile - \
@@ -3,10 +3,23 @@ import { get } from './api.js';
 let allReports = [];
 let filteredReports = [];
 
+// The list endpoint returns compact rows by default; ask for the card fields
+const REPORT_FIELDS = [
+	'id',
+	'reporter_name',
+	'issue_type',
+	'description',
+	'image',
+	'location',
+	'status',
+	'created_at',
+	'updated_at',
+].join(',');
+
 // Load and display all reports
 async function loadReports() {
 	try {
-		const data = await get('/api/reports/');
+		const data = await get(`/api/reports/?fields=${REPORT_FIELDS}`);
 		allReports = Array.isArray(data) ? data : [];
 		filteredReports = [...allReports];
 